@@ -0,0 +1,67 @@
+"""
+Screenshot corpus for the benchmarks: PNGs loaded from a directory, or synthetic,
+deterministic page renderings when no directory is given.
+"""
+
+import io
+import os
+import random
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+WORDS = (
+    "import async await return function class request response error cache vector query "
+    "embedding token python javascript docker install version package module config server "
+    "client database index search result latency throughput upload screenshot document"
+).split()
+
+
+def _title(rng : random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(4)).title()
+
+
+def page_title(seed : int) -> str:
+    """Title of the synthetic page rendered from `seed`, which is also its header text."""
+    return _title(random.Random(seed))
+
+
+def render_page(seed : int, size : Tuple[int, int] = (1280, 800)) -> bytes:
+    """Render a synthetic web page screenshot with a header, sidebar and paragraphs of text."""
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+
+    draw.rectangle((0, 0, width, 60), fill=(36, 41, 47))
+    draw.text((20, 22), _title(rng), fill=(255, 255, 255))
+    draw.rectangle((0, 60, 220, height), fill=(246, 248, 250))
+    for i in range(12):
+        draw.text((20, 80 + i * 28), rng.choice(WORDS).title(), fill=(80, 80, 80))
+
+    y = 90
+    while y < height - 40:
+        for _ in range(rng.randint(2, 6)):
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+            draw.text((250, y), line, fill=(20, 20, 20))
+            y += 18
+        y += 24
+
+    output_buffer = io.BytesIO()
+    image.save(output_buffer, format="PNG")
+    return output_buffer.getvalue()
+
+
+def load_corpus(directory : Optional[str] = None, size : int = 20) -> List[Tuple[str, bytes]]:
+    """
+    Return (name, PNG bytes) pairs. Images are read from `directory` if given, otherwise
+    `size` synthetic pages are rendered.
+    """
+    if directory:
+        names = sorted(name for name in os.listdir(directory) if name.lower().endswith((".png", ".jpg", ".jpeg", ".webp")))
+        corpus = []
+        for name in names:
+            with open(os.path.join(directory, name), "rb") as f:
+                corpus.append((name, f.read()))
+        return corpus
+    return [(f"synthetic_{i}.png", render_page(i)) for i in range(size)]
@@ -0,0 +1,236 @@
+"""
+Offline end-to-end benchmark of the screenshot ingestion pipeline.
+
+Runs every screenshot of a corpus through the real pipeline (store, decode, dedup, OCR,
+description, vector store insert, passive enrichment) with deterministic stubs in place of
+the Mistral and Perplexity clients, a temporary Chroma directory and, unless
+--real-embeddings is given, an offline hashing embedding function. Reports per-stage latency
+percentiles, end-to-end latency and throughput at the requested concurrency.
+
+Usage (from backend/):
+    python -m benchmarks.ingest_benchmark --size 20 --concurrency 4
+    python -m benchmarks.ingest_benchmark --size 20 --llm-latency 1 --search-latency 3 --enrichment-mode fused
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+STAGE_REPORT_ORDER = ["save", "decode", "dedup", "ocr", "pixtral", "embed", "add", "enrichment", "end_to_end"]
+
+current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def percentile(values : List[float], pct : float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples : Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for name in STAGE_REPORT_ORDER:
+        values = samples.get(name, [])
+        if not values:
+            continue
+        summary[name] = {
+            "count": len(values),
+            "mean_ms": 1000 * sum(values) / len(values),
+            "p50_ms": 1000 * percentile(values, 50),
+            "p95_ms": 1000 * percentile(values, 95),
+            "p99_ms": 1000 * percentile(values, 99)
+        }
+    return summary
+
+
+def print_report(report : dict) -> None:
+    print(f"\n{report['jobs']} screenshots, concurrency {report['concurrency']}, {report['enrichment_mode']} enrichment, "
+          f"{report['wall_seconds']:.2f}s wall, {report['throughput_per_second']:.2f} screenshots/s")
+    print(f"{'stage':<12}{'count':>7}{'mean ms':>11}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for name, row in report["stages"].items():
+        print(f"{name:<12}{row['count']:>7}{row['mean_ms']:>11.1f}{row['p50_ms']:>11.1f}{row['p95_ms']:>11.1f}{row['p99_ms']:>11.1f}")
+    print(f"remote calls: {report['remote_calls']}")
+    if report["errors"]:
+        print(f"errors: {report['errors']}")
+
+
+class TimedEmbeddingFunction:
+    """Wraps an embedding function and records its time on the job's currently running stage."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __call__(self, input):
+        start = time.perf_counter()
+        try:
+            return self.inner(input)
+        finally:
+            job = current_job.get()
+            if job is not None:
+                running = [stage.name for stage in job.stages if stage.status == "running"]
+                key = f"embed_{running[-1] if running else 'other'}"
+                job.result.setdefault("_timings", {}).setdefault(key, 0.0)
+                job.result["_timings"][key] += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+def configure_environment(workdir : str, args) -> None:
+    os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(workdir, "chroma_db")
+    os.environ["SCREENSHOT_DIR"] = os.path.join(workdir, "screenshots")
+    os.environ["CACHE_DIRECTORY"] = os.path.join(workdir, "cache_data")
+    os.environ["DEDUP_ENABLED"] = "true" if args.dedup else "false"
+    os.environ["OCR_TILED"] = "true" if args.tiled_ocr else "false"
+    os.environ["OCR_PROCESSES"] = str(args.ocr_processes)
+    os.environ["ENRICHMENT_MODE"] = args.enrichment_mode
+    os.environ["LOCAL_TOPIC_ENABLED"] = "true" if args.local_topics else "false"
+    os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+    os.environ.setdefault("PERPLEXITY_API_KEY", "benchmark")
+
+
+async def run(args) -> dict:
+    from benchmarks.corpus import load_corpus, page_title
+    from benchmarks.stubs import HashEmbeddingFunction, install_client_stubs, install_ocr_stub
+
+    mistral_stub, perplexity_stub = install_client_stubs(args.llm_latency, args.vision_latency, args.search_latency)
+    if args.stub_ocr or shutil.which("tesseract") is None:
+        print("Using the OCR stub (tesseract not found or --stub-ocr given)")
+        install_ocr_stub()
+
+    from db import vector_store
+    if not args.real_embeddings:
+        vector_store.default_ef = HashEmbeddingFunction()
+        if vector_store.embedding_cache is not None:
+            vector_store.default_ef = vector_store.CachedEmbeddingFunction(vector_store.default_ef, vector_store.embedding_cache)
+    vector_store.default_ef = TimedEmbeddingFunction(vector_store.default_ef)
+    # Open the store up front so client start-up is not charged to the first jobs
+    vector_store.get_or_create_collection("screenshots_collection")
+
+    from pipeline import ingest
+    from pipeline.jobs import JobManager
+
+    async def handler(job):
+        current_job.set(job)
+        timings = job.result.setdefault("_timings", {})
+        result = await ingest.process_screenshot(job)
+        return {**(result or {}), "_timings": timings}
+
+    corpus = load_corpus(args.corpus, args.size)
+    job_manager = JobManager(
+        handler=handler,
+        stages=ingest.STAGES,
+        num_workers=args.concurrency,
+        max_queue_size=len(corpus) * args.iterations + 1,
+        max_history=len(corpus) * args.iterations + 1
+    )
+    await job_manager.start()
+
+    samples : Dict[str, List[float]] = {}
+    jobs = []
+    wall_start = time.perf_counter()
+    for iteration in range(args.iterations):
+        for index, (name, image_bytes) in enumerate(corpus):
+            start = time.perf_counter()
+            digest, _, _ = ingest.screenshot_store.put_bytes(image_bytes)
+            samples.setdefault("save", []).append(time.perf_counter() - start)
+            jobs.append(job_manager.submit({
+                "image_hash": digest,
+                "doc_id": f"screenshot_{iteration}_{index}_{digest[:12]}",
+                "timestamp": time.strftime("%Y%m%d_%H%M%S"),
+                "created_at": time.time(),
+                "page_url": f"https://example.com/{name}",
+                "page_title": name if args.corpus else page_title(index)
+            }))
+            # Let the workers pick up work between uploads, like a real request loop would
+            await asyncio.sleep(0)
+
+    while any(job.status not in ("done", "error") for job in jobs):
+        await asyncio.sleep(0.01)
+    wall_seconds = time.perf_counter() - wall_start
+    await job_manager.stop()
+    ingest.shutdown_ocr_executor()
+
+    errors = [job.error for job in jobs if job.status == "error"]
+    for job in jobs:
+        if job.status != "done":
+            continue
+        durations = {
+            stage.name: stage.finished_at - stage.started_at
+            for stage in job.stages if stage.started_at and stage.finished_at and stage.status == "done"
+        }
+        timings = job.result.get("_timings", {})
+        for stage_name, report_name in [("decode", "decode"), ("dedup", "dedup"), ("ocr", "ocr"), ("describe", "pixtral"), ("enrich", "enrichment")]:
+            if stage_name in durations:
+                samples.setdefault(report_name, []).append(durations[stage_name])
+        if "store" in durations:
+            embed = timings.get("embed_store", 0.0)
+            samples.setdefault("embed", []).append(embed)
+            samples.setdefault("add", []).append(durations["store"] - embed)
+        samples.setdefault("end_to_end", []).append(job.finished_at - job.created_at)
+
+    calls = {}
+    calls.update({f"mistral.{name}": count for name, count in mistral_stub.calls.items()})
+    calls.update({f"perplexity.{name}": count for name, count in perplexity_stub.calls.items()})
+    return {
+        "jobs": len(jobs),
+        "concurrency": args.concurrency,
+        "enrichment_mode": args.enrichment_mode,
+        "wall_seconds": wall_seconds,
+        "throughput_per_second": len(jobs) / wall_seconds if wall_seconds else 0.0,
+        "stages": summarize(samples),
+        "remote_calls": calls,
+        "errors": errors
+    }
+
+
+def parse_args(argv : Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the screenshot ingestion pipeline")
+    parser.add_argument("--corpus", help="Directory of screenshots to use instead of the synthetic corpus")
+    parser.add_argument("--size", type=int, default=20, help="Number of synthetic screenshots")
+    parser.add_argument("--iterations", type=int, default=1, help="Number of passes over the corpus")
+    parser.add_argument("--concurrency", type=int, default=2, help="Number of ingestion workers")
+    parser.add_argument("--ocr-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per Mistral text call")
+    parser.add_argument("--vision-latency", type=float, default=0.0, help="Simulated seconds per Pixtral call")
+    parser.add_argument("--search-latency", type=float, default=0.0, help="Simulated seconds per Perplexity call")
+    parser.add_argument("--enrichment-mode", choices=["chain", "fused"], default="chain", help="Passive enrichment mode to benchmark")
+    parser.add_argument("--local-topics", action=argparse.BooleanOptionalAction, default=True, help="Find page topics locally before asking the LLM")
+    parser.add_argument("--dedup", action="store_true", help="Enable perceptual-hash deduplication")
+    parser.add_argument("--tiled-ocr", action=argparse.BooleanOptionalAction, default=True, help="Use incremental tile-based OCR")
+    parser.add_argument("--stub-ocr", action="store_true", help="Use the OCR stub even if tesseract is installed")
+    parser.add_argument("--real-embeddings", action="store_true", help="Use Chroma's default embedding model (may download it)")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary working directory")
+    return parser.parse_args(argv)
+
+
+def main(argv : Optional[List[str]] = None) -> dict:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="pulseai_bench_")
+    configure_environment(workdir, args)
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+    main()
@@ -0,0 +1,204 @@
+"""
+Deterministic, offline stand-ins for the remote clients used by the ingestion benchmarks.
+The stub modules expose the same functions and response models as `clients.mistral` and
+`clients.perplexity` (including the `_async` variants), derive their answers from a hash of
+the input and can simulate a fixed per-call latency.
+"""
+
+import asyncio
+import functools
+import hashlib
+import sys
+import time
+import types
+from typing import Any, List
+
+import numpy as np
+import pytesseract
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from pydantic import BaseModel
+
+EMBEDDING_DIMENSIONS = 384
+
+
+class TopicResponse(BaseModel):
+    topic : str
+
+class Topic(BaseModel):
+    name : str
+    topic_information : str
+
+class TopicsResponse(BaseModel):
+    topics : List[Topic]
+
+class Response(BaseModel):
+    thoughts : str
+    answer : str
+
+class RelatedTopic(BaseModel):
+    name : str
+    topic_information : str
+
+class TopicWithRelatedTopics(BaseModel):
+    topic : str
+    topics : List[RelatedTopic]
+
+
+def _digest(text : str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _expose(module : types.ModuleType, name : str, impl, latency : float) -> None:
+    """Expose `impl` as `name` (sleeping `latency`) and as `name_async` (awaiting `latency`)."""
+    @functools.wraps(impl)
+    def call(*args, **kwargs):
+        module.calls[name] = module.calls.get(name, 0) + 1
+        if latency:
+            time.sleep(latency)
+        return impl(*args, **kwargs)
+
+    @functools.wraps(impl)
+    async def call_async(*args, **kwargs):
+        module.calls[name] = module.calls.get(name, 0) + 1
+        if latency:
+            await asyncio.sleep(latency)
+        return impl(*args, **kwargs)
+
+    setattr(module, name, call)
+    setattr(module, f"{name}_async", call_async)
+
+
+def make_mistral_stub(latency : float = 0.0) -> types.ModuleType:
+    """Build a stub `clients.mistral` module whose calls each take `latency` seconds."""
+    module = types.ModuleType("clients.mistral")
+    module.TopicResponse = TopicResponse
+    module.Topic = Topic
+    module.TopicsResponse = TopicsResponse
+    module.calls = {}
+
+    def get_topic(text : str) -> TopicResponse:
+        return TopicResponse(topic=f"Topic {_digest(text)[:8]}")
+
+    def get_topics(text : str) -> TopicsResponse:
+        digest = _digest(text)
+        return TopicsResponse(topics=[
+            Topic(name=f"Related topic {digest[i * 8:(i + 1) * 8]}", topic_information=f"Information about {digest[i * 8:(i + 1) * 8]}. " * 20)
+            for i in range(4)
+        ])
+
+    def get_summary(text : str) -> str:
+        return f"Summary {_digest(text)[:16]}"
+
+    def get_collective_summary(sources : List[Any]) -> str:
+        return f"Collective summary {_digest(str(sources))[:16]}"
+
+    def get_image_description(base64_image : str, mime_type : str = "image/png") -> str:
+        return f"A screenshot of a web page ({_digest(base64_image)[:16]}). " * 10
+
+    for impl in [get_topic, get_topics, get_summary, get_collective_summary, get_image_description]:
+        _expose(module, impl.__name__, impl, latency)
+    return module
+
+
+def make_perplexity_stub(latency : float = 0.0) -> types.ModuleType:
+    """Build a stub `clients.perplexity` module whose calls each take `latency` seconds."""
+    module = types.ModuleType("clients.perplexity")
+    module.Response = Response
+    module.RelatedTopic = RelatedTopic
+    module.TopicWithRelatedTopics = TopicWithRelatedTopics
+    module.calls = {}
+
+    def answer(prompt : str) -> Response:
+        digest = _digest(prompt)
+        return Response(
+            thoughts=f"Thinking about {digest[:8]}",
+            answer="\n".join(f"- Topic {digest[i * 8:(i + 1) * 8]}: details. " * 3 for i in range(4))
+        )
+
+    def get_search_response(user_prompt : str) -> Response:
+        return answer(user_prompt)
+
+    def get_related_topics(topic : str) -> Response:
+        return answer(topic)
+
+    def get_related_topics_with_other_topics(topic : str, other_topics : List[str]) -> Response:
+        return answer(topic + "".join(other_topics))
+
+    def get_topic_with_related_topics(text : str) -> TopicWithRelatedTopics:
+        digest = _digest(text)
+        return TopicWithRelatedTopics(
+            topic=f"Topic {digest[:8]}",
+            topics=[
+                RelatedTopic(name=f"Related topic {digest[i * 8:(i + 1) * 8]}", topic_information=f"Information about {digest[i * 8:(i + 1) * 8]}. " * 20)
+                for i in range(4)
+            ]
+        )
+
+    for impl in [get_search_response, get_related_topics, get_related_topics_with_other_topics, get_topic_with_related_topics]:
+        _expose(module, impl.__name__, impl, latency)
+    return module
+
+
+def install_client_stubs(llm_latency : float = 0.0, vision_latency : float = 0.0, search_latency : float = 0.0):
+    """
+    Replace `clients.mistral` and `clients.perplexity` with stubs. Must run before anything
+    imports the real client modules.
+
+    Returns:
+        (mistral stub, perplexity stub)
+    """
+    import clients
+
+    mistral = make_mistral_stub(llm_latency)
+    if vision_latency != llm_latency:
+        describe = mistral.get_image_description
+        describe_async = mistral.get_image_description_async
+        def get_image_description(base64_image : str, mime_type : str = "image/png") -> str:
+            time.sleep(max(vision_latency - llm_latency, 0))
+            return describe(base64_image, mime_type)
+        async def get_image_description_async(base64_image : str, mime_type : str = "image/png") -> str:
+            await asyncio.sleep(max(vision_latency - llm_latency, 0))
+            return await describe_async(base64_image, mime_type)
+        mistral.get_image_description = get_image_description
+        mistral.get_image_description_async = get_image_description_async
+    perplexity = make_perplexity_stub(search_latency)
+
+    sys.modules["clients.mistral"] = mistral
+    sys.modules["clients.perplexity"] = perplexity
+    clients.mistral = mistral
+    clients.perplexity = perplexity
+    return mistral, perplexity
+
+
+def install_ocr_stub(seconds_per_megapixel : float = 0.2) -> None:
+    """
+    Replace Tesseract with a deterministic stand-in that burns CPU in proportion to the image
+    size, for machines without the tesseract binary. Must run before the OCR process pool
+    starts so forked workers inherit it.
+    """
+    def image_to_string(image, config : str = "", **kwargs) -> str:
+        deadline = time.perf_counter() + seconds_per_megapixel * image.width * image.height / 1e6
+        digest = hashlib.sha256(image.tobytes()).hexdigest()
+        while time.perf_counter() < deadline:
+            digest = hashlib.sha256(digest.encode("utf-8")).hexdigest()
+        return f"text {digest[:12]}"
+
+    pytesseract.image_to_string = image_to_string
+
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    """Offline embedding function: hashed bag of words, L2 normalized."""
+
+    def __init__(self, dimensions : int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.model_id = f"hashed-bag-of-words:{dimensions}"
+
+    def __call__(self, input : Documents) -> Embeddings:
+        embeddings = []
+        for text in input:
+            vector = np.zeros(self.dimensions, dtype=np.float32)
+            for token in text.lower().split():
+                vector[int(_digest(token)[:8], 16) % self.dimensions] += 1.0
+            norm = np.linalg.norm(vector)
+            embeddings.append(vector / norm if norm else vector)
+        return embeddings
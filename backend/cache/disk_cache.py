@@ -0,0 +1,165 @@
+"""
+Size-bounded, persistent key-value cache backed by SQLite. Entries are evicted least recently
+used first once the total size of the stored values exceeds the limit, and can optionally
+expire after a TTL. Hit, miss and eviction counters are kept for the metrics endpoints.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRECTORY = os.getenv("CACHE_DIRECTORY", os.path.join(os.path.dirname(__file__), "..", "cache_data"))
+
+
+class DiskCache:
+    """
+    Persistent LRU cache of bytes values.
+
+    Args:
+        name: Name of the cache, used for the SQLite file name and in logs
+        max_bytes: Maximum total size of the stored values
+        ttl_seconds: Default time to live of an entry (0 means entries never expire)
+        path: SQLite file to use instead of `<CACHE_DIRECTORY>/<name>.sqlite3`
+    """
+
+    def __init__(self, name : str, max_bytes : int = 256 * 1024 * 1024, ttl_seconds : float = 0, path : Optional[str] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        if path is None:
+            os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+            path = os.path.join(CACHE_DIRECTORY, f"{name}.sqlite3")
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key : str) -> Optional[bytes]:
+        """Return the cached value, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] and row[1] < now):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def get_many(self, keys : list) -> Dict[str, bytes]:
+        """Return the cached values for whichever of the keys are present."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                rows = self._conn.execute(
+                    f"SELECT key, value, expires_at FROM entries WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    if not expires_at or expires_at >= now:
+                        found[key] = value
+            if found:
+                self._conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def set(self, key : str, value : bytes, ttl_seconds : Optional[float] = None) -> None:
+        """Store a value, evicting least recently used entries if the cache is over its size limit."""
+        self.set_many({key: value}, ttl_seconds)
+
+    def set_many(self, items : Dict[str, bytes], ttl_seconds : Optional[float] = None) -> None:
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = now + ttl if ttl else 0
+        with self._lock:
+            for key, value in items.items():
+                row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._total_bytes -= row[0]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), expires_at, now)
+                )
+                self._total_bytes += len(value)
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, key : str) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+            self._total_bytes -= row[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def _evict(self) -> None:
+        # Expired entries go first, then the least recently used until the cache fits
+        now = time.time()
+        expired = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries WHERE expires_at > 0 AND expires_at < ?", (now,)
+        ).fetchone()
+        if expired[1]:
+            self._conn.execute("DELETE FROM entries WHERE expires_at > 0 AND expires_at < ?", (now,))
+            self._total_bytes -= expired[0]
+            self.evictions += expired[1]
+
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at LIMIT 100").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
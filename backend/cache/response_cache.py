@@ -0,0 +1,105 @@
+"""
+Persistent cache of structured LLM responses. Entries are keyed by a hash of the function,
+the model, the full prompt and the normalized input, expire after a per-function TTL and
+live in a size-bounded DiskCache. Hit and miss counters are kept per function.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+from cache.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_input(text : str) -> str:
+    """Collapse runs of whitespace so trivially different inputs share an entry."""
+    return " ".join(text.split())
+
+
+class ResponseCache:
+    """
+    Caches pydantic responses of remote calls on disk.
+
+    Args:
+        cache: DiskCache the responses are stored in, or None to disable caching
+        ttls: Time to live in seconds per function name (0 means entries never expire)
+    """
+
+    def __init__(self, cache : Optional[DiskCache], ttls : Optional[Dict[str, float]] = None):
+        self.cache = cache
+        self.ttls = ttls or {}
+        self._lock = threading.Lock()
+        self._counters : Dict[str, Dict[str, int]] = {}
+
+    def key(self, name : str, parts : Any) -> str:
+        encoded = json.dumps([name, parts], sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, name : str, key : str) -> Optional[bytes]:
+        value = self.cache.get(key)
+        self._count(name, "hits" if value is not None else "misses")
+        return value
+
+    def set(self, name : str, key : str, value : bytes) -> None:
+        self.cache.set(key, value, ttl_seconds=self.ttls.get(name))
+
+    def _count(self, name : str, counter : str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(name, {"hits": 0, "misses": 0})
+            counters[counter] += 1
+
+    def cached(self, name : str, key_parts : Callable[..., Any], response_model : Type[BaseModel]):
+        """
+        Decorate a sync or async function returning `response_model` so its responses are
+        cached under `key_parts(*args, **kwargs)`, which should return the model and the
+        prompt built from the normalized input.
+        """
+        def decorator(function):
+            if self.cache is None:
+                return function
+
+            def lookup(args, kwargs):
+                key = self.key(name, key_parts(*args, **kwargs))
+                cached = self.get(name, key)
+                if cached is not None:
+                    logger.debug(f"Response cache hit for {name}")
+                    return key, response_model.model_validate_json(cached)
+                return key, None
+
+            if asyncio.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    key, response = lookup(args, kwargs)
+                    if response is None:
+                        response = await function(*args, **kwargs)
+                        self.set(name, key, response.model_dump_json().encode("utf-8"))
+                    return response
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                key, response = lookup(args, kwargs)
+                if response is None:
+                    response = function(*args, **kwargs)
+                    self.set(name, key, response.model_dump_json().encode("utf-8"))
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict[str, Any]:
+        if self.cache is None:
+            return {"enabled": False}
+        with self._lock:
+            functions = {}
+            for name, counters in self._counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                functions[name] = {**counters, "hit_rate": counters["hits"] / lookups if lookups else 0.0}
+        return {"enabled": True, **self.cache.stats(), "ttl_seconds": self.ttls, "functions": functions}
@@ -0,0 +1,136 @@
+"""
+Token budgets for the inputs of LLM calls.
+
+Screenshot documents concatenate the page title, URL, the Pixtral description and the raw
+OCR text, which is often long and noisy: navigation repeated on every line, runs of
+whitespace and lines of OCR garbage. Before such text is sent to a model it is cleaned and,
+if it is still over the call's budget, cut down to its beginning plus its most salient
+lines, so prompt size (and with it latency and cost) stays predictable.
+"""
+
+import logging
+import math
+import os
+from collections import Counter
+from typing import Any, List
+
+from dotenv import load_dotenv
+
+from db.chunking import TOKEN_PATTERN, count_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Approximate token budgets (words and punctuation marks, see db.chunking.count_tokens)
+TOPIC_INPUT_MAX_TOKENS = int(os.getenv("TOPIC_INPUT_MAX_TOKENS", "1500"))
+SUMMARY_INPUT_MAX_TOKENS = int(os.getenv("SUMMARY_INPUT_MAX_TOKENS", "8000"))
+
+# Share of the budget always given to the beginning of a text, which holds the title and URL
+HEAD_FRACTION = 0.25
+# Lines with fewer letters and digits than this among their characters are OCR garbage
+MIN_ALNUM_RATIO = 0.5
+GAP_MARKER = "..."
+
+
+def _is_garbage(line : str) -> bool:
+    characters = line.replace(" ", "")
+    alnum = sum(character.isalnum() for character in characters)
+    if alnum < 2 or alnum / len(characters) < MIN_ALNUM_RATIO:
+        return True
+    # OCR of icons and borders gives lines like "a | I ~ e ©"
+    words = line.split()
+    return len(words) >= 4 and sum(len(word) == 1 for word in words) / len(words) > 0.6
+
+
+def clean_text(text : str) -> str:
+    """Collapse whitespace, and drop empty lines, OCR garbage and lines seen before."""
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if not line or _is_garbage(line) or line.lower() in seen:
+            continue
+        seen.add(line.lower())
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _truncate(text : str, max_tokens : int) -> str:
+    spans = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+    if len(spans) <= max_tokens:
+        return text
+    return text[:spans[max_tokens - 1][1]] if max_tokens > 0 else ""
+
+
+def fit_to_budget(text : str, max_tokens : int) -> str:
+    """
+    Cut a text down to at most about `max_tokens` tokens: its first lines up to
+    HEAD_FRACTION of the budget, then the most salient remaining lines, in their original
+    order with GAP_MARKER where lines were left out. A line is salient when it has many
+    distinct words that few other lines share, per token.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    lines = text.splitlines()
+    counts = [count_tokens(line) for line in lines]
+    selected = set()
+    used = 0
+    head_budget = int(max_tokens * HEAD_FRACTION)
+    while len(selected) < len(lines) and used + counts[len(selected)] <= head_budget:
+        used += counts[len(selected)]
+        selected.add(len(selected))
+    if not selected:
+        return _truncate(text, max_tokens)
+
+    line_words = [{word.lower() for word in TOKEN_PATTERN.findall(line) if len(word) > 2} for line in lines]
+    frequencies = Counter(word for words in line_words for word in words)
+    def salience(index : int) -> float:
+        rarity = sum(math.log(1 + len(lines) / frequencies[word]) for word in line_words[index])
+        return rarity / math.sqrt(counts[index] or 1)
+
+    marker_tokens = count_tokens(GAP_MARKER)
+    for index in sorted(range(len(selected), len(lines)), key=salience, reverse=True):
+        if used + counts[index] + marker_tokens <= max_tokens:
+            selected.add(index)
+            used += counts[index] + marker_tokens
+
+    output = []
+    for index in sorted(selected):
+        if output and index - 1 not in selected:
+            output.append(GAP_MARKER)
+        output.append(lines[index])
+    return "\n".join(output)
+
+
+def budget_text(text : str, max_tokens : int) -> str:
+    """Clean a text and fit it to `max_tokens` tokens."""
+    # Short inputs such as a single word can look like garbage; they are kept as they are
+    budgeted = fit_to_budget(clean_text(text) or " ".join(text.split()), max_tokens)
+    logger.debug(f"Budgeted input from {count_tokens(text)} to {count_tokens(budgeted)} tokens")
+    return budgeted
+
+
+def _source_text(source : Any) -> str:
+    if isinstance(source, dict):
+        return "\n".join(f"{key}: {value}" for key, value in source.items())
+    return str(source)
+
+
+def budget_sources(sources : List[Any], max_tokens : int) -> List[str]:
+    """
+    Clean several sources and fit them to `max_tokens` tokens together. Short sources are
+    kept whole, and what they leave of the budget is shared evenly by the longer ones.
+    """
+    texts = [clean_text(_source_text(source)) for source in sources]
+    counts = [count_tokens(text) for text in texts]
+    allowances = [0] * len(texts)
+    remaining = max_tokens
+    order = sorted(range(len(texts)), key=lambda index: counts[index])
+    for position, index in enumerate(order):
+        allowances[index] = min(counts[index], remaining // (len(order) - position))
+        remaining -= allowances[index]
+    budgeted = [fit_to_budget(text, allowance) for text, allowance in zip(texts, allowances)]
+    logger.debug(f"Budgeted {len(sources)} sources from {sum(counts)} to {sum(count_tokens(text) for text in budgeted)} tokens")
+    return budgeted
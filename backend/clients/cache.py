@@ -0,0 +1,29 @@
+"""
+Response cache shared by the Mistral and Perplexity clients. Topic extraction runs at
+temperature 0 and is cached for long; Perplexity answers draw on web results and expire sooner.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+from cache.disk_cache import DiskCache
+from cache.response_cache import ResponseCache
+
+load_dotenv()
+
+# LLM_CACHE_MAX_BYTES=0 disables the cache
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TOPIC_CACHE_TTL_SECONDS = float(os.getenv("TOPIC_CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+TOPICS_CACHE_TTL_SECONDS = float(os.getenv("TOPICS_CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+RELATED_TOPICS_CACHE_TTL_SECONDS = float(os.getenv("RELATED_TOPICS_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+
+response_cache = ResponseCache(
+    DiskCache("llm_responses", max_bytes=LLM_CACHE_MAX_BYTES) if LLM_CACHE_MAX_BYTES else None,
+    ttls={
+        "get_topic": TOPIC_CACHE_TTL_SECONDS,
+        "get_topics": TOPICS_CACHE_TTL_SECONDS,
+        "get_related_topics": RELATED_TOPICS_CACHE_TTL_SECONDS,
+        "get_topic_with_related_topics": RELATED_TOPICS_CACHE_TTL_SECONDS
+    }
+)
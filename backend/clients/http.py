@@ -0,0 +1,78 @@
+"""
+Shared, connection-pooled HTTP clients for the remote API clients. Reusing connections
+avoids a TCP and TLS handshake per call, and HTTP/2 (when the h2 package is installed)
+multiplexes concurrent requests to the same host over one connection.
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "120"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+if HTTP2_ENABLED and not HTTP2_AVAILABLE:
+    logger.warning("HTTP/2 is enabled but the h2 package is not installed, using HTTP/1.1")
+
+_client : Optional[httpx.Client] = None
+_async_client : Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def _options() -> dict:
+    return {
+        "http2": HTTP2_ENABLED and HTTP2_AVAILABLE,
+        "timeout": httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+    }
+
+
+def get_client() -> httpx.Client:
+    """The process-wide pooled client for synchronous calls."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(**_options())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """The process-wide pooled client for calls from the event loop."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = httpx.AsyncClient(**_options())
+    return _async_client
+
+
+async def aclose() -> None:
+    """
+    Close both clients, e.g. on application shutdown. Later calls to get_client and
+    get_async_client open new ones.
+    """
+    global _client, _async_client
+    with _lock:
+        client, async_client = _client, _async_client
+        _client, _async_client = None, None
+    if client is not None:
+        client.close()
+    if async_client is not None:
+        await async_client.aclose()
@@ -7,8 +7,17 @@ from pydantic import BaseModel
 from mistralai import Mistral
 from dotenv import load_dotenv
 import os
-from typing import List, Any
+from typing import List, Any, Optional, Tuple
 import simplejson as json
+import hashlib
+import asyncio
+
+from cache.disk_cache import DiskCache
+from cache.response_cache import normalize_input
+from clients.budget import SUMMARY_INPUT_MAX_TOKENS, TOPIC_INPUT_MAX_TOKENS, budget_sources, budget_text
+from clients.cache import response_cache
+from clients import http
+from clients.http import HTTP_TIMEOUT_SECONDS
 
 load_dotenv()
 
@@ -16,7 +25,29 @@ MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 MODEL = "ministral-8b-latest"
 PIXTRAL_MODEL = "pixtral-large-latest"
 
-client = Mistral(api_key=MISTRAL_API_KEY)
+_client : Optional[Mistral] = None
+_client_transports : Optional[Tuple[Any, Any]] = None
+
+def get_mistral_client() -> Mistral:
+    """
+    The Mistral client. Sync and async calls share the pooled HTTP clients; if those were
+    closed by clients.http.aclose, the client is rebuilt on the new ones.
+    """
+    global _client, _client_transports
+    transports = (http.get_client(), http.get_async_client())
+    if _client is None or _client_transports != transports:
+        _client = Mistral(
+            api_key=MISTRAL_API_KEY,
+            client=transports[0],
+            async_client=transports[1],
+            timeout_ms=int(HTTP_TIMEOUT_SECONDS * 1000)
+        )
+        _client_transports = transports
+    return _client
+
+# Pixtral descriptions keyed by the hash of the exact image that was sent
+DESCRIPTION_CACHE_MAX_BYTES = int(os.getenv("DESCRIPTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+description_cache = DiskCache("image_descriptions", max_bytes=DESCRIPTION_CACHE_MAX_BYTES)
 
 class TopicResponse(BaseModel):
     """
@@ -27,49 +58,68 @@ class TopicResponse(BaseModel):
     """
     topic : str
 
+def _topic_messages(text : str) -> List[dict]:
+    return [
+        {
+            "role": "system", 
+            "content": "Return the topic of the user's statement. This should be a term or phrase, not a complete sentence."
+        },
+        {
+            "role": "user", 
+            "content": "## Mean Squared Error (MSE) Explained\n\nMean Squared Error (MSE) is a statistical measure used to evaluate the accuracy of an estimator or a predictive model. It quantifies the average squared difference between the estimated values (predictions) and the actual values (observations).\n\n### Calculation\n\nThe formula for MSE is:\n\n\\[ \\text{MSE} = \\frac{1}{n} \\sum_{i=1}^{n} (y_i - \\hat{y}_i)^2 \\]\n\nWhere:\n- \\( n \\) is the number of observations.\n- \\( y_i \\) is the actual observed value.\n- \\( \\hat{y}_i \\) is the predicted value.\n- The summation runs over all observations.\n\n### Interpretation\n\n- **Positive Values**: MSE is always non-negative, with lower values indicating better model performance. An MSE of zero implies perfect predictions, which is rarely achievable in practice[1][2].\n- **Sensitivity to Outliers**: Because errors are squared, larger errors have a disproportionately large impact on the MSE, making it sensitive to outliers[5].\n- **Units**: The units of MSE are the square of the units of the original data, which can make interpretation less intuitive compared to other metrics like Root Mean Squared Error (RMSE)[2].\n\n### Applications\n\n- **Model Evaluation**: In regression analysis and machine learning, MSE is used to assess how well a model predicts outcomes by comparing predicted values against actual data[5].\n- **Comparative Analysis**: MSE allows for comparing different models or estimators. A lower MSE indicates a model that better fits the data[4].\n- **Optimization**: In algorithms like gradient descent, minimizing MSE helps in finding optimal model parameters[1].\n\n### Limitations\n\n- **Scale Dependency**: The magnitude of MSE depends on the scale of the target variable, making it difficult to compare across different datasets without normalization.\n- **Bias and Variance Trade-off**: MSE incorporates both variance and bias components of an estimator, which can complicate its interpretation when analyzing model performance[1][3]."
+        },
+        {
+            "role": "assistant",
+            "content": "Mean Squared Error (MSE)"
+        },
+        {
+            "role": "user",
+            "content": "## Alan Turing\'s Role in Computer Science\n\nAlan Turing is widely regarded as one of the founding figures of computer science, with several key contributions that have had a lasting impact on the field.\n\n### **The Turing Machine**\n\n- In 1936, Turing introduced the concept of the Turing Machine in his paper 'On Computable Numbers, with an Application to the Entscheidungsproblem.' This theoretical machine laid the groundwork for modern computing by providing a formalization of the concepts of algorithm and computation[3][9]. The Turing Machine is a simple abstract device that manipulates symbols on a strip of tape according to a set of rules. It is capable of simulating the logic of any computer algorithm, making it a fundamental model for understanding computation[4].\n\n### **Cryptanalysis and World War II**\n\n- During World War II, Turing played a crucial role in breaking German ciphers, particularly those encrypted by the Enigma machine. He developed an electromechanical device known as the Bombe, which significantly enhanced the Allies\' ability to decode Enigma-encrypted messages[2][4]. His work at Bletchley Park was pivotal in deciphering German naval communications, contributing to the Allied victory in the Battle of the Atlantic[5].\n\n### **The Turing Test**\n\n- In 1950, Turing proposed what is now known as the Turing Test in his paper 'Computing Machinery and Intelligence.' The test was designed to assess a machine\'s ability to exhibit intelligent behavior indistinguishable from that of a human. This concept has been foundational in artificial intelligence research and continues to influence discussions about machine intelligence today[1][7].\n\n### **Legacy**\n\n- Beyond these contributions, Turing\'s work on computability theory and his proof of the Halting Problem have been instrumental in shaping theoretical computer science[4]. Despite facing significant personal challenges and discrimination during his lifetime, Turing\'s innovations continue to influence modern technology and computing."
+        },
+        {
+            "role": "assistant",
+            "content": "Alan Turing's Role in Computer Science"
+        },
+        {
+            "role": "user",
+            "content": "Who won the 2024 Super Bowl?"
+        },
+        {
+            "role": "assistant",
+            "content": "2024 Super Bowl winner"
+        },
+        {
+            "role": "user",
+            "content": text
+        }
+    ]
+
+# Topic responses are cached under the model and the full prompt built from the normalized text
+def _topic_key(text : str):
+    return [MODEL, _topic_messages(normalize_input(budget_text(text, TOPIC_INPUT_MAX_TOKENS)))]
+
+@response_cache.cached("get_topic", _topic_key, TopicResponse)
 def get_topic(text : str) -> TopicResponse | None:
     """
     Return the topic of the text. Differs from get_summary by only stating the topic, not in full sentences.
     """
-    global client
     
     
-    chat_response = client.chat.parse(
+    chat_response = get_mistral_client().chat.parse(
+        model=MODEL,
+        messages=_topic_messages(budget_text(text, TOPIC_INPUT_MAX_TOKENS)),
+        response_format=TopicResponse,
+        temperature=0
+    )
+    output = json.loads(chat_response.choices[0].message.content)
+    return TopicResponse(**output)
+
+@response_cache.cached("get_topic", _topic_key, TopicResponse)
+async def get_topic_async(text : str) -> TopicResponse | None:
+    """Async variant of get_topic."""
+    chat_response = await get_mistral_client().chat.parse_async(
         model=MODEL,
-        messages=[
-            {
-                "role": "system", 
-                "content": "Return the topic of the user's statement. This should be a term or phrase, not a complete sentence."
-            },
-            {
-                "role": "user", 
-                "content": "## Mean Squared Error (MSE) Explained\n\nMean Squared Error (MSE) is a statistical measure used to evaluate the accuracy of an estimator or a predictive model. It quantifies the average squared difference between the estimated values (predictions) and the actual values (observations).\n\n### Calculation\n\nThe formula for MSE is:\n\n\\[ \\text{MSE} = \\frac{1}{n} \\sum_{i=1}^{n} (y_i - \\hat{y}_i)^2 \\]\n\nWhere:\n- \\( n \\) is the number of observations.\n- \\( y_i \\) is the actual observed value.\n- \\( \\hat{y}_i \\) is the predicted value.\n- The summation runs over all observations.\n\n### Interpretation\n\n- **Positive Values**: MSE is always non-negative, with lower values indicating better model performance. An MSE of zero implies perfect predictions, which is rarely achievable in practice[1][2].\n- **Sensitivity to Outliers**: Because errors are squared, larger errors have a disproportionately large impact on the MSE, making it sensitive to outliers[5].\n- **Units**: The units of MSE are the square of the units of the original data, which can make interpretation less intuitive compared to other metrics like Root Mean Squared Error (RMSE)[2].\n\n### Applications\n\n- **Model Evaluation**: In regression analysis and machine learning, MSE is used to assess how well a model predicts outcomes by comparing predicted values against actual data[5].\n- **Comparative Analysis**: MSE allows for comparing different models or estimators. A lower MSE indicates a model that better fits the data[4].\n- **Optimization**: In algorithms like gradient descent, minimizing MSE helps in finding optimal model parameters[1].\n\n### Limitations\n\n- **Scale Dependency**: The magnitude of MSE depends on the scale of the target variable, making it difficult to compare across different datasets without normalization.\n- **Bias and Variance Trade-off**: MSE incorporates both variance and bias components of an estimator, which can complicate its interpretation when analyzing model performance[1][3]."
-            },
-            {
-                "role": "assistant",
-                "content": "Mean Squared Error (MSE)"
-            },
-            {
-                "role": "user",
-                "content": "## Alan Turing\'s Role in Computer Science\n\nAlan Turing is widely regarded as one of the founding figures of computer science, with several key contributions that have had a lasting impact on the field.\n\n### **The Turing Machine**\n\n- In 1936, Turing introduced the concept of the Turing Machine in his paper 'On Computable Numbers, with an Application to the Entscheidungsproblem.' This theoretical machine laid the groundwork for modern computing by providing a formalization of the concepts of algorithm and computation[3][9]. The Turing Machine is a simple abstract device that manipulates symbols on a strip of tape according to a set of rules. It is capable of simulating the logic of any computer algorithm, making it a fundamental model for understanding computation[4].\n\n### **Cryptanalysis and World War II**\n\n- During World War II, Turing played a crucial role in breaking German ciphers, particularly those encrypted by the Enigma machine. He developed an electromechanical device known as the Bombe, which significantly enhanced the Allies\' ability to decode Enigma-encrypted messages[2][4]. His work at Bletchley Park was pivotal in deciphering German naval communications, contributing to the Allied victory in the Battle of the Atlantic[5].\n\n### **The Turing Test**\n\n- In 1950, Turing proposed what is now known as the Turing Test in his paper 'Computing Machinery and Intelligence.' The test was designed to assess a machine\'s ability to exhibit intelligent behavior indistinguishable from that of a human. This concept has been foundational in artificial intelligence research and continues to influence discussions about machine intelligence today[1][7].\n\n### **Legacy**\n\n- Beyond these contributions, Turing\'s work on computability theory and his proof of the Halting Problem have been instrumental in shaping theoretical computer science[4]. Despite facing significant personal challenges and discrimination during his lifetime, Turing\'s innovations continue to influence modern technology and computing."
-            },
-            {
-                "role": "assistant",
-                "content": "Alan Turing's Role in Computer Science"
-            },
-            {
-                "role": "user",
-                "content": "Who won the 2024 Super Bowl?"
-            },
-            {
-                "role": "assistant",
-                "content": "2024 Super Bowl winner"
-            },
-            {
-                "role": "user",
-                "content": text
-            }
-        ],
+        messages=_topic_messages(budget_text(text, TOPIC_INPUT_MAX_TOKENS)),
         response_format=TopicResponse,
         temperature=0
     )
@@ -97,59 +147,83 @@ class TopicsResponse(BaseModel):
     """
     topics : List[Topic]
 
+def _topics_messages(text : str) -> List[dict]:
+    return [
+        {
+            "role": "system", 
+            "content": "Return the key topics of the user's statement. Topic names should be as descriptive as possible and interpretable even when taken out of context. For example, text about Shakespeare that talks about his birth should have topic name \"Shakespeare's Birth\" instead of just \"Birth\". Topic information should be the information pertaining to each topic."
+        },
+        {
+            "role": "user",
+            "content": text
+        }
+    ]
+
+def _topics_key(text : str):
+    return [MODEL, _topics_messages(normalize_input(text))]
+
+@response_cache.cached("get_topics", _topics_key, TopicsResponse)
 def get_topics(text : str) -> TopicsResponse | None:
     """
     Return multiple topics from a text.
     """
-    global client
     
-    chat_response = client.chat.parse(
+    chat_response = get_mistral_client().chat.parse(
+        model=MODEL,
+        messages=_topics_messages(text),
+        response_format=TopicsResponse,
+        temperature=0
+    )
+    output = json.loads(chat_response.choices[0].message.content)
+    return TopicsResponse(**output)
+
+@response_cache.cached("get_topics", _topics_key, TopicsResponse)
+async def get_topics_async(text : str) -> TopicsResponse | None:
+    """Async variant of get_topics."""
+    chat_response = await get_mistral_client().chat.parse_async(
         model=MODEL,
-        messages=[
-            {
-                "role": "system", 
-                "content": "Return the key topics of the user's statement. Topic names should be as descriptive as possible and interpretable even when taken out of context. For example, text about Shakespeare that talks about his birth should have topic name \"Shakespeare's Birth\" instead of just \"Birth\". Topic information should be the information pertaining to each topic."
-            },
-            {
-                "role": "user",
-                "content": text
-            }
-        ],
+        messages=_topics_messages(text),
         response_format=TopicsResponse,
         temperature=0
     )
     output = json.loads(chat_response.choices[0].message.content)
     return TopicsResponse(**output)
 
+def _summary_messages(text : str) -> List[dict]:
+    return [
+        {
+            "role": "system", 
+            "content": "Your job is to summarize the user's input, focusing on key details, concepts, and methods."
+        },
+        {
+            "role": "user", 
+            "content": text
+        },
+    ]
+
 def get_summary(text : str) -> str:
     """
-    Returns a summary of the text using Mistral
+    Returns a summary of the text using Mistral. The text is cleaned and cut down to
+    SUMMARY_INPUT_MAX_TOKENS tokens first.
     """
-    chat_response = client.chat.complete(
+    chat_response = get_mistral_client().chat.complete(
         model=MODEL,
-        messages=[
-            {
-                "role": "system", 
-                "content": "Your job is to summarize the user's input, focusing on key details, concepts, and methods."
-            },
-            {
-                "role": "user", 
-                "content": text
-            },
-        ],
+        messages=_summary_messages(budget_text(text, SUMMARY_INPUT_MAX_TOKENS)),
         temperature=0
     )
     output = chat_response.choices[0].message.content
     return output
 
-def get_collective_summary(sources : List[Any]) -> str:
-    """
-    Returns a collective summary of texts using Mistral. 
-    Differs from get_summary since it is supposed to compare and summarize multiple texts.
-    """
-    global client
+async def get_summary_async(text : str) -> str:
+    """Async variant of get_summary."""
+    chat_response = await get_mistral_client().chat.complete_async(
+        model=MODEL,
+        messages=_summary_messages(budget_text(text, SUMMARY_INPUT_MAX_TOKENS)),
+        temperature=0
+    )
+    return chat_response.choices[0].message.content
 
-    system_prompt = """
+COLLECTIVE_SUMMARY_PROMPT = """
     <system_prompt>
     You are a highly capable Large Language Model whose primary goal is to summarize information in a concise, accurate, and contextually aware way.
 
@@ -169,44 +243,92 @@ def get_collective_summary(sources : List[Any]) -> str:
     </system_prompt>
     """.strip()
 
-    promptified_sources = "\n\n".join([str(source) for source in sources])
+def _collective_summary_messages(sources : List[Any]) -> List[dict]:
+    promptified_sources = "\n\n".join(budget_sources(sources, SUMMARY_INPUT_MAX_TOKENS))
+    return [
+        {
+            "role": "system", 
+            "content": COLLECTIVE_SUMMARY_PROMPT
+        },
+        {
+            "role": "user", 
+            "content": f"Summarize these:\n\n{promptified_sources}"
+        },
+    ]
+
+def get_collective_summary(sources : List[Any]) -> str:
+    """
+    Returns a collective summary of texts using Mistral. 
+    Differs from get_summary since it is supposed to compare and summarize multiple texts.
+    """
 
-    chat_response = client.chat.complete(
+    chat_response = get_mistral_client().chat.complete(
         model=MODEL,
-        messages=[
-            {
-                "role": "system", 
-                "content": system_prompt
-            },
-            {
-                "role": "user", 
-                "content": f"Summarize these:\n\n{promptified_sources}"
-            },
-        ],
+        messages=_collective_summary_messages(sources),
         temperature=0
     )
     output = chat_response.choices[0].message.content
     return output
 
-def get_image_description(base64_image):
-    global client
+async def get_collective_summary_async(sources : List[Any]) -> str:
+    """Async variant of get_collective_summary."""
+    chat_response = await get_mistral_client().chat.complete_async(
+        model=MODEL,
+        messages=_collective_summary_messages(sources),
+        temperature=0
+    )
+    return chat_response.choices[0].message.content
+
+# Prompt for the Pixtral model
+IMAGE_DESCRIPTION_PROMPT = "Please provide a detailed description of the given image."
+
+def _image_description_key(base64_image : str) -> str:
+    return hashlib.sha256(f"{PIXTRAL_MODEL}\n{IMAGE_DESCRIPTION_PROMPT}\n{base64_image}".encode("utf-8")).hexdigest()
 
-    # Prompt for the Pixtral model
-    prompt = "Please provide a detailed description of the given image."
-    # Prepare input for the Pixtral API
-    messages = [
+def _image_description_messages(base64_image : str, mime_type : str) -> List[dict]:
+    return [
         {
             "role": "user",
             "content": [
-                {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
+                {"type": "text", "text": IMAGE_DESCRIPTION_PROMPT},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}}
             ]
         }
     ]
+
+def get_image_description(base64_image : str, mime_type : str = "image/png") -> str:
+    """
+    Returns a detailed description of a base64-encoded image using Pixtral.
+    Descriptions are cached on disk by image content, so re-captures and re-ingests of the
+    same image skip the vision call.
+    """
+
+    cache_key = _image_description_key(base64_image)
+    cached = description_cache.get(cache_key)
+    if cached is not None:
+        return cached.decode("utf-8")
+
     # Perform inference
-    response = client.chat.complete(
+    response = get_mistral_client().chat.complete(
         model=PIXTRAL_MODEL,
-        messages=messages
+        messages=_image_description_messages(base64_image, mime_type)
     )
+    description = response.choices[0].message.content
+    description_cache.set(cache_key, description.encode("utf-8"))
     # Return the model's output
-    return response.choices[0].message.content
\ No newline at end of file
+    return description
+
+async def get_image_description_async(base64_image : str, mime_type : str = "image/png") -> str:
+    """Async variant of get_image_description, sharing its cache."""
+    cache_key = _image_description_key(base64_image)
+    cached = await asyncio.to_thread(description_cache.get, cache_key)
+    if cached is not None:
+        return cached.decode("utf-8")
+
+    response = await get_mistral_client().chat.complete_async(
+        model=PIXTRAL_MODEL,
+        messages=_image_description_messages(base64_image, mime_type)
+    )
+    description = response.choices[0].message.content
+    await asyncio.to_thread(description_cache.set, cache_key, description.encode("utf-8"))
+    return description
@@ -3,12 +3,16 @@ Client for interacting with the Perplexity AI API. This module provides function
 searches and get related topics using Perplexity's language models.
 """
 
-import requests
 import simplejson as json
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import os
-from typing import List
+from typing import List, Type
+
+from cache.response_cache import normalize_input
+from clients.budget import TOPIC_INPUT_MAX_TOKENS, budget_text
+from clients.cache import response_cache
+from clients.http import get_async_client, get_client
 
 load_dotenv()
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
@@ -29,37 +33,23 @@ class Response(BaseModel):
     thoughts: str
     answer: str
 
-def get_search_response(user_prompt : str) -> Response:
+class RelatedTopic(BaseModel):
+    name: str
+    topic_information: str
+
+class TopicWithRelatedTopics(BaseModel):
     """
-    Performs a search query using Perplexity AI and returns a structured response.
-    
-    Args:
-        user_prompt (str): The user's search query or question
-        
-    Returns:
-        Response: A Response object containing the model's thoughts and answer
-        
-    Raises:
-        Exception: If there's an error in API response or JSON parsing
-    """  
-    payload = {
-        "model": MODEL,
-        "messages": [
-            {
-                "role": "system",
-                "content": "Please provide a precise answer. Output a JSON object with fields `thoughts` and `answer`. Your `thoughts` should be a deliberation of details that the user may want to know. Then, provide your `answer`."
-            },
-            {
-                "role": "user",
-                "content": user_prompt
-            },
-        ],
-        "response_format": {
-            "type": "json_schema",
-            "json_schema": {"schema": Response.model_json_schema()},
-        },
-    }
-    response = requests.post(URL, headers=HEADERS, json=payload).json()
+    Response model of the fused enrichment call.
+
+    Attributes:
+        topic (str): The main topic of the input
+        topics (List[RelatedTopic]): The main topic followed by up to 3 adjacent topics, with information about each
+    """
+    topic: str
+    topics: List[RelatedTopic]
+
+def _parse_response(response : dict, response_model : Type[BaseModel] = Response) -> BaseModel:
+    """Extract the structured response from a chat completion, logging the raw response on failure."""
     raw_content = ...
     try:
         raw_content = response["choices"][0]["message"]["content"].strip()
@@ -70,7 +60,7 @@ def get_search_response(user_prompt : str) -> Response:
 
     try:
         content = json.loads(raw_content, strict=False)
-        return Response(**content)
+        return response_model(**content)
     except Exception as e:
         print("Error decoding JSON. Raw content:")
         print(raw_content)
@@ -78,88 +68,146 @@ def get_search_response(user_prompt : str) -> Response:
         print(response)
         raise e
 
+# Requests go through the shared pooled clients, so connections are reused across calls
+def _post(payload : dict, response_model : Type[BaseModel] = Response) -> BaseModel:
+    response = get_client().post(URL, headers=HEADERS, json=payload).json()
+    return _parse_response(response, response_model)
 
-def get_related_topics(topic : str) -> Response:
-    """
-    Retrieves information about topics related to the input topic.
-    
-    Args:
-        topic (str): The main topic to find related information about
-        
-    Returns:
-        Response: A Response object containing thoughts and a bulleted list of related topics
-        
-    Raises:
-        Exception: If there's an error in API response or JSON parsing
-    """
-    payload = {
+async def _post_async(payload : dict, response_model : Type[BaseModel] = Response) -> BaseModel:
+    response = await get_async_client().post(URL, headers=HEADERS, json=payload)
+    return _parse_response(response.json(), response_model)
+
+def _payload(system_prompt : str, user_prompt : str, response_model : Type[BaseModel] = Response) -> dict:
+    return {
         "model": MODEL,
         "messages": [
             {
                 "role": "system",
-                "content": "Provide in-depth information about the user's input and exactly 3 topics adjacent to it. Output a JSON object with fields `thoughts`, and `answer`."
-                + " \n`thoughts` should be a discussion with yourself about what the user may want to know."
-                + "\n`answer` should be an answer to the user's question, providing extensive information about the original topic and itsadjacent topics in a bulleted list format. Each topic should have at least three sentences."
-                + "\nIf the user is asking about something related to programming, make sure to include code examples and explanations throughout your response."
+                "content": system_prompt
             },
             {
                 "role": "user",
-                "content": "Tell me about " + topic.strip() + " and 3 topics adjacent to it."
+                "content": user_prompt
             },
         ],
         "response_format": {
             "type": "json_schema",
-            "json_schema": {"schema": Response.model_json_schema()},
+            "json_schema": {"schema": response_model.model_json_schema()},
         },
     }
-    response = requests.post(URL, headers=HEADERS, json=payload).json()
-    raw_content = ...
-    try:
-        raw_content = response["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        raise e
 
-    try:
-        content = json.loads(raw_content, strict=False)
-        return Response(**content)
-    except Exception as e:
-        print(json.dumps(payload))
-        print(raw_content)
-        raise e
+def _search_payload(user_prompt : str) -> dict:
+    return _payload(
+        "Please provide a precise answer. Output a JSON object with fields `thoughts` and `answer`. Your `thoughts` should be a deliberation of details that the user may want to know. Then, provide your `answer`.",
+        user_prompt
+    )
 
-def get_related_topics_with_other_topics(topic : str, other_topics : List[str]) -> Response:
+def _related_topics_payload(topic : str) -> dict:
+    return _payload(
+        "Provide in-depth information about the user's input and exactly 3 topics adjacent to it. Output a JSON object with fields `thoughts`, and `answer`."
+        + " \n`thoughts` should be a discussion with yourself about what the user may want to know."
+        + "\n`answer` should be an answer to the user's question, providing extensive information about the original topic and itsadjacent topics in a bulleted list format. Each topic should have at least three sentences."
+        + "\nIf the user is asking about something related to programming, make sure to include code examples and explanations throughout your response.",
+        "Tell me about " + topic.strip() + " and 3 topics adjacent to it."
+    )
+
+def _topic_with_related_topics_payload(text : str) -> dict:
+    return _payload(
+        "Identify the main topic of the content the user is looking at, then provide in-depth information about it and exactly 3 topics adjacent to it. Output a JSON object with fields `topic` and `topics`."
+        + "\n`topic` should be the main topic in a few words."
+        + "\n`topics` should be a list of 4 objects with fields `name` and `topic_information`: first the main topic, then the 3 adjacent topics. Each `topic_information` should have at least three sentences."
+        + "\nIf the content is related to programming, make sure to include code examples and explanations.",
+        "Here is the content I am looking at:\n" + budget_text(text, TOPIC_INPUT_MAX_TOKENS),
+        TopicWithRelatedTopics
+    )
+
+def _related_topics_with_other_topics_payload(topic : str, other_topics : List[str]) -> dict:
     prompted_topics = ""
     for i in range(len(other_topics)):
         prompted_topics += "- " + other_topics[i] + "\n"
-    payload = {
-        "model": MODEL,
-        "messages": [
-            {
-                "role": "system",
-                "content": "Provide in-depth information about the user's input and exactly 3 topics adjacent to it. Output a JSON object with fields `thoughts`, and `answer`."
-                + " \n`thoughts` should be a discussion with yourself about what the user may want to know."
-                + "\n`answer` should be an answer to the user's question, providing extensive information about the original topic and its adjacent topics in a bulleted list format. Each topic should have at least three sentences."
-                + "\nIf the user is asking about something related to programming, make sure to include code examples and explanations throughout your response."
-            },
-            {
-                "role": "user",
-                "content": "Tell me about " + topic.strip() + " and 3 topics adjacent to it. Some potentially related topics we are aware of are:\n" + prompted_topics
-            },
-        ],
-        "response_format": {
-            "type": "json_schema",
-            "json_schema": {"schema": Response.model_json_schema()},
-        },
-    }
-    response = requests.post(URL, headers=HEADERS, json=payload).json()
-    raw_content = ...
-    try:
-        raw_content = response["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        raise e
+    return _payload(
+        "Provide in-depth information about the user's input and exactly 3 topics adjacent to it. Output a JSON object with fields `thoughts`, and `answer`."
+        + " \n`thoughts` should be a discussion with yourself about what the user may want to know."
+        + "\n`answer` should be an answer to the user's question, providing extensive information about the original topic and its adjacent topics in a bulleted list format. Each topic should have at least three sentences."
+        + "\nIf the user is asking about something related to programming, make sure to include code examples and explanations throughout your response.",
+        "Tell me about " + topic.strip() + " and 3 topics adjacent to it. Some potentially related topics we are aware of are:\n" + prompted_topics
+    )
 
-    try:
-        content = json.loads(raw_content, strict=False)
-        return Response(**content)
-    except Exception as e:
-        raise e
\ No newline at end of file
+def get_search_response(user_prompt : str) -> Response:
+    """
+    Performs a search query using Perplexity AI and returns a structured response.
+    
+    Args:
+        user_prompt (str): The user's search query or question
+        
+    Returns:
+        Response: A Response object containing the model's thoughts and answer
+        
+    Raises:
+        Exception: If there's an error in API response or JSON parsing
+    """  
+    return _post(_search_payload(user_prompt))
+
+async def get_search_response_async(user_prompt : str) -> Response:
+    """Async variant of get_search_response."""
+    return await _post_async(_search_payload(user_prompt))
+
+
+# Related topics are cached per case-insensitive topic, shared by the sync and async variants
+def _related_topics_key(topic : str):
+    return _related_topics_payload(normalize_input(topic).lower())
+
+@response_cache.cached("get_related_topics", _related_topics_key, Response)
+def get_related_topics(topic : str) -> Response:
+    """
+    Retrieves information about topics related to the input topic.
+    
+    Args:
+        topic (str): The main topic to find related information about
+        
+    Returns:
+        Response: A Response object containing thoughts and a bulleted list of related topics
+        
+    Raises:
+        Exception: If there's an error in API response or JSON parsing
+    """
+    return _post(_related_topics_payload(topic))
+
+@response_cache.cached("get_related_topics", _related_topics_key, Response)
+async def get_related_topics_async(topic : str) -> Response:
+    """Async variant of get_related_topics."""
+    return await _post_async(_related_topics_payload(topic))
+
+def get_related_topics_with_other_topics(topic : str, other_topics : List[str]) -> Response:
+    return _post(_related_topics_with_other_topics_payload(topic, other_topics))
+
+async def get_related_topics_with_other_topics_async(topic : str, other_topics : List[str]) -> Response:
+    """Async variant of get_related_topics_with_other_topics."""
+    return await _post_async(_related_topics_with_other_topics_payload(topic, other_topics))
+
+
+# The fused call replaces get_topic, get_related_topics and get_topics with a single request
+def _topic_with_related_topics_key(text : str):
+    return _topic_with_related_topics_payload(normalize_input(budget_text(text, TOPIC_INPUT_MAX_TOKENS)))
+
+@response_cache.cached("get_topic_with_related_topics", _topic_with_related_topics_key, TopicWithRelatedTopics)
+def get_topic_with_related_topics(text : str) -> TopicWithRelatedTopics:
+    """
+    Finds the main topic of a piece of content and structured information about it and 3
+    adjacent topics in a single request.
+
+    Args:
+        text (str): The content to enrich, e.g. the text of a web page
+
+    Returns:
+        TopicWithRelatedTopics: The main topic and the list of topics with their information
+
+    Raises:
+        Exception: If there's an error in API response or JSON parsing
+    """
+    return _post(_topic_with_related_topics_payload(text), TopicWithRelatedTopics)
+
+@response_cache.cached("get_topic_with_related_topics", _topic_with_related_topics_key, TopicWithRelatedTopics)
+async def get_topic_with_related_topics_async(text : str) -> TopicWithRelatedTopics:
+    """Async variant of get_topic_with_related_topics."""
+    return await _post_async(_topic_with_related_topics_payload(text), TopicWithRelatedTopics)
@@ -0,0 +1,129 @@
+"""
+Token-aware chunking of long documents for indexing, and regrouping of chunk-level search
+results back into their parent documents.
+
+Tokens are approximated by words and punctuation marks, which slightly undercounts the
+word pieces of the MiniLM tokenizer; the default chunk size leaves headroom for that so
+chunks stay within the embedder's input limit.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Metadata fields that only describe a chunk, dropped when regrouping into the parent
+CHUNK_FIELDS = ("parent_id", "chunk_index", "chunk_count", "continuation")
+
+# Matches unchunked documents and the first chunk of every chunked one, so listings see each
+# document once ($ne also matches documents without the field)
+FIRST_ROWS = {"continuation": {"$ne": True}}
+
+
+def count_tokens(text : str) -> int:
+    """Approximate number of tokens in the text."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def chunk_text(text : str, max_tokens : int = 160, overlap_tokens : int = 32) -> List[str]:
+    """
+    Split text into chunks of at most `max_tokens` tokens, each overlapping the previous
+    one by about `overlap_tokens`. Chunks end at a line break when there is one in the last
+    quarter of the window, so lines are rarely cut in half.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+
+    spans = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+    if len(spans) <= max_tokens:
+        return [text.strip()] if text.strip() else []
+
+    chunks = []
+    start = 0
+    while start < len(spans):
+        end = min(start + max_tokens, len(spans))
+        if end < len(spans):
+            # Prefer to break after the last token that is followed by a newline
+            for candidate in range(end - 1, start + (3 * max_tokens) // 4, -1):
+                if "\n" in text[spans[candidate][1]:spans[candidate + 1][0]]:
+                    end = candidate + 1
+                    break
+        chunk = text[spans[start][0]:spans[end - 1][1]].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(spans):
+            break
+        start = max(end - overlap_tokens, start + 1)
+    return chunks
+
+
+def chunk_document(
+    id : str,
+    content : str,
+    metadata : Dict[str, Any],
+    max_tokens : int = 160,
+    overlap_tokens : int = 32
+) -> Dict[str, List[Any]]:
+    """
+    Split a document into chunks that carry their parent's id and metadata.
+
+    Returns:
+        Dictionary with "ids", "documents" and "metadatas" lists ready for collection.add
+    """
+    chunks = chunk_text(content, max_tokens, overlap_tokens) or [content]
+    return {
+        "ids": [f"{id}::{i}" for i in range(len(chunks))],
+        "documents": chunks,
+        "metadatas": [
+            {**metadata, "parent_id": id, "chunk_index": i, "chunk_count": len(chunks), "continuation": i > 0}
+            for i in range(len(chunks))
+        ]
+    }
+
+
+def merge_chunks(chunks : List[str]) -> str:
+    """
+    Join the chunks of a document, in order, back into its text. Each chunk starts inside
+    the previous one's overlap, so the longest suffix of the text that is also a prefix of
+    the next chunk is only kept once.
+    """
+    text = chunks[0] if chunks else ""
+    for chunk in chunks[1:]:
+        overlap = next((size for size in range(min(len(text), len(chunk)), 0, -1) if text.endswith(chunk[:size])), 0)
+        text = text + chunk[overlap:] if overlap else f"{text}\n{chunk}"
+    return text
+
+
+def group_chunks(result : Dict[str, List[Any]], n_results : Optional[int] = None) -> Dict[str, List[Any]]:
+    """
+    Regroup a chunk-level query result into parent documents.
+
+    Each parent appears once, ranked by its best chunk. Its document is the text of its
+    matching chunks in page order and its metadata is the parent's, with `matched_chunks`
+    listing which chunks matched. Documents that were never chunked pass through unchanged.
+    """
+    groups : Dict[str, Dict[str, Any]] = {}
+    order : List[str] = []
+    for doc, meta, dist, chunk_id in zip(result["documents"], result["metadatas"], result["distances"], result["ids"]):
+        meta = meta or {}
+        parent_id = meta.get("parent_id", chunk_id)
+        if parent_id not in groups:
+            groups[parent_id] = {"chunks": [], "metadata": meta, "distance": dist}
+            order.append(parent_id)
+        groups[parent_id]["chunks"].append((meta.get("chunk_index", 0), doc))
+
+    if n_results is not None:
+        order = order[:n_results]
+
+    grouped = {"documents": [], "metadatas": [], "distances": [], "ids": []}
+    for parent_id in order:
+        group = groups[parent_id]
+        chunks = sorted(group["chunks"], key=lambda chunk: chunk[0])
+        metadata = {key: value for key, value in group["metadata"].items() if key not in CHUNK_FIELDS}
+        if "parent_id" in group["metadata"]:
+            metadata["matched_chunks"] = ",".join(str(index) for index, _ in chunks)
+        grouped["documents"].append("\n...\n".join(doc for _, doc in chunks))
+        grouped["metadatas"].append(metadata)
+        grouped["distances"].append(group["distance"])
+        grouped["ids"].append(parent_id)
+    return grouped
@@ -0,0 +1,78 @@
+"""
+Embedding function wrapper with a persistent cache. Vectors are stored on disk as float32
+bytes keyed by a hash of the embedding model and the input text, so re-upserts of unchanged
+content, re-ingests and repeated queries skip the embedding model entirely.
+"""
+
+import hashlib
+import logging
+from typing import List, Optional
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from cache.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_model_id(embedding_function) -> str:
+    """
+    Identify the model behind an embedding function: its `model_id` attribute if it has one,
+    else its class and model name (`MODEL_NAME`, or `_model_name` as Chroma's API-backed
+    embedding functions store it). The ID keys cached vectors and is checked when
+    snapshots are imported, so an embedding function naming no model is rejected rather
+    than given an ID that would stay the same when the model changes.
+    """
+    model_id = getattr(embedding_function, "model_id", None)
+    if model_id:
+        return model_id
+    model_name = getattr(embedding_function, "MODEL_NAME", None) or getattr(embedding_function, "_model_name", None)
+    if not model_name:
+        raise ValueError(
+            f"Cannot tell which model {type(embedding_function).__name__} uses; pass model_id explicitly"
+        )
+    return f"{type(embedding_function).__name__}:{model_name}"
+
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """
+    Wraps an embedding function and caches its vectors in a DiskCache.
+
+    Args:
+        inner: The embedding function that computes vectors on a cache miss
+        cache: Cache the vectors are stored in
+        model_id: Identifies the model of `inner` in cache keys (resolved from `inner`
+            by embedding_model_id if not given)
+    """
+
+    def __init__(self, inner : EmbeddingFunction, cache : DiskCache, model_id : Optional[str] = None):
+        self.inner = inner
+        self.cache = cache
+        self.model_id = model_id or embedding_model_id(inner)
+
+    def key(self, text : str) -> str:
+        return hashlib.sha256(f"{self.model_id}\n{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, input : Documents) -> Embeddings:
+        keys = [self.key(text) for text in input]
+        cached = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, in a single batch
+        missing : List[int] = []
+        seen = set()
+        for i, key in enumerate(keys):
+            if key not in cached and key not in seen:
+                missing.append(i)
+                seen.add(key)
+
+        if missing:
+            vectors = self.inner([input[i] for i in missing])
+            computed = {}
+            for i, vector in zip(missing, vectors):
+                computed[keys[i]] = np.asarray(vector, dtype=np.float32).tobytes()
+            self.cache.set_many(computed)
+            cached.update(computed)
+            logger.debug(f"Embedded {len(missing)} of {len(input)} texts, {len(input) - len(missing)} from cache")
+
+        return [np.frombuffer(cached[key], dtype=np.float32) for key in keys]
@@ -0,0 +1,73 @@
+"""
+Metadata filters for vector store queries.
+
+Documents carry `source` ("screenshot" or "enrichment"), `created_at` (epoch seconds) and,
+for screenshots, `url` and `domain`, so common filters can be pushed down to Chroma
+instead of over-fetching and filtering in Python.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+SOURCES = ("screenshot", "enrichment")
+
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+
+def url_domain(url : str) -> str:
+    """Host name of a URL without a leading "www.", or "" if it has none."""
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def parse_timestamp(timestamp : str) -> Optional[float]:
+    """Epoch seconds of a legacy `%Y%m%d_%H%M%S` timestamp string, or None if it doesn't parse."""
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def build_where(
+    where : Optional[Dict[str, Any]] = None,
+    source : Optional[str] = None,
+    since : Optional[float] = None,
+    until : Optional[float] = None,
+    url : Optional[str] = None,
+    domain : Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Combine a raw Chroma `where` filter with the common filters into a single filter.
+
+    Args:
+        where: Chroma metadata filter to include as is
+        source: Only documents of this source type ("screenshot" or "enrichment")
+        since: Only documents created at or after this epoch time
+        until: Only documents created before this epoch time
+        url: Only documents captured from this exact URL
+        domain: Only documents captured from this domain (e.g. "github.com")
+
+    Returns:
+        A Chroma `where` filter, or None if no filter was given.
+    """
+    if source is not None and source not in SOURCES:
+        raise ValueError(f"Unknown source: {source}")
+
+    conditions = [where] if where else []
+    if source is not None:
+        conditions.append({"source": source})
+    if since is not None:
+        conditions.append({"created_at": {"$gte": since}})
+    if until is not None:
+        conditions.append({"created_at": {"$lt": until}})
+    if url is not None:
+        conditions.append({"url": url})
+    if domain is not None:
+        conditions.append({"domain": url_domain(domain if "//" in domain else f"//{domain}")})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
@@ -0,0 +1,186 @@
+"""
+Persistent BM25 inverted index kept next to a Chroma collection.
+
+OCR text is full of exact identifiers (error messages, function names, package versions)
+that sentence embeddings match poorly, so hybrid queries fuse a lexical ranking from this
+index with the vector ranking. The index lives in SQLite and is updated incrementally as
+documents are added, updated and deleted.
+"""
+
+import heapq
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Identifiers such as "numpy==1.26.4", "foo.bar_baz" or "HTTP/2" stay whole, and are
+# also indexed by their parts so that "numpy" still matches
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-:/=]+\w+)*")
+PART_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text : str) -> List[str]:
+    """Lowercased terms of a text, with compound identifiers followed by their parts."""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        terms.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings : Iterable[List[str]], k : int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several rankings of IDs: each ID scores sum(1 / (k + rank)) over the rankings it
+    appears in. Returns (id, score) pairs, best first.
+    """
+    scores : Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking, start=1):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over the documents of one collection, persisted in SQLite.
+
+    Args:
+        path: SQLite file of the index
+        k1: Term frequency saturation
+        b: Document length normalization
+    """
+
+    def __init__(self, path : str, k1 : float = 1.5, b : float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_doc_id ON postings (doc_id)")
+        self._conn.commit()
+        self._num_docs, self._total_length = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+        ).fetchone()
+
+    def add(self, ids : List[str], documents : List[str]) -> None:
+        """Index documents, replacing any previous version of the same IDs."""
+        with self._lock:
+            self._remove(ids)
+            for id, document in zip(ids, documents):
+                terms = Counter(tokenize(document or ""))
+                length = sum(terms.values())
+                self._conn.execute("INSERT INTO docs (doc_id, length) VALUES (?, ?)", (id, length))
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, id, tf) for term, tf in terms.items()]
+                )
+                self._num_docs += 1
+                self._total_length += length
+            self._conn.commit()
+
+    def remove(self, ids : List[str]) -> None:
+        """Remove documents from the index. Unknown IDs are ignored."""
+        with self._lock:
+            self._remove(ids)
+            self._conn.commit()
+
+    def _remove(self, ids : List[str]) -> None:
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" for _ in batch)
+            count, length = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE doc_id IN ({placeholders})", batch
+            ).fetchone()
+            self._conn.execute(f"DELETE FROM docs WHERE doc_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", batch)
+            self._num_docs -= count
+            self._total_length -= length
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.commit()
+            self._num_docs = 0
+            self._total_length = 0
+
+    def count(self) -> int:
+        return self._num_docs
+
+    def search(self, query : str, limit : int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank the indexed documents against a query.
+
+        Returns:
+            Up to `limit` (id, score) pairs, best first. Documents sharing no term with the
+            query are not returned.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self._num_docs:
+            return []
+
+        with self._lock:
+            num_docs = self._num_docs
+            average_length = self._total_length / num_docs or 1.0
+            postings = {
+                term: self._conn.execute("SELECT doc_id, tf FROM postings WHERE term = ?", (term,)).fetchall()
+                for term in terms
+            }
+            candidates = list({doc_id for rows in postings.values() for doc_id, _ in rows})
+            lengths = {}
+            for start in range(0, len(candidates), 500):
+                batch = candidates[start:start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                lengths.update(self._conn.execute(
+                    f"SELECT doc_id, length FROM docs WHERE doc_id IN ({placeholders})", batch
+                ).fetchall())
+
+        scores : Dict[str, float] = {}
+        for rows in postings.values():
+            if not rows:
+                continue
+            idf = math.log(1 + (num_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            for doc_id, tf in rows:
+                norm = self.k1 * (1 - self.b + self.b * lengths.get(doc_id, 0) / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def document_frequencies(self, terms : Iterable[str]) -> Tuple[int, Dict[str, int]]:
+        """Number of indexed documents, and the number of documents containing each term."""
+        terms = list(set(terms))
+        frequencies = {}
+        with self._lock:
+            for start in range(0, len(terms), 500):
+                batch = terms[start:start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                frequencies.update(self._conn.execute(
+                    f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", batch
+                ).fetchall())
+            return self._num_docs, frequencies
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            terms = self._conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        return {
+            "documents": self._num_docs,
+            "terms": terms,
+            "average_length": self._total_length / self._num_docs if self._num_docs else 0.0
+        }
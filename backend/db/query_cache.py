@@ -0,0 +1,101 @@
+"""
+In-process LRU + TTL cache for vector store query results.
+
+Keys include a per-collection generation counter that every write to the collection bumps,
+so results computed before a write can never be served after it.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace and case so trivially different queries share an entry."""
+    return " ".join(text.split()).lower()
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache of query results with a time to live.
+
+    Args:
+        max_entries: Maximum number of cached results (0 disables the cache)
+        ttl_seconds: Seconds a result stays valid even without writes
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(self, collection_name: str, query_text: str, n_results: int, where: Optional[Dict[str, Any]] = None, **options) -> Tuple:
+        """Build the cache key for a query against the collection's current generation."""
+        with self._lock:
+            generation = self._generations.get(collection_name, 0)
+        extra = json.dumps({"where": where, **options}, sort_keys=True, default=str)
+        return (collection_name, generation, normalize_query(query_text), n_results, extra)
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        if not self.max_entries:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy_result(entry[1])
+
+    def set(self, key: Tuple, result: Dict[str, Any]) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            # A write may have happened while the query ran; don't cache a stale generation
+            if key[1] != self._generations.get(key[0], 0):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, _copy_result(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection_name: str) -> None:
+        """Bump the collection's generation so none of its cached results are served again."""
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            self.invalidations += 1
+            stale = [key for key in self._entries if key[0] == collection_name]
+            for key in stale:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # Callers may mutate the lists they get back; never hand out the cached ones
+    return {key: list(value) if isinstance(value, list) else value for key, value in result.items()}
@@ -0,0 +1,228 @@
+"""
+Bulk export and import of collections together with their embeddings.
+
+A snapshot is a directory with a `manifest.json` and one file pair per chunk of documents:
+either `part-NNNNN.jsonl` (id, document and metadata per line) with `part-NNNNN.npy`
+(float32 embedding matrix), or a single `part-NNNNN.parquet` with the same columns.
+Imports upsert the stored vectors directly, so restoring a snapshot never runs the
+embedding model. Parquet needs the optional pyarrow package.
+
+Usage (from backend/):
+    python -m db.snapshot export snapshots/backup --collection screenshots_collection
+    python -m db.snapshot import snapshots/backup --collection screenshots_collection
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from db.embedding_cache import embedding_model_id
+from db.vector_store import VectorStore, get_vector_store
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Directory the API reads and writes named snapshots in
+SNAPSHOT_DIRECTORY = os.getenv("SNAPSHOT_DIRECTORY", os.path.join(os.path.dirname(__file__), "..", "snapshots"))
+
+FORMATS = ("npy", "parquet")
+MANIFEST_VERSION = 1
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("The parquet format needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def export_collection(
+    path : str,
+    collection_name : str = "screenshots_collection",
+    format : str = "npy",
+    batch_size : int = 1000,
+    store : Optional[VectorStore] = None
+) -> Dict[str, Any]:
+    """
+    Write a collection with its embeddings to a snapshot directory, one chunk at a time.
+
+    Args:
+        path: Directory to create the snapshot in (must not contain a snapshot yet)
+        collection_name: Collection to export
+        format: "npy" for JSONL + .npy files, or "parquet"
+        batch_size: Number of documents per chunk
+        store: Vector store to read from (defaults to the shared store)
+
+    Returns:
+        The snapshot manifest.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported snapshot format: {format}")
+    if format == "parquet":
+        _require_pyarrow()
+    store = store or get_vector_store()
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        raise FileExistsError(f"A snapshot already exists in {path}")
+    os.makedirs(path, exist_ok=True)
+
+    started = time.monotonic()
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "collection": collection_name,
+        "format": format,
+        "embedding_model": embedding_model_id(store.embedding_function),
+        "created_at": time.time(),
+        "count": 0,
+        "dimension": None,
+        "parts": []
+    }
+    cursor = None
+    while True:
+        page = store.list_documents(
+            limit=batch_size,
+            cursor=cursor,
+            include=["documents", "metadatas", "embeddings"],
+            group_chunks=False,
+            collection_name=collection_name
+        )
+        if page["ids"]:
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            name = f"part-{len(manifest['parts']):05d}"
+            _write_part(path, name, format, page["ids"], page["documents"], page["metadatas"], embeddings)
+            manifest["parts"].append({"name": name, "count": len(page["ids"])})
+            manifest["count"] += len(page["ids"])
+            manifest["dimension"] = int(embeddings.shape[1])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(
+        f"Exported {manifest['count']} documents of collection {collection_name} to {path} "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return manifest
+
+
+def import_collection(
+    path : str,
+    collection_name : Optional[str] = None,
+    store : Optional[VectorStore] = None,
+    allow_model_mismatch : bool = False
+) -> Dict[str, Any]:
+    """
+    Upsert the documents of a snapshot, with their stored embeddings, into a collection.
+
+    Args:
+        path: Snapshot directory
+        collection_name: Collection to import into (defaults to the exported collection)
+        store: Vector store to write to (defaults to the shared store)
+        allow_model_mismatch: Import even if the snapshot was embedded with another model
+            than the store uses, which would make its vectors incomparable with queries
+
+    Returns:
+        Summary with the collection name, number of documents and duration.
+    """
+    store = store or get_vector_store()
+    manifest = read_manifest(path)
+    collection_name = collection_name or manifest["collection"]
+    model = embedding_model_id(store.embedding_function)
+    if manifest["embedding_model"] != model and not allow_model_mismatch:
+        raise ValueError(
+            f"Snapshot was embedded with {manifest['embedding_model']} but the store uses {model}"
+        )
+
+    started = time.monotonic()
+    count = 0
+    for ids, documents, metadatas, embeddings in iter_snapshot(path, manifest):
+        store.add_embedded_documents(ids, documents, metadatas, embeddings, collection_name=collection_name)
+        count += len(ids)
+    duration = time.monotonic() - started
+    logger.info(f"Imported {count} documents into collection {collection_name} from {path} in {duration:.1f}s")
+    return {"collection": collection_name, "count": count, "duration_seconds": round(duration, 3)}
+
+
+def read_manifest(path : str) -> Dict[str, Any]:
+    with open(os.path.join(path, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+    return manifest
+
+
+def iter_snapshot(path : str, manifest : Optional[Dict[str, Any]] = None) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]]:
+    """Yield (ids, documents, metadatas, embeddings) for each chunk of a snapshot."""
+    manifest = manifest or read_manifest(path)
+    for part in manifest["parts"]:
+        yield _read_part(path, part["name"], manifest["format"])
+
+
+def _write_part(path, name, format, ids, documents, metadatas, embeddings) -> None:
+    if format == "parquet":
+        pyarrow = _require_pyarrow()
+        table = pyarrow.table({
+            "id": ids,
+            "document": documents,
+            "metadata": [json.dumps(metadata) if metadata else None for metadata in metadatas],
+            "embedding": pyarrow.FixedSizeListArray.from_arrays(
+                pyarrow.array(embeddings.reshape(-1), type=pyarrow.float32()), embeddings.shape[1]
+            )
+        })
+        pyarrow.parquet.write_table(table, os.path.join(path, f"{name}.parquet"))
+        return
+
+    with open(os.path.join(path, f"{name}.jsonl"), "w") as f:
+        for id, document, metadata in zip(ids, documents, metadatas):
+            f.write(json.dumps({"id": id, "document": document, "metadata": metadata}) + "\n")
+    np.save(os.path.join(path, f"{name}.npy"), embeddings)
+
+
+def _read_part(path, name, format):
+    if format == "parquet":
+        pyarrow = _require_pyarrow()
+        table = pyarrow.parquet.read_table(os.path.join(path, f"{name}.parquet"))
+        embedding = table.column("embedding").combine_chunks()
+        embeddings = embedding.flatten().to_numpy().reshape(len(table), embedding.type.list_size)
+        metadatas = [json.loads(metadata) if metadata else None for metadata in table.column("metadata").to_pylist()]
+        return table.column("id").to_pylist(), table.column("document").to_pylist(), metadatas, embeddings
+
+    ids, documents, metadatas = [], [], []
+    with open(os.path.join(path, f"{name}.jsonl"), "r") as f:
+        for line in f:
+            record = json.loads(line)
+            ids.append(record["id"])
+            documents.append(record["document"])
+            metadatas.append(record["metadata"])
+    return ids, documents, metadatas, np.load(os.path.join(path, f"{name}.npy"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export or import a collection with its embeddings")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot directory")
+    parser.add_argument("--collection", default=None, help="Collection to export (default screenshots_collection) or import into")
+    parser.add_argument("--format", choices=FORMATS, default="npy", help="File format of an export")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per chunk of an export")
+    parser.add_argument("--allow-model-mismatch", action="store_true", help="Import vectors from another embedding model")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        manifest = export_collection(args.path, args.collection or "screenshots_collection", args.format, args.batch_size)
+        print(f"Exported {manifest['count']} documents in {len(manifest['parts'])} parts to {args.path}")
+    else:
+        summary = import_collection(args.path, args.collection, allow_model_mismatch=args.allow_model_mismatch)
+        print(f"Imported {summary['count']} documents into {summary['collection']} in {summary['duration_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
 import os
+import json
+import base64
 import chromadb
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Union
 from chromadb.utils import embedding_functions
 import logging
+import threading
 import uuid
 
+from dotenv import load_dotenv
+
+from cache.disk_cache import DiskCache
+from db.chunking import CHUNK_FIELDS, FIRST_ROWS, chunk_document, group_chunks, merge_chunks
+from db.embedding_cache import CachedEmbeddingFunction
+from db.filters import parse_timestamp, url_domain
+from db.lexical_index import BM25Index, reciprocal_rank_fusion
+from db.query_cache import QueryCache
+
+load_dotenv()
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,197 +30,949 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Create the directory for persistent storage
-PERSIST_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "chroma_db")
+PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", os.path.join(os.path.dirname(__file__), "..", "chroma_db"))
 os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
 
-# Initialize the ChromaDB client with persistent storage
-_client = None
+# Query result cache
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))
 
-def get_client():
-    """Get or create a ChromaDB client instance."""
-    global _client
-    if _client is None:
-        _client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
-    return _client
+# Persistent embedding cache (EMBEDDING_CACHE_MAX_BYTES=0 disables it)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
 
+# Chunking of long documents (sizes in approximate tokens)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "160"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# How many chunks to fetch per requested parent document, so parents with several
+# matching chunks don't crowd the others out of the results
+CHUNK_QUERY_FACTOR = int(os.getenv("CHUNK_QUERY_FACTOR", "4"))
 
+# Lexical (BM25) index kept next to each collection, and the default query mode:
+# "vector" for embedding similarity only, "hybrid" to fuse it with BM25 by reciprocal rank
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+QUERY_MODE = os.getenv("QUERY_MODE", "vector")
+RRF_K = int(os.getenv("RRF_K", "60"))
+QUERY_MODES = ("vector", "hybrid")
 
-# Use the default embedding function from ChromaDB
+# Use the default embedding function from ChromaDB, behind the embedding cache
 default_ef = embedding_functions.DefaultEmbeddingFunction()
+embedding_cache = None
+if EMBEDDING_CACHE_MAX_BYTES:
+    embedding_cache = DiskCache("embeddings", max_bytes=EMBEDDING_CACHE_MAX_BYTES)
+    default_ef = CachedEmbeddingFunction(default_ef, embedding_cache)
 
-def get_or_create_collection(collection_name: str = "screenshots_collection"):
-    """Get an existing collection or create a new one if it doesn't exist."""
-    try:
-        client = get_client()
-        collection = client.get_collection(name=collection_name)
-        logger.info(f"Retrieved existing collection: {collection_name}")
-        return collection
-    except chromadb.errors.InvalidCollectionException:
-        logger.info(f"Creating new collection: {collection_name}")
-        client = get_client()
-        return client.create_collection(
-            name=collection_name,
-            embedding_function=default_ef
-        )
 
-def add_documents(
-    documents: List[str],
-    metadata: Optional[List[Dict[str, Any]]] = None,
-    ids: Optional[List[str]] = None,
-    collection_name: str = "screenshots_collection"
-) -> None:
+class VectorStore:
     """
-    Add documents to the vector store.
-    
+    Long-lived service object around a persistent ChromaDB client.
+
+    Collection handles are resolved once and cached, so the hot paths (add, query, update)
+    do not pay a metadata round trip per call. The cache is invalidated when a collection
+    is deleted. Query results are cached in a QueryCache that every write to a collection
+    invalidates. All methods are safe to call from multiple threads.
+
+    Long documents can be indexed as chunks (see add_chunked_document). Queries search the
+    chunks and regroup them into their parent documents, and deleting or updating the
+    metadata of a parent ID applies to all of its chunks.
+
+    Each collection also has a BM25 index under `<persist_directory>/bm25`, updated on
+    every add, update and delete, which hybrid queries fuse with the vector ranking.
+
     Args:
-        documents: List of document texts to add
-        metadata: Optional list of metadata dictionaries for each document
-        ids: Optional list of unique IDs for each document
-        collection_name: Name of the collection to add documents to
+        persist_directory: Directory the ChromaDB data lives in
+        embedding_function: Embedding function used for every collection
     """
-    logger.info(f"Adding documents to collection {collection_name}")
-    logger.info(f"Number of documents: {len(documents)}")
-    logger.info(f"Document length: {[len(doc) for doc in documents]}")
+
+    def __init__(self, persist_directory: str = PERSIST_DIRECTORY, embedding_function=None):
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function if embedding_function is not None else default_ef
+        self._client = None
+        self._collections: Dict[str, Any] = {}
+        self._lexical_indexes: Dict[str, BM25Index] = {}
+        self._lock = threading.RLock()
+        self.query_cache = QueryCache(max_entries=QUERY_CACHE_SIZE, ttl_seconds=QUERY_CACHE_TTL_SECONDS)
+
+    @property
+    def client(self):
+        """The ChromaDB client, created on first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = chromadb.PersistentClient(path=self.persist_directory)
+        return self._client
+
+    def collection(self, collection_name: str = "screenshots_collection"):
+        """Get the cached handle of a collection, creating the collection if it doesn't exist."""
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                collection = self.client.get_or_create_collection(
+                    name=collection_name,
+                    embedding_function=self.embedding_function
+                )
+                self._collections[collection_name] = collection
+                logger.info(f"Opened collection: {collection_name}")
+        return collection
+
+    def lexical_index(self, collection_name: str = "screenshots_collection") -> Optional[BM25Index]:
+        """
+        Get the BM25 index of a collection, or None if lexical indexing is disabled.
+        An index that is out of sync with its collection (e.g. created before indexing was
+        enabled) is rebuilt when it is first opened.
+        """
+        if not LEXICAL_INDEX_ENABLED:
+            return None
+        index = self._lexical_indexes.get(collection_name)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._lexical_indexes.get(collection_name)
+            if index is None:
+                index = BM25Index(os.path.join(self.persist_directory, "bm25", f"{collection_name}.sqlite3"))
+                count = self.collection(collection_name).count()
+                if index.count() != count:
+                    logger.info(f"Rebuilding BM25 index of collection {collection_name} ({count} documents)")
+                    index.clear()
+                    for page in self._iter_pages(collection_name):
+                        index.add(page["ids"], page["documents"])
+                self._lexical_indexes[collection_name] = index
+        return index
+
+    def _iter_pages(self, collection_name: str, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        cursor = None
+        while True:
+            page = self.list_documents(
+                limit=batch_size,
+                cursor=cursor,
+                include=["documents"],
+                group_chunks=False,
+                collection_name=collection_name
+            )
+            yield page
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    def invalidate(self, collection_name: Optional[str] = None) -> None:
+        """Drop the cached handle of one collection, or of all collections."""
+        with self._lock:
+            if collection_name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(collection_name, None)
+
+    def add_documents(
+        self,
+        documents: List[str],
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        collection_name: str = "screenshots_collection"
+    ) -> None:
+        """
+        Add documents to the vector store.
     
-    collection = get_or_create_collection(collection_name)
+        Args:
+            documents: List of document texts to add
+            metadata: Optional list of metadata dictionaries for each document
+            ids: Optional list of unique IDs for each document
+            collection_name: Name of the collection to add documents to
+        """
+        logger.info(f"Adding documents to collection {collection_name}")
+        logger.info(f"Number of documents: {len(documents)}")
+        logger.info(f"Document length: {[len(doc) for doc in documents]}")
     
-    # If no IDs provided, generate them
-    if ids is None:
-        ids = [str(uuid.uuid4()) for _ in documents]
+        collection = self.collection(collection_name)
     
-    # If no metadata provided, use empty dicts
-    if metadata is None:
-        metadata = [{} for _ in documents]
+        # If no IDs provided, generate them
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
     
-    try:
-        collection.add(
-            documents=documents,
-            metadatas=metadata,
-            ids=ids
+        # If no metadata provided, use empty dicts
+        if metadata is None:
+            metadata = [{} for _ in documents]
+    
+        try:
+            collection.add(
+                documents=documents,
+                metadatas=metadata,
+                ids=ids
+            )
+            index = self.lexical_index(collection_name)
+            if index is not None:
+                index.add(ids, documents)
+            self.query_cache.invalidate(collection_name)
+            logger.info("Successfully added documents to vector store")
+        except Exception as e:
+            logger.error(f"Error adding documents to vector store: {str(e)}")
+            raise
+
+    def add_chunked_document(
+        self,
+        id: str,
+        content: str,
+        metadata: Dict[str, Any],
+        collection_name: str = "screenshots_collection"
+    ) -> int:
+        """
+        Add a long document as overlapping chunks that are embedded in a single batch.
+
+        Every chunk gets the document's metadata plus `parent_id`, `chunk_index` and
+        `chunk_count`, and an ID of the form "<id>::<chunk_index>".
+
+        Args:
+            id: ID of the parent document
+            content: Full text of the document
+            metadata: Metadata of the parent document
+            collection_name: Name of the collection to add the chunks to
+
+        Returns:
+            Number of chunks added.
+        """
+        chunks = chunk_document(id, content, metadata, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+        logger.info(f"Indexing document {id} as {len(chunks['ids'])} chunks")
+        self.add_documents(
+            documents=chunks["documents"],
+            metadata=chunks["metadatas"],
+            ids=chunks["ids"],
+            collection_name=collection_name
         )
-        logger.info("Successfully added documents to vector store")
-    except Exception as e:
-        logger.error(f"Error adding documents to vector store: {str(e)}")
-        raise
-
-def query_documents(
-    query_text: str,
-    n_results: int = 5,
-    collection_name: str = "screenshots_collection"
-) -> Dict[str, Any]:
-    """
-    Query the vector store for similar documents.
+        return len(chunks["ids"])
+
+    def add_embedded_documents(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Optional[Dict[str, Any]]],
+        embeddings: Any,
+        collection_name: str = "screenshots_collection"
+    ) -> None:
+        """
+        Upsert documents together with precomputed embeddings, bypassing the embedding
+        function. Used to restore snapshots; the vectors must come from the same model.
+        """
+        collection = self.collection(collection_name)
+        try:
+            collection.upsert(
+                ids=ids,
+                documents=documents,
+                metadatas=metadatas,
+                embeddings=embeddings
+            )
+            index = self.lexical_index(collection_name)
+            if index is not None:
+                index.add(ids, documents)
+            self.query_cache.invalidate(collection_name)
+        except Exception as e:
+            logger.error(f"Error adding embedded documents to collection {collection_name}: {str(e)}")
+            raise
+
+    def _resolve_ids(self, collection, id: str) -> List[str]:
+        """IDs of the chunks of a parent document, or [id] if the document isn't chunked."""
+        chunks = collection.get(where={"parent_id": id}, include=[])
+        return chunks["ids"] or [id]
+
+    def query_documents(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        collection_name: str = "screenshots_collection",
+        mode: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Query the vector store for similar documents.
     
-    Args:
-        query_text: The text to search for
-        n_results: Number of results to return
-        collection_name: Name of the collection to search in
+        Args:
+            query_text: The text to search for
+            n_results: Number of results to return
+            collection_name: Name of the collection to search in
+            mode: "vector" or "hybrid" (defaults to QUERY_MODE). Hybrid queries fuse the
+                vector ranking with the BM25 ranking, and their distances are those of the
+                vector search (None for documents only the lexical search found).
+            where: Optional Chroma metadata filter (see db.filters.build_where)
+            where_document: Optional Chroma document filter, e.g. {"$contains": "Traceback"}
         
-    Returns:
-        Dictionary containing the query results including documents,
-        metadata, and distances. Returns empty lists if no results found.
-    """
-    logger.info(f"Querying collection {collection_name} for '{query_text}'")
-    collection = get_or_create_collection(collection_name)
+        Returns:
+            Dictionary containing the query results including documents,
+            metadata, and distances. Returns empty lists if no results found.
+        """
+        mode = self._query_mode(mode)
+        cache_key = self.query_cache.key(collection_name, query_text, n_results, where, mode=mode, where_document=where_document)
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Query cache hit for '{query_text}' in collection {collection_name}")
+            return cached
 
-    try:
-        results = collection.query(
-            query_texts=[query_text],
-            n_results=n_results
-        )
-        num_results = len(results.get('documents', [[]])[0])
-        logger.info(f"Successfully queried vector store with {num_results} results")
-        metadatas = results.get('metadatas', [[]])[0]
-        topics = [meta.get('title') or meta.get('topic') or 'Untitled Document' for meta in metadatas]
-        logger.info(f"The topics of the most relevant documents from running RAG are: {', '.join(topics)}")
-        return {
-            "documents": results.get('documents', [[]])[0],
-            "metadatas": results.get('metadatas', [[]])[0],
-            "distances": results.get('distances', [[]])[0],
-            "ids": results.get('ids', [[]])[0]
-        }
-    except Exception as e:
-        logger.error(f"Error querying vector store: {str(e)}")
-        raise
+        logger.debug(f"Querying collection {collection_name} for '{query_text}'")
+        collection = self.collection(collection_name)
 
-def delete_collection(collection_name: str) -> None:
-    """Delete a collection and all its contents."""
-    logger.info(f"Deleting collection {collection_name}")
-    try:
-        client = get_client()
-        client.delete_collection(collection_name)
-        logger.info(f"Successfully deleted collection {collection_name}")
-    except ValueError as e:
-        logger.warning(f"Error deleting collection {collection_name}: {str(e)}")
-        # Re-raise if it's not the "collection doesn't exist" error
-        if "does not exist" not in str(e).lower():
+        try:
+            results = collection.query(
+                query_texts=[query_text],
+                n_results=n_results * CHUNK_QUERY_FACTOR,
+                where=where or None,
+                where_document=where_document or None
+            )
+            result = {
+                "documents": results.get('documents', [[]])[0],
+                "metadatas": results.get('metadatas', [[]])[0],
+                "distances": results.get('distances', [[]])[0],
+                "ids": results.get('ids', [[]])[0]
+            }
+            if mode == "hybrid":
+                result = self._fuse_lexical(
+                    collection_name, query_text, result, n_results * CHUNK_QUERY_FACTOR, where, where_document
+                )
+            result = group_chunks(result, n_results)
+            logger.debug(f"Successfully queried vector store with {len(result['ids'])} results")
+            topics = [meta.get('title') or meta.get('topic') or 'Untitled Document' for meta in result["metadatas"]]
+            logger.info(f"The topics of the most relevant documents from running RAG are: {', '.join(topics)}")
+            self.query_cache.set(cache_key, result)
+            return result
+        except Exception as e:
+            logger.error(f"Error querying vector store: {str(e)}")
             raise
-    except Exception as e:
-        logger.error(f"Unexpected error deleting collection {collection_name}: {str(e)}")
-        raise
 
-def delete_document(id: str, collection_name: str = "screenshots_collection"):
-    """
-    Delete a document from the vector store by ID.
-    """
-    logger.info(f"Deleting document with ID: {id} in collection {collection_name}")
-    collection = get_or_create_collection(collection_name)
-    collection.delete(ids=[id])
-    logger.info(f"Document {id} deleted successfully.")
-
-
-def update_document(
-    id: str,
-    new_content: str,
-    new_metadata: dict,
-    collection_name: str = "screenshots_collection"
-):
-    """
-    Update a document in the vector store by ID using ChromaDB's upsert functionality.
-    This ensures atomic updates without potential data loss.
-    """
-    logger.info(f"Updating document with ID: {id} in collection {collection_name}")
-    collection = get_or_create_collection(collection_name)
+    def query_documents_batch(
+        self,
+        query_texts: List[str],
+        n_results: Union[int, List[int]] = 5,
+        where: Optional[List[Optional[Dict[str, Any]]]] = None,
+        collection_name: str = "screenshots_collection",
+        mode: Optional[str] = None,
+        where_document: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Query the vector store for several texts at once.
 
-    try:
-        collection.upsert(
-            documents=[new_content],
-            metadatas=[new_metadata],
-            ids=[id]
-        )
-        logger.info(f"Document {id} updated successfully.")
-    except Exception as e:
-        logger.error(f"Error updating document {id}: {str(e)}")
-        raise
-
-def get_collection_stats(collection_name: str = "screenshots_collection") -> Dict[str, Any]:
-    """Get statistics about a collection."""
-    logger.info(f"Getting stats for collection {collection_name}")
-    collection = get_or_create_collection(collection_name)
-    try:
-        stats = {
-            "count": collection.count(),
-            "name": collection.name
+        All query texts are embedded in a single batch. Queries that share the same filter are
+        then answered by a single ChromaDB query, so N questions cost one embedding batch and
+        one search per distinct filter instead of N round trips.
+
+        Args:
+            query_texts: The texts to search for
+            n_results: Number of results to return, either one value for all queries or one per query
+            where: Optional list with one metadata filter (or None) per query
+            collection_name: Name of the collection to search in
+            mode: "vector" or "hybrid" for all queries (defaults to QUERY_MODE)
+            where_document: Optional list with one document filter (or None) per query
+
+        Returns:
+            One result dictionary per query, in order, shaped like the result of query_documents.
+        """
+        if isinstance(n_results, int):
+            n_results = [n_results] * len(query_texts)
+        if where is None:
+            where = [None] * len(query_texts)
+        if where_document is None:
+            where_document = [None] * len(query_texts)
+        if not (len(query_texts) == len(n_results) == len(where) == len(where_document)):
+            raise ValueError("query_texts, n_results, where and where_document must have the same length")
+        if not query_texts:
+            return []
+
+        mode = self._query_mode(mode)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(query_texts)
+        cache_keys = [
+            self.query_cache.key(
+                collection_name, query_texts[i], n_results[i], where[i], mode=mode, where_document=where_document[i]
+            )
+            for i in range(len(query_texts))
+        ]
+        misses = []
+        for i, cache_key in enumerate(cache_keys):
+            results[i] = self.query_cache.get(cache_key)
+            if results[i] is None:
+                misses.append(i)
+        if not misses:
+            return results
+
+        logger.debug(f"Batch querying collection {collection_name} with {len(misses)} queries")
+        collection = self.collection(collection_name)
+
+        try:
+            embeddings = dict(zip(misses, self.embedding_function([query_texts[i] for i in misses])))
+
+            # Group queries by filters; each group is one ChromaDB query
+            groups: Dict[str, List[int]] = {}
+            for i in misses:
+                groups.setdefault(json.dumps([where[i], where_document[i]], sort_keys=True), []).append(i)
+
+            for indices in groups.values():
+                group_results = collection.query(
+                    query_embeddings=[embeddings[i] for i in indices],
+                    n_results=max(n_results[i] for i in indices) * CHUNK_QUERY_FACTOR,
+                    where=where[indices[0]] or None,
+                    where_document=where_document[indices[0]] or None
+                )
+                for position, i in enumerate(indices):
+                    result = {
+                        key: group_results.get(key, [[]] * len(indices))[position]
+                        for key in ["documents", "metadatas", "distances", "ids"]
+                    }
+                    if mode == "hybrid":
+                        result = self._fuse_lexical(
+                            collection_name, query_texts[i], result, n_results[i] * CHUNK_QUERY_FACTOR,
+                            where[i], where_document[i]
+                        )
+                    results[i] = group_chunks(result, n_results[i])
+                    self.query_cache.set(cache_keys[i], results[i])
+
+            logger.info(f"Answered {len(query_texts)} queries with {len(groups)} vector store searches")
+            return results
+        except Exception as e:
+            logger.error(f"Error batch querying vector store: {str(e)}")
+            raise
+
+    @staticmethod
+    def _query_mode(mode: Optional[str]) -> str:
+        mode = mode or QUERY_MODE
+        if mode not in QUERY_MODES:
+            raise ValueError(f"Unsupported query mode: {mode}")
+        if mode == "hybrid" and not LEXICAL_INDEX_ENABLED:
+            logger.warning("Hybrid query requested but the lexical index is disabled, using vector search")
+            return "vector"
+        return mode
+
+    def _fuse_lexical(
+        self,
+        collection_name: str,
+        query_text: str,
+        vector_result: Dict[str, List[Any]],
+        n_results: int,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, List[Any]]:
+        """Fuse a vector query result with the BM25 ranking of the same query by reciprocal rank."""
+        collection = self.collection(collection_name)
+        lexical_ids = [id for id, _ in self.lexical_index(collection_name).search(query_text, n_results)]
+        if (where or where_document) and lexical_ids:
+            allowed = set(collection.get(
+                ids=lexical_ids, where=where or None, where_document=where_document or None, include=[]
+            )["ids"])
+            lexical_ids = [id for id in lexical_ids if id in allowed]
+
+        fused = [id for id, _ in reciprocal_rank_fusion([vector_result["ids"], lexical_ids], RRF_K)][:n_results]
+        known = {id: i for i, id in enumerate(vector_result["ids"])}
+        missing = [id for id in fused if id not in known]
+        fetched = collection.get(ids=missing, include=["documents", "metadatas"]) if missing else {"ids": []}
+        fetched_index = {id: i for i, id in enumerate(fetched["ids"])}
+
+        result = {"documents": [], "metadatas": [], "distances": [], "ids": []}
+        for id in fused:
+            if id in known:
+                i = known[id]
+                result["documents"].append(vector_result["documents"][i])
+                result["metadatas"].append(vector_result["metadatas"][i])
+                result["distances"].append(vector_result["distances"][i])
+            elif id in fetched_index:
+                i = fetched_index[id]
+                result["documents"].append(fetched["documents"][i])
+                result["metadatas"].append(fetched["metadatas"][i])
+                result["distances"].append(None)
+            else:
+                # Deleted between the lexical search and the fetch
+                continue
+            result["ids"].append(id)
+        return result
+
+    def delete_collection(self, collection_name: str) -> None:
+        """Delete a collection and all its contents."""
+        logger.info(f"Deleting collection {collection_name}")
+        self.invalidate(collection_name)
+        self.query_cache.invalidate(collection_name)
+        # An index that isn't open yet is rebuilt when it's next opened, since its count won't match
+        index = self._lexical_indexes.get(collection_name)
+        if index is not None:
+            index.clear()
+        try:
+            self.client.delete_collection(collection_name)
+            logger.info(f"Successfully deleted collection {collection_name}")
+        except ValueError as e:
+            logger.warning(f"Error deleting collection {collection_name}: {str(e)}")
+            # Re-raise if it's not the "collection doesn't exist" error
+            if "does not exist" not in str(e).lower():
+                raise
+        except Exception as e:
+            logger.error(f"Unexpected error deleting collection {collection_name}: {str(e)}")
+            raise
+
+    def delete_document(self, id: str, collection_name: str = "screenshots_collection"):
+        """
+        Delete a document from the vector store by ID. Deleting a parent document deletes
+        all of its chunks.
+        """
+        logger.info(f"Deleting document with ID: {id} in collection {collection_name}")
+        collection = self.collection(collection_name)
+        ids = self._resolve_ids(collection, id)
+        collection.delete(ids=ids)
+        index = self.lexical_index(collection_name)
+        if index is not None:
+            index.remove(ids)
+        self.query_cache.invalidate(collection_name)
+        logger.info(f"Document {id} deleted successfully.")
+
+    def update_document(
+        self,
+        id: str,
+        new_content: str,
+        new_metadata: dict,
+        collection_name: str = "screenshots_collection"
+    ):
+        """
+        Update a document in the vector store by ID using ChromaDB's upsert functionality.
+        This ensures atomic updates without potential data loss.
+
+        A chunked document is re-chunked: the new chunks are upserted under the parent ID,
+        leftover chunks of the old version are deleted, and `new_metadata` is merged into
+        the parent's existing metadata.
+        """
+        logger.info(f"Updating document with ID: {id} in collection {collection_name}")
+        collection = self.collection(collection_name)
+
+        try:
+            old_ids = [chunk_id for chunk_id in self._resolve_ids(collection, id) if chunk_id != id]
+            if old_ids:
+                self._update_chunked_document(collection, id, old_ids, new_content, new_metadata, collection_name)
+                return
+            collection.upsert(
+                documents=[new_content],
+                metadatas=[new_metadata],
+                ids=[id]
+            )
+            index = self.lexical_index(collection_name)
+            if index is not None:
+                index.add([id], [new_content])
+            self.query_cache.invalidate(collection_name)
+            logger.info(f"Document {id} updated successfully.")
+        except Exception as e:
+            logger.error(f"Error updating document {id}: {str(e)}")
+            raise
+
+    def _update_chunked_document(
+        self,
+        collection,
+        id: str,
+        old_ids: List[str],
+        new_content: str,
+        new_metadata: dict,
+        collection_name: str
+    ) -> None:
+        existing = collection.get(ids=[old_ids[0]], include=["metadatas"])
+        metadata = {
+            key: value for key, value in (existing["metadatas"][0] if existing["ids"] else {}).items()
+            if key not in CHUNK_FIELDS
         }
-        logger.info(f"Successfully retrieved stats for collection {collection_name}")
-        return stats
-    except Exception as e:
-        logger.error(f"Error getting stats for collection {collection_name}: {str(e)}")
-        raise
-
-def list_all_documents(collection_name: str = "screenshots_collection") -> Dict[str, Any]:
-    """List all documents in a collection with their IDs and metadata."""
-    logger.info(f"Listing all documents in collection {collection_name}")
-    collection = get_or_create_collection(collection_name)
-    try:
-        # Get all documents
-        results = collection.get()
-        
+        metadata.update({key: value for key, value in (new_metadata or {}).items() if key not in CHUNK_FIELDS + ("matched_chunks",)})
+
+        chunks = chunk_document(id, new_content, metadata, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+        stale_ids = [chunk_id for chunk_id in old_ids if chunk_id not in set(chunks["ids"])]
+        collection.upsert(ids=chunks["ids"], documents=chunks["documents"], metadatas=chunks["metadatas"])
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        index = self.lexical_index(collection_name)
+        if index is not None:
+            index.add(chunks["ids"], chunks["documents"])
+            index.remove(stale_ids)
+        self.query_cache.invalidate(collection_name)
+        logger.info(f"Document {id} updated successfully as {len(chunks['ids'])} chunks.")
+
+    def _group_rows(self, collection, rows: Dict[str, Any], include: List[str]) -> Dict[str, Any]:
+        """
+        Turn the first chunk of every chunked document among `rows` into its parent: the
+        parent's ID, its metadata without the chunk fields and, if requested, the full text
+        merged from all of its chunks. `rows` must include metadatas.
+        """
+        parents = [meta["parent_id"] for meta in rows["metadatas"] if meta and "parent_id" in meta]
+        texts = {}
+        if parents and "documents" in include:
+            chunks = collection.get(where={"parent_id": {"$in": parents}}, include=["documents", "metadatas"])
+            pieces : Dict[str, List[Any]] = {}
+            for document, meta in zip(chunks["documents"], chunks["metadatas"]):
+                pieces.setdefault(meta["parent_id"], []).append((meta.get("chunk_index", 0), document))
+            texts = {parent: merge_chunks([document for _, document in sorted(chunks)]) for parent, chunks in pieces.items()}
+
+        grouped = {"ids": [], **{key: [] for key in include}}
+        for i, meta in enumerate(rows["metadatas"]):
+            parent = meta.get("parent_id") if meta else None
+            grouped["ids"].append(parent or rows["ids"][i])
+            if "documents" in include:
+                grouped["documents"].append(texts.get(parent, rows["documents"][i]) if parent else rows["documents"][i])
+            if "metadatas" in include:
+                grouped["metadatas"].append({key: value for key, value in meta.items() if key not in CHUNK_FIELDS} if parent else meta)
+        return grouped
+
+    @staticmethod
+    def _first_rows(ids: Optional[List[str]], where: Optional[Dict[str, Any]]):
+        """IDs and filter that select each document once: unchunked documents and first chunks."""
+        if ids is not None:
+            ids = ids + [f"{id}::0" for id in ids]
+        where = {"$and": [where, FIRST_ROWS]} if where else FIRST_ROWS
+        return ids, where
+
+    def get_documents(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        group_chunks: bool = True,
+        collection_name: str = "screenshots_collection"
+    ) -> Dict[str, Any]:
+        """
+        Fetch documents by ID and/or metadata filter without running a similarity search.
+
+        Args:
+            ids: Optional list of document IDs to fetch
+            where: Optional Chroma metadata filter, e.g. {"source": "screenshot"}
+            include: Fields to return, any of "documents" and "metadatas" (defaults to both)
+            group_chunks: Return chunked documents once, as their parent with the full text
+                (the default), instead of one row per chunk
+            collection_name: Name of the collection to read from
+
+        Returns:
+            Dictionary with "ids" and the requested fields.
+        """
+        include = include or ["documents", "metadatas"]
+        collection = self.collection(collection_name)
+        try:
+            if not group_chunks:
+                results = collection.get(ids=ids, where=where, include=include)
+                return {key: results[key] for key in ["ids"] + include}
+            ids, where = self._first_rows(ids, where)
+            results = collection.get(ids=ids, where=where, include=list(set(include) | {"metadatas"}))
+            return self._group_rows(collection, results, include)
+        except Exception as e:
+            logger.error(f"Error getting documents from collection {collection_name}: {str(e)}")
+            raise
+
+    def merge_document_metadata(
+        self,
+        id: str,
+        updates: Dict[str, Any],
+        increments: Optional[Dict[str, int]] = None,
+        collection_name: str = "screenshots_collection"
+    ) -> bool:
+        """
+        Merge new metadata fields into an existing document without re-embedding it.
+        For a chunked document, the fields are merged into every chunk.
+
+        Args:
+            id: ID of the document (or parent document) to update
+            updates: Metadata fields to set
+            increments: Numeric metadata fields to increment (missing fields start at 0)
+            collection_name: Name of the collection the document lives in
+
+        Returns:
+            True if the document exists and was updated, False if it was not found.
+        """
+        logger.info(f"Merging metadata into document {id} in collection {collection_name}")
+        collection = self.collection(collection_name)
+
+        try:
+            existing = collection.get(ids=self._resolve_ids(collection, id), include=["metadatas"])
+            if not existing["ids"]:
+                return False
+            metadatas = []
+            for metadata in existing["metadatas"]:
+                metadata = dict(metadata or {})
+                metadata.update(updates)
+                for key, amount in (increments or {}).items():
+                    metadata[key] = int(metadata.get(key, 0)) + amount
+                metadatas.append(metadata)
+            collection.update(ids=existing["ids"], metadatas=metadatas)
+            self.query_cache.invalidate(collection_name)
+            return True
+        except Exception as e:
+            logger.error(f"Error merging metadata into document {id}: {str(e)}")
+            raise
+
+    def get_collection_stats(self, collection_name: str = "screenshots_collection") -> Dict[str, Any]:
+        """Get statistics about a collection."""
+        logger.info(f"Getting stats for collection {collection_name}")
+        collection = self.collection(collection_name)
+        try:
+            stats = {
+                "count": collection.count(),
+                "name": collection.name
+            }
+            logger.info(f"Successfully retrieved stats for collection {collection_name}")
+            return stats
+        except Exception as e:
+            logger.error(f"Error getting stats for collection {collection_name}: {str(e)}")
+            raise
+
+    def list_documents(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        include: Optional[List[str]] = None,
+        sort: Optional[str] = None,
+        descending: bool = True,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        group_chunks: bool = True,
+        collection_name: str = "screenshots_collection"
+    ) -> Dict[str, Any]:
+        """
+        List one page of documents in a collection.
+
+        Without sorting, pages follow the collection's storage order and the cursor is an
+        offset. With sort="timestamp", only IDs and metadata are scanned to order the
+        collection, the documents of the page are fetched by ID, and the cursor points
+        after the last returned document, so inserts don't shift later pages.
+
+        Args:
+            limit: Maximum number of documents to return (all remaining if None)
+            offset: Number of documents to skip, after the cursor if one is given
+            cursor: Cursor returned as "next_cursor" by the previous page
+            include: Fields to return besides the IDs, any of "documents", "metadatas" and
+                "embeddings" (defaults to documents and metadatas)
+            sort: None for storage order, or "timestamp"
+            descending: Return newest documents first when sorting by timestamp
+            ids: Optional list of document IDs to restrict the listing to
+            where: Optional Chroma metadata filter
+            group_chunks: List chunked documents once, as their parent with the full text
+                (the default), instead of one row per chunk. Embeddings are per chunk, so
+                they can only be listed with group_chunks=False.
+            collection_name: Name of the collection to list
+
+        Returns:
+            Dictionary with "ids", the requested fields, and "next_cursor" (None on the last page).
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        if sort not in (None, "timestamp"):
+            raise ValueError(f"Unsupported sort field: {sort}")
+        if group_chunks and "embeddings" in include:
+            raise ValueError("Embeddings are stored per chunk; list them with group_chunks=False")
+        position = _decode_cursor(cursor)
+        collection = self.collection(collection_name)
+        fetch = include
+        if group_chunks:
+            ids, where = self._first_rows(ids, where)
+            fetch = list(set(include) | {"metadatas"})
+
+        try:
+            if sort is None:
+                offset += position.get("offset", 0)
+                results = collection.get(ids=ids, where=where, limit=limit, offset=offset or None, include=fetch)
+                page = self._group_rows(collection, results, include) if group_chunks else {key: results[key] for key in ["ids"] + include}
+                more = limit is not None and len(results["ids"]) == limit
+                page["next_cursor"] = _encode_cursor({"offset": offset + limit}) if more else None
+                return page
+
+            index = collection.get(ids=ids, where=where, include=["metadatas"])
+            keys = sorted(
+                ((self._sort_key(meta), id) for id, meta in zip(index["ids"], index["metadatas"])),
+                reverse=descending
+            )
+            if "after" in position:
+                after = tuple(position["after"])
+                keys = [key for key in keys if (key < after if descending else key > after)]
+            keys = keys[offset:]
+            more = limit is not None and len(keys) > limit
+            keys = keys[:limit]
+
+            page_ids = [id for _, id in keys]
+            page = {"ids": page_ids, **{key: [] for key in fetch}}
+            if fetch and page_ids:
+                results = collection.get(ids=page_ids, include=fetch)
+                order = {id: i for i, id in enumerate(results["ids"])}
+                for key in fetch:
+                    page[key] = [results[key][order[id]] for id in page_ids]
+            if group_chunks:
+                page = self._group_rows(collection, page, include)
+            page["next_cursor"] = _encode_cursor({"after": list(keys[-1])}) if more else None
+            return page
+        except Exception as e:
+            logger.error(f"Error listing documents: {str(e)}")
+            raise
+
+    def iter_documents(
+        self,
+        batch_size: int = 500,
+        include: Optional[List[str]] = None,
+        sort: Optional[str] = None,
+        descending: bool = True,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        group_chunks: bool = True,
+        collection_name: str = "screenshots_collection"
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the documents of a collection one page at a time, so the whole
+        collection never has to be held in memory. Yields one dictionary per document with
+        "id" and the requested fields (singular: "document", "metadata").
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        cursor = None
+        while True:
+            page = self.list_documents(
+                limit=batch_size,
+                cursor=cursor,
+                include=include,
+                sort=sort,
+                descending=descending,
+                ids=ids,
+                where=where,
+                group_chunks=group_chunks,
+                collection_name=collection_name
+            )
+            for i, id in enumerate(page["ids"]):
+                item = {"id": id}
+                for key in include:
+                    item[key[:-1]] = page[key][i]
+                yield item
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    @staticmethod
+    def _sort_key(metadata: Optional[Dict[str, Any]]) -> float:
+        """Creation time a document is sorted by; documents without one sort as oldest."""
+        metadata = metadata or {}
+        if "created_at" in metadata:
+            return float(metadata["created_at"])
+        return parse_timestamp(metadata.get("timestamp")) or 0.0
+
+    def backfill_metadata(self, collection_name: str = "screenshots_collection", batch_size: int = 500) -> int:
+        """
+        Add the filterable fields to documents stored before they existed: `created_at`
+        from the legacy timestamp string, `domain` from the URL, source "enrichment" for
+        topic documents, and `continuation` for chunks. Legacy topic documents have no
+        timestamp; they get `created_at` 0, sorting as oldest, so time-ordered scans such
+        as compaction still reach them. Documents that already have the fields are left
+        untouched.
+
+        Returns:
+            Number of documents updated.
+        """
+        collection = self.collection(collection_name)
+        updated = 0
+        cursor = None
+        while True:
+            page = self.list_documents(
+                limit=batch_size,
+                cursor=cursor,
+                include=["metadatas"],
+                group_chunks=False,
+                collection_name=collection_name
+            )
+            ids, metadatas = [], []
+            for id, metadata in zip(page["ids"], page["metadatas"]):
+                metadata = dict(metadata or {})
+                changes = {}
+                if "created_at" not in metadata and parse_timestamp(metadata.get("timestamp")) is not None:
+                    changes["created_at"] = parse_timestamp(metadata["timestamp"])
+                if "domain" not in metadata and metadata.get("url"):
+                    changes["domain"] = url_domain(metadata["url"])
+                if "source" not in metadata and "topic" in metadata:
+                    changes["source"] = "enrichment"
+                if "created_at" not in changes and "created_at" not in metadata and changes.get("source", metadata.get("source")) == "enrichment":
+                    changes["created_at"] = 0.0
+                if "continuation" not in metadata and "chunk_index" in metadata:
+                    changes["continuation"] = int(metadata["chunk_index"]) > 0
+                if changes:
+                    metadata.update(changes)
+                    ids.append(id)
+                    metadatas.append(metadata)
+            if ids:
+                collection.update(ids=ids, metadatas=metadatas)
+                updated += len(ids)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        if updated:
+            self.query_cache.invalidate(collection_name)
+            logger.info(f"Backfilled filter metadata of {updated} documents in collection {collection_name}")
+        return updated
+
+    def list_all_documents(self, collection_name: str = "screenshots_collection") -> Dict[str, Any]:
+        """List all documents in a collection with their IDs and metadata."""
+        logger.info(f"Listing all documents in collection {collection_name}")
+        page = self.list_documents(collection_name=collection_name)
         return {
-            "ids": results["ids"],
-            "documents": results["documents"],
-            "metadatas": results["metadatas"]
+            "ids": page["ids"],
+            "documents": page["documents"],
+            "metadatas": page["metadatas"]
         }
-    except Exception as e:
-        logger.error(f"Error listing documents: {str(e)}")
-        raise
+
+
+def _encode_cursor(position: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def _decode_cursor(cursor: Optional[str]) -> Dict[str, Any]:
+    if not cursor:
+        return {}
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_vector_store() -> VectorStore:
+    """Get the process-wide VectorStore shared by the API, the pipeline and utils."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = VectorStore(embedding_function=default_ef)
+    return _store
+
+def get_client():
+    """Get or create a ChromaDB client instance."""
+    return get_vector_store().client
+
+def get_or_create_collection(collection_name: str = "screenshots_collection"):
+    """Get an existing collection or create a new one if it doesn't exist."""
+    return get_vector_store().collection(collection_name)
+
+# Module-level shortcuts to the shared store, kept for scripts and existing callers
+
+def add_documents(*args, **kwargs) -> None:
+    return get_vector_store().add_documents(*args, **kwargs)
+
+def add_chunked_document(*args, **kwargs) -> int:
+    return get_vector_store().add_chunked_document(*args, **kwargs)
+
+def query_documents(*args, **kwargs) -> Dict[str, Any]:
+    return get_vector_store().query_documents(*args, **kwargs)
+
+def query_documents_batch(*args, **kwargs) -> List[Dict[str, Any]]:
+    return get_vector_store().query_documents_batch(*args, **kwargs)
+
+def delete_collection(*args, **kwargs) -> None:
+    return get_vector_store().delete_collection(*args, **kwargs)
+
+def delete_document(*args, **kwargs) -> None:
+    return get_vector_store().delete_document(*args, **kwargs)
+
+def update_document(*args, **kwargs) -> None:
+    return get_vector_store().update_document(*args, **kwargs)
+
+def get_documents(*args, **kwargs) -> Dict[str, Any]:
+    return get_vector_store().get_documents(*args, **kwargs)
+
+def merge_document_metadata(*args, **kwargs) -> bool:
+    return get_vector_store().merge_document_metadata(*args, **kwargs)
+
+def get_collection_stats(*args, **kwargs) -> Dict[str, Any]:
+    return get_vector_store().get_collection_stats(*args, **kwargs)
+
+def list_documents(*args, **kwargs) -> Dict[str, Any]:
+    return get_vector_store().list_documents(*args, **kwargs)
+
+def iter_documents(*args, **kwargs) -> Iterator[Dict[str, Any]]:
+    return get_vector_store().iter_documents(*args, **kwargs)
+
+def backfill_metadata(*args, **kwargs) -> int:
+    return get_vector_store().backfill_metadata(*args, **kwargs)
+
+def list_all_documents(*args, **kwargs) -> Dict[str, Any]:
+    return get_vector_store().list_all_documents(*args, **kwargs)
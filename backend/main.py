@@ -1,25 +1,32 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, File, Form, Header, HTTPException, UploadFile
 from pydantic import BaseModel
 import base64
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import io
-from PIL import Image
-import pytesseract
+import hashlib
+from urllib.parse import unquote
 from mistralai import Mistral
-from db.vector_store import add_documents, query_documents
+from db.filters import build_where
+from db.snapshot import SNAPSHOT_DIRECTORY, export_collection, import_collection
+from db.vector_store import embedding_cache, get_vector_store
 import logging
 from dotenv import load_dotenv
-from clients import mistral
-from typing import List, Any
+from clients import http, mistral
+from clients.cache import response_cache
+from typing import List, Any, Literal, Optional
 import queue
 from fastapi import Request
 from fastapi.responses import StreamingResponse
 import json
 import asyncio
 
-from utils import call_active_perplexity, call_passive_perplexity
+from pipeline.ingest import STAGES, phash_index, process_screenshot, screenshot_store, shutdown_ocr_executor, tile_ocr
+from pipeline.retention import get_image_hash, release_screenshot, run_screenshot_gc
+from pipeline.admission import AdmissionController
+from pipeline.compaction import COMPACTION_ENABLED, compactor, run_compaction
+from pipeline.jobs import JobManager, QueueFullError
+from utils import call_active_perplexity_async
 
 load_dotenv()
 
@@ -28,6 +35,15 @@ MODEL = "ministral-8b-latest"
 
 client = Mistral(api_key=MISTRAL_API_KEY)
 
+# Background ingestion settings
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "20"))
+INGEST_COALESCE_WINDOW = float(os.getenv("INGEST_COALESCE_WINDOW", "2.0"))
+
+# Binary uploads
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,6 +54,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+store = get_vector_store()
+
 app = FastAPI()
 
 app.add_middleware(
@@ -48,13 +66,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+job_manager = JobManager(
+    handler=process_screenshot,
+    stages=STAGES,
+    num_workers=INGEST_WORKERS,
+    max_queue_size=INGEST_QUEUE_SIZE
+)
+
+admission_controller = AdmissionController(
+    job_manager,
+    coalesce_window=INGEST_COALESCE_WINDOW,
+    max_in_flight=INGEST_MAX_IN_FLIGHT
+)
+
+ADMISSION_MESSAGES = {
+    "queued": "Screenshot saved and queued for processing",
+    "deferred": "Screenshot saved, processing is deferred to coalesce further captures of this page",
+    "coalesced": "Screenshot saved and merged into the pending job for this page"
+}
+
+@app.on_event("startup")
+async def start_ingestion_workers():
+    await job_manager.start()
+    app.state.screenshot_gc = asyncio.create_task(run_screenshot_gc())
+    app.state.metadata_backfill = asyncio.create_task(backfill_filter_metadata())
+    app.state.compaction = asyncio.create_task(compact_after_backfill()) if COMPACTION_ENABLED else None
+
+async def backfill_filter_metadata():
+    """Give documents stored by older versions the metadata the query filters rely on."""
+    try:
+        await asyncio.to_thread(store.backfill_metadata, "screenshots_collection")
+    except Exception as e:
+        logger.error(f"Metadata backfill failed: {str(e)}", exc_info=True)
+
+async def compact_after_backfill():
+    """Start compaction once legacy enrichment documents have the created_at it scans by."""
+    await app.state.metadata_backfill
+    await run_compaction()
+
+@app.on_event("shutdown")
+async def stop_ingestion_workers():
+    app.state.screenshot_gc.cancel()
+    if app.state.compaction is not None:
+        app.state.compaction.cancel()
+    await job_manager.stop()
+    shutdown_ocr_executor()
+    await http.aclose()
+
 class ActivePerplexityPayload(BaseModel):
     question : str
 
-class DocumentQueryPayload(BaseModel):
+class QueryFilters(BaseModel):
+    """
+    Filters pushed down to the vector store. `where` and `where_document` are raw Chroma
+    filters; the others are shortcuts combined with them. `since`/`until` are epoch seconds.
+    """
+    where : Optional[dict] = None
+    where_document : Optional[dict] = None
+    source : Optional[Literal["screenshot", "enrichment"]] = None
+    since : Optional[float] = None
+    until : Optional[float] = None
+    url : Optional[str] = None
+    domain : Optional[str] = None
+
+    def build_where(self) -> Optional[dict]:
+        return build_where(self.where, self.source, self.since, self.until, self.url, self.domain)
+
+class DocumentQueryPayload(QueryFilters):
     query_text : str
     n_results : int
     collection_name : str
+    mode : Optional[Literal["vector", "hybrid"]] = None
+
+class BatchQueryItem(QueryFilters):
+    query_text : str
+    n_results : int = 5
+
+class BatchDocumentQueryPayload(BaseModel):
+    queries : List[BatchQueryItem]
+    collection_name : str = "screenshots_collection"
+    mode : Optional[Literal["vector", "hybrid"]] = None
 
 class CollectiveSummaryPayload(BaseModel):
     sources : List[Any]
@@ -64,46 +155,85 @@ class ScreenshotPayload(BaseModel):
     pageUrl: str
     pageTitle: str
 
-def extract_text_from_image(image_bytes):
-    """Extract text from image using OCR"""
-    image = Image.open(io.BytesIO(image_bytes))
-    text = pytesseract.image_to_string(image)
-    return text.strip()
-
-def resize_image(image_bytes, max_size=(500, 500)):
-    """Resize image while maintaining aspect ratio"""
-    image = Image.open(io.BytesIO(image_bytes))
-    image.thumbnail(max_size, Image.Resampling.LANCZOS)
-    
-    # Convert back to bytes
-    output_buffer = io.BytesIO()
-    # Keep as PNG to maintain quality
-    image.save(output_buffer, format='PNG')
-    output_buffer.seek(0)
-    return output_buffer.getvalue()
-
-def describe_image_with_pixtral(image_bytes):
-    """Get image description using Pixtral model"""
-    # Debug original image
-    original_image = Image.open(io.BytesIO(image_bytes))
-    
-    # Resize image if needed
-    resized_image = resize_image(image_bytes)
-    
-    # Convert image to base64 for Pixtral
-    base64_image = base64.b64encode(resized_image).decode('utf-8')
-
-    return mistral.get_image_description(base64_image)
-
 @app.post("/api/query_documents")
 async def query_documents_endpoint(payload: DocumentQueryPayload):
-    results = query_documents(payload.query_text, payload.n_results, payload.collection_name)
+    results = store.query_documents(
+        payload.query_text,
+        payload.n_results,
+        payload.collection_name,
+        mode=payload.mode,
+        where=payload.build_where(),
+        where_document=payload.where_document
+    )
     return results
 
+@app.post("/api/query_documents/batch")
+async def query_documents_batch_endpoint(payload: BatchDocumentQueryPayload):
+    """
+    Runs several queries in one request. The query texts are embedded as one batch and the
+    results are returned in the same order as the queries.
+    """
+    results = store.query_documents_batch(
+        [query.query_text for query in payload.queries],
+        n_results=[query.n_results for query in payload.queries],
+        where=[query.build_where() for query in payload.queries],
+        collection_name=payload.collection_name,
+        mode=payload.mode,
+        where_document=[query.where_document for query in payload.queries]
+    )
+    return {"results": results}
+
+LIST_FIELDS = {"documents", "metadatas"}
+
 @app.get("/api/list_all_documents")
-async def list_all_documents_endpoint():
-    from db.vector_store import list_all_documents
-    return list_all_documents("screenshots_collection")
+async def list_all_documents_endpoint(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    fields: str = "documents,metadatas",
+    sort: Optional[str] = None,
+    order: str = "desc",
+    ids: Optional[str] = None,
+    format: str = "json"
+):
+    """
+    List documents of the screenshots collection. Without parameters every document is
+    returned, as before.
+
+    - limit/offset/cursor: pagination; pass the returned "next_cursor" to get the next page
+    - fields: comma-separated fields to return besides the IDs ("documents", "metadatas");
+      "fields=metadatas" skips the document texts
+    - sort=timestamp with order=asc|desc: server-side ordering by capture time
+    - ids: comma-separated document IDs to restrict the listing to
+    - format=ndjson: stream one JSON object per document instead of a single response
+    """
+    include = [field for field in fields.split(",") if field and field != "ids"]
+    if not set(include) <= LIST_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(set(include) - LIST_FIELDS)}")
+    if sort not in (None, "timestamp"):
+        raise HTTPException(status_code=400, detail="sort must be 'timestamp'")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    options = dict(
+        include=include,
+        sort=sort,
+        descending=order == "desc",
+        ids=ids.split(",") if ids else None,
+        collection_name="screenshots_collection"
+    )
+
+    if format == "ndjson":
+        if cursor or offset or limit:
+            raise HTTPException(status_code=400, detail="Pagination parameters are not supported with format=ndjson")
+        def ndjson_generator():
+            for item in store.iter_documents(**options):
+                yield json.dumps(item) + "\n"
+        return StreamingResponse(ndjson_generator(), media_type="application/x-ndjson")
+
+    try:
+        return await asyncio.to_thread(store.list_documents, limit=limit, offset=offset, cursor=cursor, **options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 
@@ -118,10 +248,8 @@ async def update_document_endpoint(payload: UpdateDocumentPayload):
     Receives an ID, new content, and metadata to update a document
     in the 'screenshots_collection' (or any other collection).
     """
-    from db.vector_store import update_document 
-
     try:
-        update_document(
+        store.update_document(
             id=payload.id,
             new_content=payload.content,
             new_metadata=payload.metadata,
@@ -147,9 +275,12 @@ async def delete_document_endpoint(payload: DeleteDocumentPayload):
     """
     Endpoint to delete a document by ID.
     """
-    from db.vector_store import delete_document
     try:
-        delete_document(payload.id, collection_name="screenshots_collection")
+        image_hash = get_image_hash(payload.id, collection_name="screenshots_collection")
+        store.delete_document(payload.id, collection_name="screenshots_collection")
+        phash_index.remove(payload.id)
+        if image_hash:
+            release_screenshot(image_hash, collection_name="screenshots_collection")
         return {"status": "success", "message": f"Document {payload.id} deleted."}
     except Exception as e:
         logger.error(f"Error deleting document {payload.id}: {str(e)}", exc_info=True)
@@ -158,7 +289,7 @@ async def delete_document_endpoint(payload: DeleteDocumentPayload):
 
 @app.post("/api/collective_summary")
 async def collective_summary_endpoint(payload: CollectiveSummaryPayload):
-    summary = mistral.get_collective_summary(payload.sources)
+    summary = await mistral.get_collective_summary_async(payload.sources)
     return {"summary": summary}
 
 
@@ -167,21 +298,44 @@ async def collective_summary_endpoint(payload: CollectiveSummaryPayload):
 async def call_active_perplexity_endpoint(payload : ActivePerplexityPayload):
     question = payload.question
     try:
-        call_active_perplexity(question)
+        await call_active_perplexity_async(question)
     except Exception as e:
         logger.error(f"Error calling active perplexity: {str(e)}", exc_info=True)
         return {"status": "error", "message": str(e)}
 
+def queue_screenshot(digest: str, page_url: str, page_title: str):
+    """Queue a stored screenshot for background processing and build the upload response."""
+    now = datetime.now()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
+    # The content hash keeps IDs unique even for several captures within the same second
+    doc_id = f"screenshot_{timestamp}_{digest[:12]}"
+    admission, job = admission_controller.admit({
+        "image_hash": digest,
+        "doc_id": doc_id,
+        "timestamp": timestamp,
+        "created_at": now.timestamp(),
+        "page_url": page_url,
+        "page_title": page_title
+    }, key=page_url)
+
+    return {
+        "status": "accepted",
+        "admission": admission,
+        "message": ADMISSION_MESSAGES[admission],
+        "job_id": job.id,
+        # A coalesced upload is processed under the document ID of the job it joined
+        "id": job.payload["doc_id"],
+        "image_hash": digest
+    }
+
 @app.post("/api/upload")
 async def upload_screenshot(payload: ScreenshotPayload):
     """
     Receives a base64-encoded PNG from the Chrome Extension, plus the page title and URL.
 
-    Process uploaded screenshots:
-    1. Save the image
-    2. Extract text using OCR
-    3. Get image description using Pixtral
-    4. Store in vector DB
+    The screenshot is saved and queued right away; OCR, the Pixtral description, the vector DB
+    insert and the passive enrichment run on the background workers. Poll /api/jobs/{job_id}
+    for progress.
     """
 
     try:
@@ -193,85 +347,190 @@ async def upload_screenshot(payload: ScreenshotPayload):
         image_bytes = base64.b64decode(encoded_image)
         logger.info(f"Decoded image bytes length: {len(image_bytes)}")
         
-        # Generate timestamp and filenames
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"screenshot_{timestamp}.png"
-        filepath = os.path.join("screenshots", filename)
-        
-        logger.info(f"Saving screenshot to {filepath}")
-        # Create screenshots directory if it doesn't exist
-        os.makedirs("screenshots", exist_ok=True)
-        
         # Save the screenshot
-        with open(filepath, "wb") as f:
-            f.write(image_bytes)
-            
-        logger.info("Extracting text using OCR")
-        # Extract text using OCR
-        extracted_text = extract_text_from_image(image_bytes)
-        logger.info(f"Extracted text length: {len(extracted_text)}")
-        
-        logger.info("Getting image description from Pixtral")
-        # Get image description using Pixtral
-        image_description = describe_image_with_pixtral(image_bytes)
-        logger.info(f"Image description length: {len(image_description)}")
-        
-        # Combine all information
-        document_content = f"""
-        Page Title: {payload.pageTitle}
-        URL: {payload.pageUrl}
-        
-        Image Description:
-        {image_description}
-        
-        Extracted Text:
-        {extracted_text}
-        """
-        logger.info(f"Combined document length: {len(document_content)}")
-        
-        # Store in vector DB
-        logger.info("Storing page information in vector database")
-        metadata = {
-            "source": "screenshot",
-            "url": payload.pageUrl,
-            "title": payload.pageTitle,
-            "timestamp": timestamp,
-            "filename": filename
-        }
-        
-        # Generate a unique ID using timestamp
-        unique_id = f"screenshot_{timestamp}"
-        logger.info(f"Using unique ID: {unique_id}")
-        
-        add_documents(
-            documents=[document_content],
-            metadata=[metadata],
-            ids=[unique_id],  # Pass the unique ID
-            collection_name="screenshots_collection"
-        )
-        logger.info("Successfully stored in vector database")
+        digest, filepath, created = await asyncio.to_thread(screenshot_store.put_bytes, image_bytes)
+        logger.info(f"Saved screenshot to {filepath}" if created else f"Screenshot already stored at {filepath}")
 
-        browser_info = {
-            "filename": filename,
-            "document_content": document_content,
-            "metadata": metadata
-        }
+        return queue_screenshot(digest, payload.pageUrl, payload.pageTitle)
 
-        # browser_info_string = json.dumps(browser_info)
+    except QueueFullError as e:
+        logger.warning(f"Rejecting screenshot upload: {str(e)}")
+        return {"status": "busy", "message": str(e), "retry_after": INGEST_COALESCE_WINDOW or 1.0}
+    except Exception as e:
+        logger.error(f"Error processing screenshot: {str(e)}", exc_info=True)
+        return {"status": "error", "message": str(e)}
 
-        call_passive_perplexity(browser_info["document_content"])
-        
-        return {
-            "status": "success",
-            "message": "Screenshot processed and stored",
-            "filename": filename,
-            # "extracted_text": extracted_text,
-            "image_description": image_description
-        }
-        
+
+def remove_partial_upload(path: str):
+    """Delete the temporary file of an upload that wasn't committed to the store."""
+    if os.path.exists(path):
+        os.remove(path)
+
+@app.post("/api/upload/raw")
+async def upload_screenshot_raw(
+    request: Request,
+    x_page_url: str = Header(""),
+    x_page_title: str = Header("")
+):
+    """
+    Receives the screenshot as a raw binary request body (e.g. Content-Type: image/png).
+    The page URL and title are passed URL-encoded in the X-Page-Url and X-Page-Title headers.
+
+    The body is streamed straight to disk as it arrives, so the image is never held in memory
+    or base64-decoded. File writes run in worker threads so the event loop stays responsive.
+    """
+    try:
+        logger.info("Processing new raw screenshot upload")
+        partial_path = screenshot_store.new_temp_path()
+        hasher = hashlib.sha256()
+        size = 0
+
+        try:
+            f = await asyncio.to_thread(open, partial_path, "wb")
+            try:
+                async for chunk in request.stream():
+                    size += len(chunk)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise HTTPException(status_code=413, detail=f"Screenshot exceeds {MAX_UPLOAD_BYTES} bytes")
+                    hasher.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            if size == 0:
+                raise HTTPException(status_code=400, detail="Empty request body")
+            digest = hasher.hexdigest()
+            filepath, created = await asyncio.to_thread(screenshot_store.commit, partial_path, digest)
+        finally:
+            await asyncio.to_thread(remove_partial_upload, partial_path)
+        logger.info(f"Received image bytes length: {size}")
+        logger.info(f"Saved screenshot to {filepath}" if created else f"Screenshot already stored at {filepath}")
+
+        return queue_screenshot(digest, unquote(x_page_url), unquote(x_page_title))
+
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        logger.warning(f"Rejecting screenshot upload: {str(e)}")
+        return {"status": "busy", "message": str(e), "retry_after": INGEST_COALESCE_WINDOW or 1.0}
+    except Exception as e:
+        logger.error(f"Error processing screenshot: {str(e)}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+
+@app.post("/api/upload/multipart")
+async def upload_screenshot_multipart(
+    screenshot: UploadFile = File(...),
+    pageUrl: str = Form(""),
+    pageTitle: str = Form("")
+):
+    """
+    Receives the screenshot as a multipart/form-data file field named `screenshot`, with
+    `pageUrl` and `pageTitle` as form fields. The file is copied to disk in chunks.
+    """
+    try:
+        logger.info("Processing new multipart screenshot upload")
+        digest, filepath, created = await asyncio.to_thread(screenshot_store.put_stream, screenshot.file)
+        logger.info(f"Saved screenshot to {filepath}" if created else f"Screenshot already stored at {filepath}")
+
+        return queue_screenshot(digest, pageUrl, pageTitle)
+
+    except QueueFullError as e:
+        logger.warning(f"Rejecting screenshot upload: {str(e)}")
+        return {"status": "busy", "message": str(e), "retry_after": INGEST_COALESCE_WINDOW or 1.0}
     except Exception as e:
         logger.error(f"Error processing screenshot: {str(e)}", exc_info=True)
         return {"status": "error", "message": str(e)}
+    finally:
+        await screenshot.close()
+
+
+@app.get("/api/jobs")
+async def list_jobs_endpoint(status: Optional[str] = None, limit: int = 50):
+    """
+    Lists recent ingestion jobs, newest first, optionally filtered by status.
+    """
+    return {
+        "stats": job_manager.stats(),
+        "admission": admission_controller.stats(),
+        "jobs": [job.model_dump() for job in job_manager.list(status=status, limit=limit)]
+    }
+
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    """
+    Returns size and hit/miss counters of the ingestion and query caches.
+    """
+    return {
+        "image_descriptions": mistral.description_cache.stats(),
+        "llm_responses": response_cache.stats(),
+        "query_results": store.query_cache.stats(),
+        "embeddings": embedding_cache.stats() if embedding_cache is not None else None,
+        "ocr_tiles": tile_ocr.stats()
+    }
+
+class ExportSnapshotPayload(BaseModel):
+    name : Optional[str] = None
+    collection_name : str = "screenshots_collection"
+    format : Literal["npy", "parquet"] = "npy"
+
+class ImportSnapshotPayload(BaseModel):
+    name : str
+    collection_name : Optional[str] = None
+    allow_model_mismatch : bool = False
+
+def snapshot_path(name: str) -> str:
+    """Path of a named snapshot; names can't point outside SNAPSHOT_DIRECTORY."""
+    if not name or name != os.path.basename(name) or name.startswith("."):
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot name: {name}")
+    return os.path.join(SNAPSHOT_DIRECTORY, name)
+
+@app.post("/api/snapshots/export")
+async def export_snapshot_endpoint(payload: ExportSnapshotPayload):
+    """
+    Writes a collection with its embeddings to a named snapshot under SNAPSHOT_DIRECTORY.
+    """
+    name = payload.name or f"{payload.collection_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    try:
+        manifest = await asyncio.to_thread(
+            export_collection, snapshot_path(name), payload.collection_name, payload.format
+        )
+    except FileExistsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"name": name, **manifest}
+
+@app.post("/api/snapshots/import")
+async def import_snapshot_endpoint(payload: ImportSnapshotPayload):
+    """
+    Restores a named snapshot into a collection using its stored embeddings.
+    """
+    path = snapshot_path(payload.name)
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        raise HTTPException(status_code=404, detail=f"Snapshot {payload.name} not found")
+    try:
+        return await asyncio.to_thread(
+            import_collection, path, payload.collection_name, allow_model_mismatch=payload.allow_model_mismatch
+        )
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/compaction")
+async def compaction_stats_endpoint():
+    """
+    Returns totals and the last report of the near-duplicate compaction job.
+    """
+    return {"enabled": COMPACTION_ENABLED, **compactor.stats()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_endpoint(job_id: str):
+    """
+    Returns the status and per-stage progress of a single ingestion job.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.model_dump()
 
 
 # A thread-safe queue to store log messages
@@ -0,0 +1,93 @@
+"""
+Admission control in front of the ingestion queue. Uploads for the same URL that arrive
+within a short window are coalesced into a single job that processes the latest screenshot
+under the document ID given to the first, and new uploads are rejected with a "busy" status
+once too many pipelines are in flight.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from pipeline.jobs import Job, JobManager, QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    Coalesces and rate-limits uploads before they reach the job queue.
+
+    Args:
+        job_manager: Job manager the admitted jobs are queued on
+        coalesce_window: Seconds an upload is held back so later uploads of the same URL can
+            replace it. 0 queues every upload immediately.
+        max_in_flight: Maximum number of deferred, queued and running jobs
+    """
+
+    def __init__(self, job_manager : JobManager, coalesce_window : float = 2.0, max_in_flight : int = 20):
+        self.job_manager = job_manager
+        self.coalesce_window = coalesce_window
+        self.max_in_flight = max_in_flight
+        # coalescing key -> job held back in the window
+        self._pending : Dict[str, Job] = {}
+        self.coalesced = 0
+        self.rejected = 0
+
+    def admit(self, payload : Dict[str, Any], key : Optional[str] = None) -> Tuple[str, Job]:
+        """
+        Admit an upload.
+
+        Args:
+            payload: Job payload for the upload
+            key: Coalescing key, usually the page URL. Uploads without a key are never coalesced.
+
+        Returns:
+            (status, job) where status is "deferred" if the job is held in the coalescing window,
+            "coalesced" if the upload replaced a held job for the same key, or "queued". A
+            coalesced job keeps the doc_id of the upload it was created for, so the ID returned
+            to every coalesced upload names the same document, and lists the image hashes it
+            no longer processes under "superseded".
+
+        Raises:
+            QueueFullError: If too many pipelines are in flight
+        """
+        if key and key in self._pending:
+            job = self._pending[key]
+            superseded = job.payload.get("superseded", []) + [job.payload.get("image_hash")]
+            job.payload = {**payload, "doc_id": job.payload.get("doc_id"), "superseded": superseded}
+            self.coalesced += 1
+            logger.info(f"Coalesced upload for {key} into job {job.id} (replaces screenshot {superseded[-1]})")
+            return "coalesced", job
+
+        if self.job_manager.in_flight() >= self.max_in_flight:
+            self.rejected += 1
+            raise QueueFullError(f"Too many screenshots in flight ({self.max_in_flight}), try again later")
+
+        if not key or self.coalesce_window <= 0:
+            return "queued", self.job_manager.submit(payload)
+
+        job = self.job_manager.create(payload, status="deferred")
+        self._pending[key] = job
+        asyncio.get_running_loop().call_later(self.coalesce_window, self._release, key)
+        return "deferred", job
+
+    def _release(self, key : str) -> None:
+        job = self._pending.pop(key, None)
+        if job is None:
+            return
+        try:
+            self.job_manager.enqueue(job)
+        except QueueFullError as e:
+            job.status = "error"
+            job.error = str(e)
+            logger.warning(f"Dropping deferred job {job.id}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "deferred": len(self._pending),
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "max_in_flight": self.max_in_flight,
+            "coalesce_window": self.coalesce_window
+        }
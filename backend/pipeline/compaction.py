@@ -0,0 +1,231 @@
+"""
+Background compaction of near-duplicate enrichment documents.
+
+Passive enrichment stores up to four topic documents per screenshot, and related pages
+produce many near-identical ones. The compactor walks the enrichment documents in the
+order they were created, clusters each one with its nearest neighbours above a cosine
+similarity threshold, keeps the newest document of a cluster and deletes the others. The
+survivor records how many documents and which topics were merged into it.
+
+Progress is checkpointed, so every run only looks at documents added since the previous
+one, and each run handles a bounded batch in a worker thread so it never blocks serving.
+Screenshot documents are left alone: their near-duplicates are already caught at ingestion
+by the perceptual-hash dedup, and they own screenshot files. Enrichment documents stored
+before `created_at` existed are only scanned once the metadata backfill has given them
+`created_at` 0 (see VectorStore.backfill_metadata), which is why the API starts compaction
+after the backfill.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from db.vector_store import VectorStore, get_vector_store
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "true").lower() == "true"
+COMPACTION_SIMILARITY = float(os.getenv("COMPACTION_SIMILARITY", "0.97"))
+COMPACTION_NEIGHBORS = int(os.getenv("COMPACTION_NEIGHBORS", "5"))
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "200"))
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "600"))
+
+# Longest merged_topics value kept on a survivor
+MAX_MERGED_TOPICS_LENGTH = 1000
+
+
+def cosine_similarity(a, b) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b)) / norm if norm else 0.0
+
+
+class Compactor:
+    """
+    Incremental near-duplicate compaction of one collection.
+
+    Args:
+        store: Vector store holding the collection
+        collection_name: Collection to compact
+        state_path: JSON file the checkpoint is kept in
+        similarity: Cosine similarity above which two documents are duplicates
+        neighbors: Number of nearest neighbours compared with each document
+        batch_size: Maximum number of documents examined per run
+    """
+
+    def __init__(
+        self,
+        store : VectorStore,
+        collection_name : str = "screenshots_collection",
+        state_path : Optional[str] = None,
+        similarity : float = 0.97,
+        neighbors : int = 5,
+        batch_size : int = 200
+    ):
+        self.store = store
+        self.collection_name = collection_name
+        self.state_path = state_path or os.path.join(store.persist_directory, f"compaction_{collection_name}.json")
+        self.similarity = similarity
+        self.neighbors = neighbors
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._state = {"created_at": 0.0, "ids": []}
+        self.totals = {"runs": 0, "scanned": 0, "clusters": 0, "removed": 0, "reclaimed_bytes": 0}
+        self.last_report : Optional[Dict[str, Any]] = None
+        self._load()
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Compact the next batch of documents added since the last checkpoint.
+
+        Returns:
+            Report with the number of documents scanned, clusters found, documents removed,
+            bytes reclaimed (document text plus float32 embedding), and whether more
+            documents are waiting.
+        """
+        with self._lock:
+            started = time.monotonic()
+            report = {"scanned": 0, "clusters": 0, "removed": 0, "reclaimed_bytes": 0}
+            page = self.store.list_documents(
+                limit=self.batch_size + len(self._state["ids"]),
+                sort="timestamp",
+                descending=False,
+                include=["documents", "metadatas", "embeddings"],
+                where={"$and": [{"source": "enrichment"}, {"created_at": {"$gte": self._state["created_at"]}}]},
+                group_chunks=False,
+                collection_name=self.collection_name
+            )
+            seen = set(self._state["ids"])
+            removed = set()
+            batch = [
+                (id, document, metadata, embedding)
+                for id, document, metadata, embedding
+                in zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"])
+                if id not in seen
+            ][:self.batch_size]
+
+            for id, document, metadata, embedding in batch:
+                report["scanned"] += 1
+                self._advance(id, metadata)
+                if id in removed:
+                    continue
+                victims = self._compact(id, document, metadata, embedding)
+                if victims:
+                    report["clusters"] += 1
+                    report["removed"] += len(victims)
+                    report["reclaimed_bytes"] += sum(size for _, size in victims)
+                    removed.update(victim for victim, _ in victims)
+
+            self._save()
+            report["pending"] = len(batch) == self.batch_size
+            report["duration_seconds"] = round(time.monotonic() - started, 3)
+            self.totals["runs"] += 1
+            for key in ("scanned", "clusters", "removed", "reclaimed_bytes"):
+                self.totals[key] += report[key]
+            self.last_report = report
+            if report["removed"]:
+                logger.info(
+                    f"Compaction removed {report['removed']} near-duplicate documents in {report['clusters']} clusters, "
+                    f"reclaiming {report['reclaimed_bytes']} bytes"
+                )
+            return report
+
+    def _compact(self, id : str, document : str, metadata : Dict[str, Any], embedding) -> List[tuple]:
+        """Merge the near-duplicates of one document. Returns (removed id, size) pairs."""
+        collection = self.store.collection(self.collection_name)
+        results = collection.query(
+            query_embeddings=[embedding],
+            n_results=self.neighbors + 1,
+            where={"source": "enrichment"},
+            include=["documents", "metadatas", "embeddings"]
+        )
+        cluster = [(id, document, metadata or {}, embedding)]
+        for neighbor in zip(results["ids"][0], results["documents"][0], results["metadatas"][0], results["embeddings"][0]):
+            if neighbor[0] != id and cosine_similarity(embedding, neighbor[3]) >= self.similarity:
+                cluster.append((neighbor[0], neighbor[1], neighbor[2] or {}, neighbor[3]))
+        if len(cluster) == 1:
+            return []
+
+        cluster.sort(key=lambda member: (float(member[2].get("created_at", 0)), member[0]), reverse=True)
+        survivor, victims = cluster[0], cluster[1:]
+
+        topics = [topic for topic in survivor[2].get("merged_topics", "").split("; ") if topic]
+        for _, _, victim_metadata, _ in victims:
+            for topic in [victim_metadata.get("topic")] + victim_metadata.get("merged_topics", "").split("; "):
+                if topic and topic != survivor[2].get("topic") and topic not in topics:
+                    topics.append(topic)
+        merged_count = sum(int(member[2].get("merged_count", 0)) + 1 for member in victims)
+
+        for victim_id, _, _, _ in victims:
+            self.store.delete_document(victim_id, collection_name=self.collection_name)
+        self.store.merge_document_metadata(
+            survivor[0],
+            {"merged_topics": "; ".join(topics)[:MAX_MERGED_TOPICS_LENGTH]},
+            increments={"merged_count": merged_count},
+            collection_name=self.collection_name
+        )
+        return [
+            (victim_id, len((victim_document or "").encode()) + 4 * len(victim_embedding))
+            for victim_id, victim_document, _, victim_embedding in victims
+        ]
+
+    def _advance(self, id : str, metadata : Dict[str, Any]) -> None:
+        created_at = float((metadata or {}).get("created_at", 0))
+        if created_at > self._state["created_at"]:
+            self._state = {"created_at": created_at, "ids": []}
+        self._state["ids"].append(id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.totals,
+            "checkpoint": self._state["created_at"],
+            "last_report": self.last_report
+        }
+
+    def _load(self) -> None:
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r") as f:
+                self._state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load compaction checkpoint {self.state_path}, starting over: {str(e)}")
+
+    def _save(self) -> None:
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.state_path)
+
+
+compactor = Compactor(
+    get_vector_store(),
+    similarity=COMPACTION_SIMILARITY,
+    neighbors=COMPACTION_NEIGHBORS,
+    batch_size=COMPACTION_BATCH_SIZE
+)
+
+
+async def run_compaction() -> None:
+    """
+    Run compaction forever. Batches follow each other with a short pause while documents are
+    waiting, then the compactor sleeps for COMPACTION_INTERVAL_SECONDS.
+    """
+    while True:
+        pending = False
+        try:
+            report = await asyncio.to_thread(compactor.run_once)
+            pending = report["pending"]
+        except Exception as e:
+            logger.error(f"Compaction failed: {str(e)}", exc_info=True)
+        await asyncio.sleep(1 if pending else COMPACTION_INTERVAL_SECONDS)
@@ -0,0 +1,170 @@
+"""
+Perceptual-hash index used to skip near-identical screenshots before OCR and Pixtral.
+Frames are hashed with a 256-bit difference hash (dHash) and compared, per URL, against the
+most recent frames by Hamming distance. A thumbnail hash only sees the page layout, so two
+captures of the same layout with different text hash alike; a frame therefore only counts
+as a duplicate if the content digests of its tiles match as well. The index is kept in
+memory and persisted to disk.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 16
+# Grid of tiles whose content digests must match for a frame to be a duplicate
+TILE_ROWS = 8
+TILE_COLUMNS = 4
+# Gray levels kept in the tile digests, so encoder noise doesn't change them but text does
+TILE_LEVELS = 4
+
+
+def dhash(image_bytes : bytes, hash_size : int = HASH_SIZE) -> int:
+    """
+    Compute the difference hash of an image.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail and each bit
+    records whether a pixel is brighter than its right-hand neighbour, so the hash is stable
+    under re-encoding, small scroll offsets and minor rendering changes.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    return dhash_image(image, hash_size)
+
+
+def dhash_image(image : Image.Image, hash_size : int = HASH_SIZE) -> int:
+    """Compute the difference hash of an already decoded image."""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a : int, b : int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def tile_digests(image : Image.Image, rows : int = TILE_ROWS, columns : int = TILE_COLUMNS) -> List[str]:
+    """
+    Content digests of a grid of tiles of an image, at full resolution with the gray levels
+    reduced to TILE_LEVELS. Unlike the dHash they change when any text on the page does.
+    """
+    gray = image.convert("L").point(lambda p: p * TILE_LEVELS // 256)
+    width, height = gray.size
+    digests = []
+    for row in range(rows):
+        for column in range(columns):
+            box = (column * width // columns, row * height // rows, (column + 1) * width // columns, (row + 1) * height // rows)
+            digests.append(hashlib.sha1(gray.crop(box).tobytes()).hexdigest()[:16])
+    return digests
+
+
+class PerceptualHashIndex:
+    """
+    Per-URL index of recent frame hashes.
+
+    Args:
+        path: JSON file the index is persisted to. Pass None to keep it in memory only.
+        max_distance: Maximum Hamming distance between the dHashes of two duplicate frames
+        max_changed_tiles: Maximum number of tiles whose content may differ between two
+            duplicate frames. 0 means only frames with the same content everywhere are skipped.
+        max_frames_per_url: Number of recent frames remembered for each URL
+        max_age_seconds: Frames older than this are never matched
+    """
+
+    def __init__(
+        self,
+        path : Optional[str] = None,
+        max_distance : int = 8,
+        max_changed_tiles : int = 0,
+        max_frames_per_url : int = 20,
+        max_age_seconds : float = 24 * 60 * 60
+    ):
+        self.path = path
+        self.max_distance = max_distance
+        self.max_changed_tiles = max_changed_tiles
+        self.max_frames_per_url = max_frames_per_url
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        # url -> list of [hash, document id, epoch seconds, tile digests], oldest first
+        self._frames : Dict[str, List[list]] = {}
+        self._load()
+
+    def find_duplicate(self, url : str, frame_hash : int, tiles : List[str]) -> Optional[Tuple[str, int]]:
+        """
+        Return (document id, distance) of the closest recent frame for the URL that is
+        within `max_distance` and has at most `max_changed_tiles` tiles with other content,
+        or None if the frame is new.
+        """
+        cutoff = time.time() - self.max_age_seconds
+        best = None
+        with self._lock:
+            for frame in self._frames.get(url, []):
+                # Frames indexed before tile digests existed can't be confirmed, so never match
+                if len(frame) < 4 or frame[2] < cutoff:
+                    continue
+                stored_hash, doc_id, _, stored_tiles = frame
+                distance = hamming_distance(stored_hash, frame_hash)
+                if distance > self.max_distance or (best is not None and distance >= best[1]):
+                    continue
+                changed = len(tiles) if len(stored_tiles) != len(tiles) else sum(a != b for a, b in zip(stored_tiles, tiles))
+                if changed <= self.max_changed_tiles:
+                    best = (doc_id, distance)
+        return best
+
+    def add(self, url : str, frame_hash : int, doc_id : str, tiles : List[str]) -> None:
+        """Remember a frame for the URL and persist the index."""
+        with self._lock:
+            frames = self._frames.setdefault(url, [])
+            frames.append([frame_hash, doc_id, time.time(), tiles])
+            del frames[:-self.max_frames_per_url]
+            self._save()
+
+    def touch(self, url : str, doc_id : str) -> None:
+        """Refresh the last-seen time of a document's frame after a duplicate was merged into it."""
+        with self._lock:
+            for frame in self._frames.get(url, []):
+                if frame[1] == doc_id:
+                    frame[2] = time.time()
+            self._save()
+
+    def remove(self, doc_id : str) -> None:
+        """Forget every frame that points at the given document."""
+        with self._lock:
+            for url in list(self._frames.keys()):
+                self._frames[url] = [frame for frame in self._frames[url] if frame[1] != doc_id]
+                if not self._frames[url]:
+                    del self._frames[url]
+            self._save()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                self._frames = json.load(f)
+            logger.info(f"Loaded perceptual hashes for {len(self._frames)} URLs from {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not load perceptual hash index from {self.path}: {str(e)}")
+            self._frames = {}
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._frames, f)
+        os.replace(tmp_path, self.path)
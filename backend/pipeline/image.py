@@ -0,0 +1,101 @@
+"""
+Decode-once image preprocessing for screenshots. A `ScreenshotImage` decodes the uploaded
+bytes a single time and derives every variant the pipeline needs from that in-memory image:
+the perceptual hash, a grayscale (optionally binarized) copy for OCR and a downscaled
+JPEG/WebP encoding for the vision model.
+"""
+
+import base64
+import io
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageOps
+
+from pipeline.dedup import dhash_image, tile_digests
+
+# Pixel differences at or below this are treated as background when cropping
+CROP_TOLERANCE = 10
+BINARIZE_THRESHOLD = 128
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class ScreenshotImage:
+    """
+    A decoded screenshot and its derived variants.
+
+    Args:
+        image_bytes: Encoded image as uploaded (usually PNG)
+        crop_to_content: Crop uniform margins before deriving the OCR and vision variants
+    """
+
+    def __init__(self, image_bytes : bytes, crop_to_content : bool = False):
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+        # As decoded, in its own mode (e.g. with alpha), for lossless re-encoding
+        self.decoded = image
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        self.original = image
+        self.image = image
+        if crop_to_content:
+            box = self.content_box()
+            if box is not None and box != (0, 0) + image.size:
+                self.image = image.crop(box)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.image.size
+
+    def content_box(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Bounding box of everything that differs from the top-left pixel's colour,
+        i.e. the page content without uniform margins. None if the image is blank.
+        """
+        background = Image.new(self.original.mode, self.original.size, self.original.getpixel((0, 0)))
+        diff = ImageChops.difference(self.original, background).convert("L")
+        mask = diff.point(lambda p: 255 if p > CROP_TOLERANCE else 0)
+        return mask.getbbox()
+
+    def dhash(self) -> int:
+        """Perceptual hash of the full (uncropped) frame, used for deduplication."""
+        return dhash_image(self.original)
+
+    def tile_digests(self) -> List[str]:
+        """Content digests of the tiles of the full frame, confirming dHash matches."""
+        return tile_digests(self.original)
+
+    def ocr_variant(self, binarize : bool = False) -> Image.Image:
+        """
+        Grayscale copy for Tesseract. With `binarize`, contrast is stretched and the image
+        thresholded to black and white, which helps on low-contrast pages.
+        """
+        gray = self.image.convert("L")
+        if binarize:
+            gray = ImageOps.autocontrast(gray).point(lambda p: 255 if p > BINARIZE_THRESHOLD else 0)
+        return gray
+
+    def vision_variant(
+        self,
+        max_size : Tuple[int, int] = (500, 500),
+        format : str = "JPEG",
+        quality : int = 85
+    ) -> bytes:
+        """Downscaled, lossy-encoded copy for the vision model."""
+        resized = self.image.copy()
+        resized.thumbnail(max_size, Image.Resampling.LANCZOS)
+        if format == "JPEG" and resized.mode != "RGB":
+            resized = resized.convert("RGB")
+        output_buffer = io.BytesIO()
+        resized.save(output_buffer, format=format, quality=quality)
+        return output_buffer.getvalue()
+
+    def vision_variant_base64(
+        self,
+        max_size : Tuple[int, int] = (500, 500),
+        format : str = "JPEG",
+        quality : int = 85
+    ) -> Tuple[str, str]:
+        """Return (base64 data, MIME type) of the vision variant."""
+        data = self.vision_variant(max_size, format, quality)
+        return base64.b64encode(data).decode("utf-8"), MIME_TYPES[format]
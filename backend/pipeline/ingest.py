@@ -0,0 +1,269 @@
+"""
+Screenshot ingestion pipeline. `process_screenshot` is run by the background job workers
+for every upload and fills in per-stage progress on the job as it goes.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytesseract
+from dotenv import load_dotenv
+
+from clients import mistral
+from db.filters import url_domain
+from db.vector_store import get_vector_store
+from pipeline.dedup import PerceptualHashIndex
+from pipeline.image import ScreenshotImage
+from pipeline.jobs import Job
+from pipeline.ocr import TileOCR
+from pipeline.storage import ScreenshotStore
+from utils import call_passive_perplexity_async
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+store = get_vector_store()
+
+STAGES = ["decode", "dedup", "ocr", "describe", "store", "enrich"]
+
+# Screenshot storage
+SCREENSHOT_DIR = os.getenv("SCREENSHOT_DIR", "screenshots")
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "png")
+
+# Near-duplicate frame detection
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "8"))
+DEDUP_MAX_CHANGED_TILES = int(os.getenv("DEDUP_MAX_CHANGED_TILES", "0"))
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", "20"))
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH", os.path.join(SCREENSHOT_DIR, "phash_index.json"))
+
+# Image preprocessing
+CROP_TO_CONTENT = os.getenv("CROP_TO_CONTENT", "false").lower() == "true"
+OCR_BINARIZE = os.getenv("OCR_BINARIZE", "false").lower() == "true"
+VISION_MAX_SIZE = int(os.getenv("VISION_MAX_SIZE", "500"))
+VISION_FORMAT = os.getenv("VISION_FORMAT", "JPEG").upper()
+VISION_QUALITY = int(os.getenv("VISION_QUALITY", "85"))
+
+# Tesseract is CPU-bound, so OCR runs in a process pool sized to the cores
+OCR_PROCESSES = int(os.getenv("OCR_PROCESSES", str(os.cpu_count() or 1)))
+
+# Incremental OCR: only re-read tiles that changed since an earlier capture
+OCR_TILED = os.getenv("OCR_TILED", "true").lower() == "true"
+OCR_TILE_CACHE_SIZE = int(os.getenv("OCR_TILE_CACHE_SIZE", "5000"))
+OCR_MAX_TILE_HEIGHT = int(os.getenv("OCR_MAX_TILE_HEIGHT", "400"))
+
+tile_ocr = TileOCR(cache_size=OCR_TILE_CACHE_SIZE, max_tile_height=OCR_MAX_TILE_HEIGHT)
+
+_ocr_executor = None
+
+def get_ocr_executor() -> ProcessPoolExecutor:
+    """Get or create the process pool used for OCR."""
+    global _ocr_executor
+    if _ocr_executor is None:
+        _ocr_executor = ProcessPoolExecutor(max_workers=OCR_PROCESSES)
+        logger.info(f"Started OCR process pool with {OCR_PROCESSES} processes")
+    return _ocr_executor
+
+def shutdown_ocr_executor() -> None:
+    global _ocr_executor
+    if _ocr_executor is not None:
+        _ocr_executor.shutdown(cancel_futures=True)
+        _ocr_executor = None
+
+screenshot_store = ScreenshotStore(root=SCREENSHOT_DIR, format=SCREENSHOT_FORMAT)
+
+phash_index = PerceptualHashIndex(
+    path=DEDUP_INDEX_PATH,
+    max_distance=DEDUP_MAX_DISTANCE,
+    max_changed_tiles=DEDUP_MAX_CHANGED_TILES,
+    max_frames_per_url=DEDUP_WINDOW
+)
+
+
+def extract_text_from_image(image):
+    """Extract text from an OCR-ready PIL image using Tesseract"""
+    text = pytesseract.image_to_string(image)
+    return text.strip()
+
+def vision_input(screenshot : ScreenshotImage):
+    """Base64 image and MIME type sent to Pixtral"""
+    return screenshot.vision_variant_base64(
+        max_size=(VISION_MAX_SIZE, VISION_MAX_SIZE),
+        format=VISION_FORMAT,
+        quality=VISION_QUALITY
+    )
+
+
+def find_duplicate_frame(payload : dict, screenshot : ScreenshotImage, unique_id : str) -> dict | None:
+    """
+    Check the frame against recent frames of the same URL. A frame with the same layout
+    (dHash) and the same content in its tiles is a duplicate and is merged into the
+    existing document's metadata; a new frame is registered under `unique_id` so later
+    captures can be matched against it.
+
+    Returns:
+        The job result for a duplicate frame, or None if the frame should be processed.
+    """
+    frame_hash = screenshot.dhash()
+    tiles = screenshot.tile_digests()
+    url = payload["page_url"]
+    match = phash_index.find_duplicate(url, frame_hash, tiles)
+
+    if match is not None:
+        existing_id, distance = match
+        merged = store.merge_document_metadata(
+            existing_id,
+            {"last_seen": payload["timestamp"], "last_seen_at": payload["created_at"], "last_seen_title": payload["page_title"]},
+            increments={"duplicate_count": 1},
+            collection_name="screenshots_collection"
+        )
+        if merged:
+            logger.info(f"Screenshot is a near-duplicate of {existing_id} (distance {distance}), skipping")
+            phash_index.touch(url, existing_id)
+            # The frame's file is left to the screenshot GC, which removes it once unreferenced
+            return {
+                "id": existing_id,
+                "duplicate_of": existing_id,
+                "distance": distance,
+                "filename": None
+            }
+        # The matched document has not been stored yet (its job is still running), so the
+        # frame is processed normally
+
+    phash_index.add(url, frame_hash, unique_id, tiles)
+    return None
+
+
+async def run_ocr(job : Job, screenshot : ScreenshotImage) -> str:
+    with job.stage("ocr"):
+        logger.info("Extracting text using OCR")
+        ocr_image = await asyncio.to_thread(screenshot.ocr_variant, OCR_BINARIZE)
+        if OCR_TILED:
+            extracted_text = await tile_ocr.extract_text(ocr_image, get_ocr_executor())
+        else:
+            loop = asyncio.get_running_loop()
+            extracted_text = await loop.run_in_executor(get_ocr_executor(), extract_text_from_image, ocr_image)
+        logger.info(f"Extracted text length: {len(extracted_text)}")
+    return extracted_text
+
+async def run_describe(job : Job, screenshot : ScreenshotImage) -> str:
+    with job.stage("describe"):
+        logger.info("Getting image description from Pixtral")
+        # Only the image encoding needs a thread; the API call awaits on the shared HTTP client
+        base64_image, mime_type = await asyncio.to_thread(vision_input, screenshot)
+        image_description = await mistral.get_image_description_async(base64_image, mime_type=mime_type)
+        logger.info(f"Image description length: {len(image_description)}")
+    return image_description
+
+
+async def process_screenshot(job : Job) -> dict:
+    """
+    Run the ingestion stages for a screenshot that has already been saved to disk.
+
+    Process uploaded screenshots:
+    1. Skip frames that are near-identical to a recent frame of the same URL
+    2. Extract text using OCR
+    3. Get image description using Pixtral
+    4. Store in vector DB
+    5. Enrich with related topics via Perplexity
+
+    OCR (in the process pool) and the async Pixtral request run concurrently, so their
+    combined latency is roughly that of the slower one, and a failure of either cancels the
+    other. The other blocking stages run in worker threads so the event loop stays responsive.
+    """
+    payload = job.payload
+    digest = payload["image_hash"]
+    unique_id = payload["doc_id"]
+
+    with job.stage("decode"):
+        filepath = screenshot_store.path_for(digest)
+        if filepath is None:
+            raise FileNotFoundError(f"Screenshot {digest} is no longer in the store")
+        with open(filepath, "rb") as f:
+            image_bytes = f.read()
+        # Decode once; every stage works from variants of this image
+        screenshot = await asyncio.to_thread(ScreenshotImage, image_bytes, CROP_TO_CONTENT)
+        del image_bytes
+
+    with job.stage("dedup") as stage:
+        if not DEDUP_ENABLED:
+            stage.status = "skipped"
+        else:
+            duplicate = await asyncio.to_thread(find_duplicate_frame, payload, screenshot, unique_id)
+            if duplicate is not None:
+                for name in STAGES[STAGES.index("dedup") + 1:]:
+                    job.skip_stage(name)
+                return duplicate
+
+    try:
+        # If either stage fails the task group cancels the other, so a failed OCR doesn't
+        # leave the Pixtral call running (or the other way around)
+        try:
+            async with asyncio.TaskGroup() as group:
+                ocr = group.create_task(run_ocr(job, screenshot))
+                describe = group.create_task(run_describe(job, screenshot))
+        except ExceptionGroup as e:
+            # The job reports the failed stage's own error, not the group
+            raise e.exceptions[0]
+        extracted_text, image_description = ocr.result(), describe.result()
+
+        # Combine all information
+        document_content = f"""
+            Page Title: {payload["page_title"]}
+            URL: {payload["page_url"]}
+        
+            Image Description:
+            {image_description}
+        
+            Extracted Text:
+            {extracted_text}
+            """
+        logger.info(f"Combined document length: {len(document_content)}")
+
+        with job.stage("store"):
+            if screenshot_store.format != "png":
+                filepath = await asyncio.to_thread(screenshot_store.transcode, digest, screenshot.decoded)
+
+            metadata = {
+                "source": "screenshot",
+                "url": payload["page_url"],
+                "title": payload["page_title"],
+                "timestamp": payload["timestamp"],
+                "created_at": payload["created_at"],
+                "domain": url_domain(payload["page_url"]),
+                "filename": os.path.relpath(filepath, screenshot_store.root),
+                "image_hash": digest
+            }
+
+            logger.info("Storing page information in vector database")
+            logger.info(f"Using unique ID: {unique_id}")
+            await asyncio.to_thread(
+                store.add_chunked_document,
+                id=unique_id,
+                content=document_content,
+                metadata=metadata,
+                collection_name="screenshots_collection"
+            )
+            logger.info("Successfully stored in vector database")
+    except Exception:
+        # Don't let later frames of this page be merged into a document that was never stored
+        phash_index.remove(unique_id)
+        raise
+
+    with job.stage("enrich"):
+        await call_passive_perplexity_async(
+            document_content,
+            page_title=payload["page_title"],
+            page_url=payload["page_url"],
+            page_text=extracted_text,
+            document_id=unique_id
+        )
+
+    return {
+        "id": unique_id,
+        "filename": metadata["filename"],
+        "image_description": image_description
+    }
@@ -0,0 +1,241 @@
+"""
+Background job queue for screenshot ingestion. Uploads are persisted and turned into jobs
+right away, and a bounded pool of asyncio workers runs the pipeline stages for each job.
+Per-stage progress is kept in memory so it can be reported through the jobs API.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class StageProgress(BaseModel):
+    """
+    Progress of a single pipeline stage.
+
+    Attributes:
+        name (str): Stage name, e.g. "ocr" or "describe"
+        status (str): One of "pending", "running", "done", "skipped", "cancelled" or "error"
+        started_at (float | None): Epoch seconds when the stage started
+        finished_at (float | None): Epoch seconds when the stage finished
+        error (str | None): Error message if the stage failed
+    """
+    name : str
+    status : str = "pending"
+    started_at : Optional[float] = None
+    finished_at : Optional[float] = None
+    error : Optional[str] = None
+
+
+class Job(BaseModel):
+    """
+    A queued screenshot ingestion job.
+
+    Attributes:
+        id (str): Unique job id returned to the uploader
+        status (str): One of "deferred", "queued", "running", "done" or "error"
+        created_at (float): Epoch seconds when the job was accepted
+        payload (dict): Inputs for the pipeline (file path, page title, URL, ...)
+        stages (List[StageProgress]): Progress of each pipeline stage, in order
+        result (dict): Output of the pipeline once the job is done
+        error (str | None): Error message if the job failed
+    """
+    id : str
+    status : str = "queued"
+    created_at : float
+    finished_at : Optional[float] = None
+    payload : Dict[str, Any] = {}
+    stages : List[StageProgress] = []
+    result : Dict[str, Any] = {}
+    error : Optional[str] = None
+
+    def get_stage(self, name : str) -> StageProgress:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        stage = StageProgress(name=name)
+        self.stages.append(stage)
+        return stage
+
+    @contextmanager
+    def stage(self, name : str):
+        """Mark a stage as running for the duration of the block and record its outcome."""
+        progress = self.get_stage(name)
+        progress.status = "running"
+        progress.started_at = time.time()
+        try:
+            yield progress
+        except asyncio.CancelledError:
+            # E.g. the sibling of a stage that failed in the same task group
+            progress.status = "cancelled"
+            progress.finished_at = time.time()
+            raise
+        except Exception as e:
+            progress.status = "error"
+            progress.error = str(e)
+            progress.finished_at = time.time()
+            raise
+        if progress.status == "running":
+            progress.status = "done"
+        progress.finished_at = time.time()
+
+    def skip_stage(self, name : str) -> None:
+        self.get_stage(name).status = "skipped"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the ingestion queue is at capacity."""
+
+
+class JobManager:
+    """
+    Owns the job queue, the worker pool and the in-memory job history.
+
+    Args:
+        handler: Coroutine run by a worker for each job
+        stages: Names of the pipeline stages, used to pre-populate job progress
+        num_workers: Number of concurrent workers
+        max_queue_size: Maximum number of queued jobs before submissions are rejected
+        max_history: Maximum number of jobs kept for status lookups
+    """
+
+    def __init__(
+        self,
+        handler : Callable[[Job], Awaitable[Dict[str, Any]]],
+        stages : List[str],
+        num_workers : int = 2,
+        max_queue_size : int = 100,
+        max_history : int = 1000
+    ):
+        self.handler = handler
+        self.stages = stages
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.max_history = max_history
+        self._jobs : "OrderedDict[str, Job]" = OrderedDict()
+        self._queue : Optional[asyncio.Queue] = None
+        self._workers : List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Create the queue and spawn the worker tasks on the running event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.num_workers)
+        ]
+        logger.info(f"Started {self.num_workers} ingestion workers")
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks. Queued jobs that have not started are dropped."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def create(self, payload : Dict[str, Any], status : str = "queued", job_id : Optional[str] = None) -> Job:
+        """Register a new job without queueing it yet (see `enqueue`)."""
+        job = Job(
+            id=job_id or uuid.uuid4().hex,
+            status=status,
+            created_at=time.time(),
+            payload=payload,
+            stages=[StageProgress(name=name) for name in self.stages]
+        )
+        self._jobs[job.id] = job
+        self._trim_history()
+        return job
+
+    def enqueue(self, job : Job) -> None:
+        """
+        Hand a registered job to the workers.
+
+        Raises:
+            QueueFullError: If the queue is at capacity or the workers are not running
+        """
+        if self._queue is None:
+            raise QueueFullError("Ingestion workers are not running")
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Ingestion queue is full ({self.max_queue_size} jobs)")
+        job.status = "queued"
+        logger.info(f"Queued job {job.id} ({self._queue.qsize()} waiting)")
+
+    def submit(self, payload : Dict[str, Any], job_id : Optional[str] = None) -> Job:
+        """
+        Queue a new job for the given payload.
+
+        Raises:
+            QueueFullError: If the queue is at capacity or the workers are not running
+        """
+        job = self.create(payload, job_id=job_id)
+        try:
+            self.enqueue(job)
+        except QueueFullError:
+            del self._jobs[job.id]
+            raise
+        return job
+
+    def in_flight(self) -> int:
+        """Number of jobs that are deferred, queued or running."""
+        return sum(1 for job in self._jobs.values() if job.status in ("deferred", "queued", "running"))
+
+    def get(self, job_id : str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, status : Optional[str] = None, limit : int = 50) -> List[Job]:
+        """Return the most recent jobs first, optionally filtered by status."""
+        jobs = [job for job in reversed(self._jobs.values()) if status is None or job.status == status]
+        return jobs[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        counts : Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self.in_flight(),
+            "max_queue_size": self.max_queue_size,
+            "jobs": counts
+        }
+
+    def _trim_history(self) -> None:
+        # Evict the oldest finished jobs first so in-flight jobs stay visible
+        if len(self._jobs) <= self.max_history:
+            return
+        for job_id in list(self._jobs.keys()):
+            if len(self._jobs) <= self.max_history:
+                break
+            if self._jobs[job_id].status in ("done", "error"):
+                del self._jobs[job_id]
+
+    async def _worker(self, index : int) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            logger.info(f"Worker {index} running job {job.id}")
+            try:
+                job.result = await self.handler(job) or {}
+                job.status = "done"
+                logger.info(f"Job {job.id} finished")
+            except asyncio.CancelledError:
+                job.status = "error"
+                job.error = "cancelled"
+                raise
+            except Exception as e:
+                job.status = "error"
+                job.error = str(e)
+                logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
@@ -0,0 +1,157 @@
+"""
+Incremental, tile-based OCR. A screenshot is split into horizontal bands at blank rows, each
+band is hashed, and Tesseract only runs on bands whose hash has not been seen before. Because
+the hash ignores the band's position, unchanged content is reused even after the page has
+been scrolled, and the remaining bands are spread across the OCR process pool.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageOps
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+# Rows whose mean horizontal edge strength is below this are treated as blank
+BLANK_ROW_THRESHOLD = 0.05
+# Bands shorter than this (in pixels) are rules or borders, not text
+MIN_TILE_HEIGHT = 8
+# White space added around each band, Tesseract struggles with glyphs touching the edge
+TILE_PADDING = 10
+
+
+def ocr_tile(tile : Image.Image, config : str = "") -> str:
+    """Run Tesseract on a single tile. Runs in the OCR process pool."""
+    return pytesseract.image_to_string(tile, config=config).strip()
+
+
+def row_profile(image : Image.Image) -> List[float]:
+    """Mean horizontal edge strength of every row of a grayscale image."""
+    shifted = ImageChops.offset(image, 1, 0)
+    edges = ImageChops.difference(image, shifted).convert("F")
+    profile = edges.resize((1, image.height), Image.Resampling.BOX)
+    return list(profile.getdata())
+
+
+def split_tiles(image : Image.Image, max_tile_height : int = 400) -> List[Tuple[int, int]]:
+    """
+    Split a grayscale image into horizontal bands of content separated by blank rows.
+
+    Bands taller than `max_tile_height` are split again at their quietest row in the lower
+    half of the window, which is usually the gap between two lines of text.
+
+    Returns:
+        (top, bottom) row ranges, top to bottom
+    """
+    profile = row_profile(image)
+    bands = []
+    top = None
+    for y, value in enumerate(profile):
+        if value >= BLANK_ROW_THRESHOLD and top is None:
+            top = y
+        elif value < BLANK_ROW_THRESHOLD and top is not None:
+            bands.append((top, y))
+            top = None
+    if top is not None:
+        bands.append((top, len(profile)))
+
+    tiles = []
+    for top, bottom in bands:
+        while bottom - top > max_tile_height:
+            window = profile[top + max_tile_height // 2:top + max_tile_height]
+            cut = top + max_tile_height // 2 + window.index(min(window))
+            tiles.append((top, cut))
+            top = cut
+        tiles.append((top, bottom))
+    return [(top, bottom) for top, bottom in tiles if bottom - top >= MIN_TILE_HEIGHT]
+
+
+class TileOCR:
+    """
+    OCR engine with a per-tile text cache.
+
+    Args:
+        cache_size: Maximum number of tile texts kept in the LRU cache
+        max_tile_height: Maximum height of a tile in pixels
+        tesseract_config: Extra Tesseract command line options
+    """
+
+    def __init__(self, cache_size : int = 5000, max_tile_height : int = 400, tesseract_config : str = ""):
+        self.cache_size = cache_size
+        self.max_tile_height = max_tile_height
+        self.tesseract_config = tesseract_config
+        self._cache : "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def prepare_tiles(self, image : Image.Image) -> List[Tuple[str, Image.Image]]:
+        """Split the image into padded tiles and hash each one."""
+        tiles = []
+        for top, bottom in split_tiles(image, self.max_tile_height):
+            tile = image.crop((0, top, image.width, bottom))
+            digest = hashlib.sha1(tile.tobytes()).hexdigest()
+            background = tile.getpixel((0, 0))
+            tiles.append((digest, ImageOps.expand(tile, border=TILE_PADDING, fill=background)))
+        return tiles
+
+    def get_cached(self, digest : str) -> Optional[str]:
+        with self._lock:
+            text = self._cache.get(digest)
+            if text is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(digest)
+            self.hits += 1
+            return text
+
+    def put_cached(self, digest : str, text : str) -> None:
+        with self._lock:
+            self._cache[digest] = text
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    async def extract_text(self, image : Image.Image, executor : Executor) -> str:
+        """
+        OCR a grayscale image, running Tesseract only on tiles missing from the cache.
+        Changed tiles are OCR'd concurrently on the given executor.
+        """
+        tiles = await asyncio.to_thread(self.prepare_tiles, image)
+        texts : Dict[str, str] = {}
+        pending : Dict[str, Image.Image] = {}
+        for digest, tile in tiles:
+            if digest in texts or digest in pending:
+                continue
+            cached = self.get_cached(digest)
+            if cached is None:
+                pending[digest] = tile
+            else:
+                texts[digest] = cached
+
+        if pending:
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, ocr_tile, tile, self.tesseract_config)
+                for tile in pending.values()
+            ])
+            for digest, text in zip(pending.keys(), results):
+                texts[digest] = text
+                self.put_cached(digest, text)
+
+        logger.info(f"OCR'd {len(pending)} of {len(tiles)} tiles, reused {len(tiles) - len(pending)} from cache")
+        return "\n".join(texts[digest] for digest, _ in tiles if texts[digest])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,79 @@
+"""
+Retention policy for stored screenshots. Screenshot files follow the lifecycle of the Chroma
+documents that reference them: deleting a document releases its file, and a periodic
+garbage collection removes unreferenced, expired or over-budget files.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from db.vector_store import get_vector_store
+from pipeline.ingest import screenshot_store
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+store = get_vector_store()
+
+SCREENSHOT_RETENTION_DAYS = float(os.getenv("SCREENSHOT_RETENTION_DAYS", "0"))
+SCREENSHOT_MAX_BYTES = int(os.getenv("SCREENSHOT_MAX_BYTES", "0"))
+SCREENSHOT_GC_INTERVAL_SECONDS = float(os.getenv("SCREENSHOT_GC_INTERVAL_SECONDS", "3600"))
+
+
+def get_image_hash(doc_id : str, collection_name : str = "screenshots_collection") -> Optional[str]:
+    """Return the screenshot digest referenced by a document, if any."""
+    # Chunked documents are looked up by their parent ID
+    results = store.get_documents(ids=[doc_id], include=["metadatas"], collection_name=collection_name)
+    if not results["ids"]:
+        return None
+    return (results["metadatas"][0] or {}).get("image_hash")
+
+
+def release_screenshot(digest : str, collection_name : str = "screenshots_collection") -> bool:
+    """
+    Delete a screenshot file once no document references it anymore.
+    Call after the referencing document has been deleted. Returns True if the file was removed.
+    """
+    results = store.get_documents(where={"image_hash": digest}, include=["metadatas"], collection_name=collection_name)
+    if results["ids"]:
+        return False
+    removed = screenshot_store.delete(digest)
+    if removed:
+        logger.info(f"Removed screenshot {digest} after its last document was deleted")
+    return removed
+
+
+def collect_screenshot_garbage(collection_name : str = "screenshots_collection") -> Dict[str, Any]:
+    """
+    Apply the retention policy to the screenshot store. Documents whose screenshot expired or
+    was evicted to fit the size budget keep their text, but their `filename` is cleared and
+    they are marked `screenshot_expired`, so nothing points at a deleted file.
+    """
+    results = store.get_documents(where={"source": "screenshot"}, include=["metadatas"], collection_name=collection_name)
+    referenced = {meta.get("image_hash") for meta in results["metadatas"] if meta and meta.get("image_hash")}
+    result = screenshot_store.collect_garbage(
+        referenced=referenced,
+        max_age_seconds=SCREENSHOT_RETENTION_DAYS * 24 * 60 * 60,
+        max_bytes=SCREENSHOT_MAX_BYTES
+    )
+    for digest in result["referenced_removed"]:
+        documents = store.get_documents(where={"image_hash": digest}, include=["metadatas"], collection_name=collection_name)
+        for doc_id in documents["ids"]:
+            store.merge_document_metadata(doc_id, {"filename": "", "screenshot_expired": True}, collection_name=collection_name)
+        logger.info(f"Screenshot {digest} expired, updated {len(documents['ids'])} documents referencing it")
+    return result
+
+
+async def run_screenshot_gc() -> None:
+    """Run the screenshot garbage collection forever, every SCREENSHOT_GC_INTERVAL_SECONDS."""
+    while True:
+        try:
+            await asyncio.to_thread(collect_screenshot_garbage)
+        except Exception as e:
+            logger.error(f"Screenshot GC failed: {str(e)}", exc_info=True)
+        await asyncio.sleep(SCREENSHOT_GC_INTERVAL_SECONDS)
@@ -0,0 +1,224 @@
+"""
+Content-addressed screenshot store. Screenshots are named by the SHA-256 of their uploaded
+bytes and sharded into two levels of directories (`ab/cd/abcd....png`), so identical frames
+are stored once, names never collide and no single directory grows without bound. Stored
+images can optionally be transcoded to lossless WebP or AVIF, and a retention policy keeps
+total disk use bounded.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"png": ".png", "webp": ".webp", "avif": ".avif"}
+CHUNK_SIZE = 1024 * 1024
+
+
+class ScreenshotStore:
+    """
+    Sharded, content-addressed file store for screenshots.
+
+    Args:
+        root: Directory the store lives in
+        format: Storage format, one of "png" (keep the upload as is), "webp" or "avif"
+    """
+
+    def __init__(self, root : str = "screenshots", format : str = "png"):
+        self.root = root
+        self.format = format.lower()
+        if self.format not in EXTENSIONS:
+            raise ValueError(f"Unsupported screenshot format: {format}")
+        if self.format == "avif" and not features.check("avif"):
+            logger.warning("Pillow was built without AVIF support, storing screenshots as WebP")
+            self.format = "webp"
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+
+    def shard_dir(self, digest : str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4])
+
+    def relpath(self, digest : str, ext : str = ".png") -> str:
+        return os.path.join(digest[:2], digest[2:4], digest + ext)
+
+    def path_for(self, digest : str) -> Optional[str]:
+        """Absolute path of the stored screenshot, or None if it is not in the store."""
+        for ext in EXTENSIONS.values():
+            path = os.path.join(self.root, self.relpath(digest, ext))
+            if os.path.exists(path):
+                return path
+        return None
+
+    def exists(self, digest : str) -> bool:
+        return self.path_for(digest) is not None
+
+    def new_temp_path(self) -> str:
+        """Path for an in-progress upload, to be passed to `commit` once fully written."""
+        return os.path.join(self.root, "tmp", uuid.uuid4().hex + ".part")
+
+    def commit(self, temp_path : str, digest : str) -> Tuple[str, bool]:
+        """
+        Move a fully written temp file into the store under its digest.
+
+        Returns:
+            (path of the stored file, True if it was new or False if the content was already stored)
+        """
+        with self._lock:
+            existing = self.path_for(digest)
+            if existing is not None:
+                os.remove(temp_path)
+                # Refresh the mtime so retention treats the frame as recently seen
+                os.utime(existing)
+                return existing, False
+            os.makedirs(self.shard_dir(digest), exist_ok=True)
+            path = os.path.join(self.root, self.relpath(digest))
+            os.replace(temp_path, path)
+            return path, True
+
+    def put_bytes(self, data : bytes) -> Tuple[str, str, bool]:
+        """
+        Store the given bytes.
+
+        Returns:
+            (digest, path of the stored file, True if the content was new)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        temp_path = self.new_temp_path()
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        path, created = self.commit(temp_path, digest)
+        return digest, path, created
+
+    def put_stream(self, stream : BinaryIO) -> Tuple[str, str, bool]:
+        """Store the contents of a file-like object, hashing it while it is copied."""
+        hasher = hashlib.sha256()
+        temp_path = self.new_temp_path()
+        try:
+            with open(temp_path, "wb") as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    f.write(chunk)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        digest = hasher.hexdigest()
+        path, created = self.commit(temp_path, digest)
+        return digest, path, created
+
+    def transcode(self, digest : str, image : Image.Image) -> Optional[str]:
+        """
+        Re-encode a stored screenshot in the store's format (lossless), replacing the original.
+        `image` is the already decoded screenshot in its original mode, so an alpha channel
+        is kept. Returns the new path.
+        """
+        path = self.path_for(digest)
+        ext = EXTENSIONS[self.format]
+        if path is None or path.endswith(ext):
+            return path
+        new_path = os.path.join(self.root, self.relpath(digest, ext))
+        temp_path = self.new_temp_path()
+        image.save(temp_path, format=self.format.upper(), lossless=True, quality=100)
+        with self._lock:
+            os.replace(temp_path, new_path)
+            os.remove(path)
+        return new_path
+
+    def delete(self, digest : str) -> bool:
+        """Remove a screenshot from the store. Returns True if a file was removed."""
+        with self._lock:
+            path = self.path_for(digest)
+            if path is None:
+                return False
+            os.remove(path)
+        return True
+
+    def iter_objects(self) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """Yield (digest, path, stat) for every stored screenshot."""
+        for first in os.scandir(self.root):
+            if not first.is_dir() or len(first.name) != 2:
+                continue
+            for second in os.scandir(first.path):
+                if not second.is_dir():
+                    continue
+                for entry in os.scandir(second.path):
+                    if entry.is_file() and not entry.name.endswith(".part"):
+                        yield os.path.splitext(entry.name)[0], entry.path, entry.stat()
+
+    def stats(self) -> Dict[str, int]:
+        count, total = 0, 0
+        for _, _, stat in self.iter_objects():
+            count += 1
+            total += stat.st_size
+        return {"count": count, "bytes": total}
+
+    def collect_garbage(
+        self,
+        referenced : Optional[set] = None,
+        max_age_seconds : float = 0,
+        max_bytes : int = 0,
+        orphan_grace_seconds : float = 60 * 60
+    ) -> Dict[str, Any]:
+        """
+        Apply the retention policy and return what was removed. Expiry and the size budget
+        also remove referenced screenshots; their digests are returned as
+        "referenced_removed" so the caller can update the documents pointing at them.
+
+        Args:
+            referenced: Digests still referenced by documents. Anything else older than
+                `orphan_grace_seconds` is removed (e.g. after its document was deleted).
+                Pass None to skip orphan collection.
+            max_age_seconds: Remove screenshots not seen for this long (0 disables)
+            max_bytes: Remove the least recently seen screenshots until the store fits (0 disables)
+            orphan_grace_seconds: Age below which unreferenced screenshots are kept, so
+                frames whose ingestion job is still running are not collected
+        """
+        now = time.time()
+        removed : List[Tuple[str, int]] = []
+        kept : List[Tuple[float, str, int]] = []
+
+        for digest, path, stat in self.iter_objects():
+            age = now - stat.st_mtime
+            expired = max_age_seconds and age > max_age_seconds
+            orphaned = referenced is not None and digest not in referenced and age > orphan_grace_seconds
+            if expired or orphaned:
+                removed.append((digest, stat.st_size))
+            else:
+                kept.append((stat.st_mtime, digest, stat.st_size))
+
+        if max_bytes:
+            total = sum(size for _, _, size in kept)
+            # Oldest first
+            for _, digest, size in sorted(kept):
+                if total <= max_bytes:
+                    break
+                removed.append((digest, size))
+                total -= size
+
+        for digest, _ in removed:
+            self.delete(digest)
+
+        # Abandoned uploads
+        temp_dir = os.path.join(self.root, "tmp")
+        for entry in os.scandir(temp_dir):
+            if now - entry.stat().st_mtime > orphan_grace_seconds:
+                os.remove(entry.path)
+
+        result = {
+            "removed": len(removed),
+            "bytes_freed": sum(size for _, size in removed),
+            "referenced_removed": sorted({digest for digest, _ in removed if referenced and digest in referenced})
+        }
+        if removed:
+            logger.info(f"Screenshot GC removed {result['removed']} files ({result['bytes_freed']} bytes)")
+        return result
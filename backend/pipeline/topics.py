@@ -0,0 +1,248 @@
+"""
+Local topic extraction for captured pages.
+
+Passive enrichment starts from a short topic phrase for each page. The page title is often
+already a good answer, so the topic is first looked for locally: in the title (minus the
+site name), in the last meaningful segment of the URL path or its search query, and in the
+keyphrases of the OCR text ranked by TF-IDF. Each candidate gets a confidence from how well
+the OCR text supports it and whether the title and URL agree; callers fall back to the LLM
+when the best confidence is low.
+"""
+
+import logging
+import math
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote_plus, urlparse
+
+from pydantic import BaseModel
+
+from db.filters import url_domain
+
+logger = logging.getLogger(__name__)
+
+# Returns (number of documents, {term: number of documents containing it}) for some terms
+DocumentFrequencies = Callable[[Iterable[str]], Tuple[int, Dict[str, int]]]
+
+WORD_PATTERN = re.compile(r"[^\W\d_][\w+#'.-]*[\w+#]|[^\W\d_]")
+PHRASE_BREAK_PATTERN = re.compile(r"[,;:!?()\[\]{}|\"/\\<>=*•·»«]+|\.(?:\s|$)|\s[-–—]\s")
+TITLE_SEPARATOR_PATTERN = re.compile(r"\s+[|\-–—·•:»]\s+")
+NOTIFICATION_COUNT_PATTERN = re.compile(r"^\(\d+\+?\)\s*")
+ID_PATTERN = re.compile(r"^(?=.*\d)[0-9a-f-]{8,}$|^\d+$", re.IGNORECASE)
+COMPOUND_SEPARATOR_PATTERN = re.compile(r"[.'+#-]+")
+SLUG_SEPARATOR_PATTERN = re.compile(r"[-_+\s]+")
+FILE_EXTENSION_PATTERN = re.compile(r"\.(?:html?|php|aspx?|jsp|md|pdf|png|jpe?g|webp)$", re.IGNORECASE)
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had
+has have having he her here hers him his how i if in into is it its itself just me more most my
+no nor not now of off on once only or other our ours out over own same she should so some such
+than that the their theirs them then there these they this those through to too under until up
+us very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+# Words of browser and site chrome that say nothing about the page's topic
+NOISE_WORDS = frozenset("""
+account advertisement back cart click close comments contact content cookie cookies copyright
+download edit feedback follow help home like likes link login logout menu more navigation new
+next notifications page policy post previous privacy reply rights reserved search settings share
+sign skip subscribe tab terms toggle top view views
+""".split())
+
+# Titles of pages whose title doesn't describe what is on them
+GENERIC_TITLES = frozenset([
+    "dashboard", "home", "home page", "inbox", "index", "loading", "log in", "login", "new tab",
+    "search", "settings", "sign in", "sign up", "untitled", "welcome"
+])
+
+GENERIC_PATH_SEGMENTS = frozenset([
+    "index", "default", "home", "main", "search", "results", "view", "show", "edit", "page", "wiki"
+])
+
+SEARCH_QUERY_PARAMETERS = ("q", "query", "search_query", "search", "k", "p")
+
+MAX_PHRASE_WORDS = 4
+MAX_TITLE_WORDS = 12
+SALIENT_TERMS = 20
+
+
+class LocalTopic(BaseModel):
+    """
+    Topic found without an LLM.
+
+    Attributes:
+        topic (str): The topic phrase
+        confidence (float): Confidence between 0 and 1
+        source (str): Where the topic was found: "title", "url" or "keyphrase"
+    """
+    topic : str
+    confidence : float
+    source : str
+
+
+def _words(text : str) -> List[str]:
+    return [word.strip("'.-") for word in WORD_PATTERN.findall(text)]
+
+
+def _content_terms(text : str) -> List[str]:
+    return [word.lower() for word in _words(text) if word.lower() not in STOPWORDS]
+
+
+def _compact(text : str) -> str:
+    return re.sub(r"\W+", "", text.lower())
+
+
+def title_topic(title : str, url : Optional[str] = None) -> Optional[str]:
+    """
+    The page-specific part of a title: "Mean squared error - Wikipedia" gives "Mean squared
+    error". Returns None for generic titles such as "New Tab" or "Inbox".
+    """
+    title = NOTIFICATION_COUNT_PATTERN.sub("", (title or "").strip())
+    site = _compact(url_domain(url)) if url else ""
+    segments = []
+    for segment in TITLE_SEPARATOR_PATTERN.split(title):
+        segment = segment.strip()
+        compact = _compact(segment)
+        # Drop the site name, e.g. "GitHub" on github.com or "Stack Overflow" on stackoverflow.com
+        if not compact or (site and len(segment.split()) <= 3 and compact in site):
+            continue
+        segments.append(segment)
+    for segment in segments:
+        if FILE_EXTENSION_PATTERN.search(segment) and " " not in segment:
+            segment = SLUG_SEPARATOR_PATTERN.sub(" ", FILE_EXTENSION_PATTERN.sub("", segment)).strip()
+        if segment.lower() not in GENERIC_TITLES and _content_terms(segment):
+            return segment
+    return None
+
+
+def url_topic(url : str) -> Optional[str]:
+    """
+    The search query of a search result URL, or else the last meaningful path segment as
+    words: ".../wiki/Mean_squared_error" gives "Mean squared error".
+    """
+    parsed = urlparse(url or "")
+    query = parse_qs(parsed.query)
+    for parameter in SEARCH_QUERY_PARAMETERS:
+        values = [value.strip() for value in query.get(parameter, []) if value.strip()]
+        if values and _content_terms(values[0]):
+            return values[0]
+
+    for segment in reversed(unquote_plus(parsed.path).split("/")):
+        segment = FILE_EXTENSION_PATTERN.sub("", segment.strip())
+        if not segment or ID_PATTERN.match(segment) or segment.lower() in GENERIC_PATH_SEGMENTS:
+            continue
+        words = SLUG_SEPARATOR_PATTERN.sub(" ", segment).strip()
+        if any(len(term) >= 3 for term in _content_terms(words)):
+            return words
+    return None
+
+
+def keyphrases(
+    text : str,
+    document_frequencies : Optional[DocumentFrequencies] = None,
+    limit : int = 5
+) -> Tuple[List[Tuple[str, float]], Dict[str, float]]:
+    """
+    Rank the keyphrases of a text: runs of content words between stopwords and punctuation,
+    of up to MAX_PHRASE_WORDS words, scored by the TF-IDF weights of their words.
+
+    Args:
+        text: Text to extract keyphrases from, e.g. OCR output
+        document_frequencies: Source of document frequencies for IDF; without it every term
+            has the same IDF and phrases are ranked by term frequency
+        limit: Maximum number of keyphrases returned
+
+    Returns:
+        (phrase, score) pairs, best first, and the TF-IDF weight of every term of the text.
+    """
+    phrases : Counter = Counter()
+    surface_forms : Dict[str, Counter] = {}
+    term_counts : Counter = Counter()
+    for line in (text or "").splitlines():
+        for fragment in PHRASE_BREAK_PATTERN.split(line):
+            run : List[str] = []
+            for word in _words(fragment) + [""]:
+                lowered = word.lower()
+                if word and lowered not in STOPWORDS and lowered not in NOISE_WORDS and len(word) > 1:
+                    run.append(word)
+                    term_counts[lowered] += 1
+                    continue
+                # Longer runs (e.g. OCR lines without punctuation) are cut into phrases
+                for start in range(0, len(run), MAX_PHRASE_WORDS):
+                    phrase = " ".join(run[start:start + MAX_PHRASE_WORDS])
+                    phrases[phrase.lower()] += 1
+                    surface_forms.setdefault(phrase.lower(), Counter())[phrase] += 1
+                run = []
+    if not phrases:
+        return [], {}
+
+    num_docs, frequencies = document_frequencies(term_counts.keys()) if document_frequencies else (0, {})
+    weights = {
+        term: count * (math.log((num_docs + 1) / (frequencies.get(term, 0) + 1)) + 1)
+        for term, count in term_counts.items()
+    }
+    scored = [
+        (surface_forms[key].most_common(1)[0][0], sum(weights[term] for term in key.split()) * math.sqrt(count))
+        for key, count in phrases.items()
+    ]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit], weights
+
+
+def extract_topic(
+    title : Optional[str] = None,
+    url : Optional[str] = None,
+    text : Optional[str] = None,
+    document_frequencies : Optional[DocumentFrequencies] = None
+) -> Optional[LocalTopic]:
+    """
+    Find the topic of a page without an LLM.
+
+    Args:
+        title: Page title
+        url: Page URL
+        text: OCR text of the page
+        document_frequencies: Source of document frequencies for the TF-IDF keyphrases,
+            e.g. BM25Index.document_frequencies of the screenshots collection
+
+    Returns:
+        The most confident candidate, or None if the page gave no candidate at all.
+    """
+    ranked, weights = keyphrases(text or "", document_frequencies)
+    # Compound words such as "asyncio.gather" also support their parts
+    text_terms = set(weights) | {part for term in weights for part in COMPOUND_SEPARATOR_PATTERN.split(term)}
+    salient_terms = {term for term, _ in sorted(weights.items(), key=lambda item: item[1], reverse=True)[:SALIENT_TERMS]}
+
+    def support(phrase : str) -> float:
+        """How well the OCR text supports a phrase: its terms appear in the text, and are among the salient ones."""
+        terms = set(_content_terms(phrase))
+        if not terms:
+            return 0.0
+        return 0.25 * len(terms & text_terms) / len(terms) + 0.2 * len(terms & salient_terms) / len(terms)
+
+    candidates = []
+    from_title = title_topic(title, url) if title else None
+    from_url = url_topic(url) if url else None
+    agreement = 0.0
+    if from_title and from_url:
+        title_terms, url_terms = set(_content_terms(from_title)), set(_content_terms(from_url))
+        agreement = 0.1 if title_terms & url_terms else 0.0
+
+    if from_title:
+        penalty = 0.1 if len(from_title.split()) > MAX_TITLE_WORDS else 0.0
+        candidates.append(LocalTopic(topic=from_title, confidence=0.45 + support(from_title) + agreement - penalty, source="title"))
+    if from_url:
+        candidates.append(LocalTopic(topic=from_url, confidence=0.3 + support(from_url) + agreement, source="url"))
+    if ranked:
+        phrase, score = ranked[0]
+        dominance = 1 - ranked[1][1] / score if len(ranked) > 1 and score else 1.0
+        candidates.append(LocalTopic(topic=phrase, confidence=0.3 + 0.2 * dominance, source="keyphrase"))
+
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda candidate: candidate.confidence)
+    best.confidence = round(min(best.confidence, 1.0), 3)
+    logger.debug(f"Local topic candidates: {candidates}")
+    return best
@@ -0,0 +1,39 @@
+"""
+Shared pytest setup. Every test runs against temporary directories, offline: the Chroma
+store uses the hashing embedding function of the benchmarks, and the API keys are dummies
+since no test calls a remote service.
+
+Run from backend/:
+    python -m pytest -q test
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIRECTORY = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, BACKEND_DIRECTORY)
+
+# Module-level stores and caches are created on import, so point them away from the real data first
+_workdir = tempfile.mkdtemp(prefix="pulseai_test_")
+os.environ.setdefault("CHROMA_PERSIST_DIRECTORY", os.path.join(_workdir, "chroma_db"))
+os.environ.setdefault("CACHE_DIRECTORY", os.path.join(_workdir, "cache_data"))
+os.environ.setdefault("SCREENSHOT_DIR", os.path.join(_workdir, "screenshots"))
+os.environ.setdefault("SNAPSHOT_DIRECTORY", os.path.join(_workdir, "snapshots"))
+os.environ.setdefault("MISTRAL_API_KEY", "test")
+os.environ.setdefault("PERPLEXITY_API_KEY", "test")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+# Scripts that load example data into the real database, not tests
+collect_ignore = ["setup_data.py", "test_db.py"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A VectorStore in a temporary directory with an offline embedding function."""
+    from benchmarks.stubs import HashEmbeddingFunction
+    from db.vector_store import VectorStore
+
+    return VectorStore(str(tmp_path / "chroma_db"), embedding_function=HashEmbeddingFunction())
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from pipeline.admission import AdmissionController
+from pipeline.jobs import JobManager, QueueFullError
+
+
+def upload(doc_id, image_hash=None):
+    return {"doc_id": doc_id, "image_hash": image_hash or f"hash_{doc_id}"}
+
+
+def run(scenario, coalesce_window=0.05, max_in_flight=20, handler_delay=0.0):
+    """Run `scenario(controller, processed)` against started workers that record each processed payload."""
+    async def main():
+        processed = []
+        async def handler(job):
+            await asyncio.sleep(handler_delay)
+            processed.append(dict(job.payload))
+            return {"id": job.payload["doc_id"]}
+        manager = JobManager(handler, stages=["ocr"], num_workers=1)
+        await manager.start()
+        try:
+            controller = AdmissionController(manager, coalesce_window=coalesce_window, max_in_flight=max_in_flight)
+            return await scenario(controller, processed)
+        finally:
+            await manager.stop()
+    return asyncio.run(main())
+
+
+def test_uploads_without_a_key_are_queued():
+    async def scenario(controller, processed):
+        status, job = controller.admit(upload("a"))
+        await asyncio.sleep(0.01)
+        return status, job, processed
+    status, job, processed = run(scenario)
+    assert status == "queued"
+    assert job.status == "done"
+    assert processed == [upload("a")]
+
+
+def test_coalescing_a_deferred_job_keeps_its_document_id():
+    async def scenario(controller, processed):
+        first_status, first = controller.admit(upload("doc_1"), key="https://example.com")
+        second_status, second = controller.admit(upload("doc_2"), key="https://example.com")
+        third_status, third = controller.admit(upload("doc_3"), key="https://example.com")
+        assert first.status == "deferred"
+        await asyncio.sleep(0.1)
+        return (first_status, second_status, third_status), {first.id, second.id, third.id}, first, processed, controller
+    statuses, job_ids, job, processed, controller = run(scenario)
+
+    assert statuses == ("deferred", "coalesced", "coalesced")
+    assert len(job_ids) == 1
+    # The latest screenshot is processed under the ID returned to the first upload
+    assert len(processed) == 1
+    assert processed[0]["doc_id"] == "doc_1"
+    assert processed[0]["image_hash"] == "hash_doc_3"
+    assert job.payload["superseded"] == ["hash_doc_1", "hash_doc_2"]
+    assert job.status == "done"
+    assert controller.stats()["coalesced"] == 2
+
+
+def test_uploads_of_other_urls_are_not_coalesced():
+    async def scenario(controller, processed):
+        controller.admit(upload("a"), key="https://example.com/a")
+        controller.admit(upload("b"), key="https://example.com/b")
+        await asyncio.sleep(0.1)
+        return processed
+    assert sorted(payload["doc_id"] for payload in run(scenario)) == ["a", "b"]
+
+
+def test_uploads_are_rejected_when_too_many_are_in_flight():
+    async def scenario(controller, processed):
+        controller.admit(upload("a"), key="https://example.com")
+        controller.admit(upload("b"))
+        with pytest.raises(QueueFullError):
+            controller.admit(upload("c"))
+        # Joining a held job adds no pipeline, so it is still admitted
+        status, _ = controller.admit(upload("d"), key="https://example.com")
+        return status, controller.stats()["rejected"]
+    assert run(scenario, max_in_flight=2, handler_delay=0.05) == ("coalesced", 1)
@@ -0,0 +1,55 @@
+import pytest
+
+DOCUMENTS = {
+    "python": "python asyncio event loop coroutine",
+    "rust": "rust borrow checker lifetime ownership",
+    "cooking": "pasta tomato basil garlic recipe",
+}
+
+
+@pytest.fixture
+def filled_store(store):
+    store.add_documents(
+        documents=list(DOCUMENTS.values()),
+        metadata=[{"topic": topic} for topic in DOCUMENTS],
+        ids=list(DOCUMENTS)
+    )
+    return store
+
+
+def test_batch_matches_single_queries(filled_store):
+    queries = ["asyncio coroutine", "garlic pasta", "borrow checker"]
+    batch = filled_store.query_documents_batch(queries, n_results=2)
+    filled_store.query_cache.invalidate("screenshots_collection")
+    single = [filled_store.query_documents(query, n_results=2) for query in queries]
+
+    assert [result["ids"] for result in batch] == [result["ids"] for result in single]
+    assert [result["ids"][0] for result in batch] == ["python", "cooking", "rust"]
+
+
+def test_batch_applies_per_query_filters_and_sizes(filled_store):
+    results = filled_store.query_documents_batch(
+        ["asyncio coroutine", "asyncio coroutine"],
+        n_results=[1, 3],
+        where=[None, {"topic": "cooking"}]
+    )
+    assert results[0]["ids"] == ["python"]
+    assert results[1]["ids"] == ["cooking"]
+
+
+def test_batch_embeds_all_queries_once(filled_store, monkeypatch):
+    calls = []
+    embed = filled_store.embedding_function
+    def counting(texts):
+        calls.append(list(texts))
+        return embed(texts)
+    monkeypatch.setattr(filled_store, "embedding_function", counting)
+
+    filled_store.query_documents_batch(["asyncio", "pasta", "lifetime"], n_results=1)
+    assert calls == [["asyncio", "pasta", "lifetime"]]
+
+
+def test_batch_rejects_mismatched_lengths(filled_store):
+    with pytest.raises(ValueError):
+        filled_store.query_documents_batch(["a", "b"], n_results=[1])
+    assert filled_store.query_documents_batch([]) == []
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from clients.budget import GAP_MARKER, budget_sources, budget_text, clean_text, fit_to_budget
+from db.chunking import count_tokens
+
+
+def test_clean_text_drops_noise_and_repeats():
+    text = "Home   Products\n\n| ~ © |\nHome Products\na | I ~ e © x\nReal content here"
+    assert clean_text(text) == "Home Products\nReal content here"
+
+
+def test_text_within_budget_is_unchanged():
+    assert fit_to_budget("short text", 10) == "short text"
+
+
+def test_fit_to_budget_keeps_head_and_salient_lines():
+    lines = ["Page Title: Kubernetes ingress", "URL: https://example.com/ingress"]
+    lines += [f"menu item {i} menu item" for i in range(40)]
+    lines += ["nginx ingress controller rewrite-target annotation"]
+    budgeted = fit_to_budget("\n".join(lines), 60)
+
+    assert count_tokens(budgeted) <= 60
+    kept = budgeted.splitlines()
+    assert kept[:2] == lines[:2]
+    assert lines[-1] in kept
+    assert GAP_MARKER in kept
+
+
+def test_single_long_line_is_truncated():
+    budgeted = fit_to_budget("word " * 100, 10)
+    assert count_tokens(budgeted) == 10
+
+
+def test_budget_text_keeps_short_inputs_that_look_like_noise():
+    assert budget_text("x", 10) == "x"
+    assert budget_text("  rust  ", 10) == "rust"
+
+
+def test_budget_sources_shares_the_budget():
+    short = {"title": "Rust", "topic": "borrow checker"}
+    long_one = "\n".join(f"line {i} about lifetimes and ownership" for i in range(100))
+    long_two = "\n".join(f"row {i} about traits and generics" for i in range(100))
+    budgeted = budget_sources([short, long_one, long_two], 200)
+
+    assert budgeted[0] == "title: Rust\ntopic: borrow checker"
+    assert sum(count_tokens(text) for text in budgeted) <= 200
+    assert abs(count_tokens(budgeted[1]) - count_tokens(budgeted[2])) <= 10
+
+
+def test_summary_input_is_budgeted(monkeypatch):
+    from clients import mistral
+
+    sent = []
+    def complete(model, messages, temperature):
+        sent.append(messages[-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="summary"))])
+    client = SimpleNamespace(chat=SimpleNamespace(complete=complete))
+    monkeypatch.setattr(mistral, "get_mistral_client", lambda: client)
+    monkeypatch.setattr(mistral, "SUMMARY_INPUT_MAX_TOKENS", 50)
+
+    text = "\n".join(f"line {i} of a very long page" for i in range(200))
+    assert mistral.get_summary(text) == "summary"
+    assert count_tokens(sent[0]) <= 50
@@ -0,0 +1,113 @@
+from db.chunking import chunk_document, chunk_text, count_tokens, group_chunks, merge_chunks
+
+
+def long_text(lines, prefix="line"):
+    return "\n".join(f"{prefix} {i} about python asyncio and event loops" for i in range(lines))
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("a short page", max_tokens=10, overlap_tokens=2) == ["a short page"]
+    assert chunk_text("   ") == []
+
+
+def test_chunks_respect_size_and_overlap():
+    text = long_text(60)
+    chunks = chunk_text(text, max_tokens=40, overlap_tokens=8)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 40 for chunk in chunks)
+    # Chunks end at line breaks, and each starts inside the previous one
+    assert all(chunk.endswith("loops") for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split("\n")[0] in previous
+
+
+def test_merge_chunks_restores_the_text():
+    text = long_text(60)
+    assert merge_chunks(chunk_text(text, max_tokens=40, overlap_tokens=8)) == text
+    assert merge_chunks(["no overlap", "at all"]) == "no overlap\nat all"
+
+
+def test_chunk_document_metadata():
+    chunks = chunk_document("doc", long_text(60), {"url": "https://example.com"}, max_tokens=40, overlap_tokens=8)
+    count = len(chunks["ids"])
+    assert chunks["ids"] == [f"doc::{i}" for i in range(count)]
+    assert chunks["metadatas"][0] == {
+        "url": "https://example.com", "parent_id": "doc", "chunk_index": 0, "chunk_count": count, "continuation": False
+    }
+    assert all(meta["continuation"] for meta in chunks["metadatas"][1:])
+
+
+def test_group_chunks_ranks_parents_by_best_chunk():
+    result = {
+        "ids": ["a::2", "b", "a::0", "c::1"],
+        "documents": ["a2", "b", "a0", "c1"],
+        "metadatas": [
+            {"parent_id": "a", "chunk_index": 2, "title": "A"},
+            {"title": "B"},
+            {"parent_id": "a", "chunk_index": 0, "title": "A"},
+            {"parent_id": "c", "chunk_index": 1, "title": "C"},
+        ],
+        "distances": [0.1, 0.2, 0.3, 0.4],
+    }
+    grouped = group_chunks(result, n_results=2)
+    assert grouped["ids"] == ["a", "b"]
+    assert grouped["documents"][0] == "a0\n...\na2"
+    assert grouped["metadatas"] == [{"title": "A", "matched_chunks": "0,2"}, {"title": "B"}]
+    assert grouped["distances"] == [0.1, 0.2]
+
+
+def add_long_document(store, id="doc", lines=80, prefix="line"):
+    text = long_text(lines, prefix)
+    count = store.add_chunked_document(id=id, content=text, metadata={"source": "screenshot", "title": "Page"})
+    return text, count
+
+
+def test_chunked_document_is_read_back_whole(store):
+    text, count = add_long_document(store)
+    assert count > 1
+    store.add_documents(documents=["unchunked page"], metadata=[{"source": "screenshot"}], ids=["plain"])
+
+    documents = store.get_documents(ids=["doc", "plain"])
+    assert sorted(documents["ids"]) == ["doc", "plain"]
+    by_id = dict(zip(documents["ids"], zip(documents["documents"], documents["metadatas"])))
+    assert by_id["doc"] == (text, {"source": "screenshot", "title": "Page"})
+    assert sorted(store.list_documents()["ids"]) == ["doc", "plain"]
+    assert len(store.list_documents(group_chunks=False)["ids"]) == count + 1
+
+
+def test_query_returns_parent_once(store):
+    add_long_document(store)
+    result = store.query_documents("python asyncio event loops", n_results=5)
+    assert result["ids"] == ["doc"]
+    assert "matched_chunks" in result["metadatas"][0]
+
+
+def test_update_rechunks_and_removes_stale_chunks(store):
+    _, count = add_long_document(store)
+    store.merge_document_metadata("doc", {"topic": "asyncio"})
+
+    shorter = long_text(30, prefix="row")
+    store.update_document("doc", shorter, {"title": "New title"})
+
+    chunks = store.get_documents(where={"parent_id": "doc"}, group_chunks=False)
+    new_count = len(chunks["ids"])
+    assert 1 < new_count < count
+    assert sorted(chunks["ids"]) == sorted(f"doc::{i}" for i in range(new_count))
+    assert all(meta["chunk_count"] == new_count for meta in chunks["metadatas"])
+
+    document = store.get_documents(ids=["doc"])
+    assert document["documents"] == [shorter]
+    assert document["metadatas"] == [{"source": "screenshot", "title": "New title", "topic": "asyncio"}]
+    assert store.lexical_index().count() == new_count
+    assert store.lexical_index().search("line") == []
+
+
+def test_delete_removes_every_chunk(store):
+    add_long_document(store)
+    add_long_document(store, id="other")
+    store.delete_document("doc")
+
+    assert store.get_documents(where={"parent_id": "doc"}, group_chunks=False)["ids"] == []
+    assert store.list_documents()["ids"] == ["other"]
+    assert all(not id.startswith("doc::") for id, _ in store.lexical_index().search("python", limit=100))
+
@@ -0,0 +1,108 @@
+from pipeline.compaction import Compactor
+
+RUST = "Here is information about Rust. Ownership and borrowing rules of the rust compiler"
+PASTA = "Here is information about pasta. Boiling tomato basil garlic olive oil recipe"
+
+
+def enrichment(store, id, document, topic, created_at, **metadata):
+    store.add_documents(
+        documents=[document],
+        metadata=[{"source": "enrichment", "topic": topic, "created_at": created_at, **metadata}],
+        ids=[id]
+    )
+
+
+def compactor(store, tmp_path, **kwargs):
+    return Compactor(store, state_path=str(tmp_path / "compaction.json"), **kwargs)
+
+
+def ids(store):
+    return sorted(store.list_documents(include=[])["ids"])
+
+
+def test_newest_duplicate_survives_with_merged_metadata(store, tmp_path):
+    enrichment(store, "old", RUST, "Rust", 1.0)
+    enrichment(store, "middle", RUST, "Rust ownership", 2.0, merged_topics="Borrow checker", merged_count=2)
+    enrichment(store, "new", RUST, "Rust", 3.0)
+    enrichment(store, "other", PASTA, "Pasta", 1.5)
+
+    report = compactor(store, tmp_path).run_once()
+    assert report["removed"] == 2
+    assert report["clusters"] == 1
+    assert report["reclaimed_bytes"] > 2 * len(RUST)
+    assert ids(store) == ["new", "other"]
+
+    survivor = store.get_documents(ids=["new"])["metadatas"][0]
+    assert survivor["topic"] == "Rust"
+    assert survivor["merged_topics"] == "Rust ownership; Borrow checker"
+    # "middle" had already absorbed 2 documents
+    assert survivor["merged_count"] == 4
+
+
+def test_documents_below_the_threshold_are_kept(store, tmp_path):
+    enrichment(store, "rust", RUST, "Rust", 1.0)
+    enrichment(store, "rust_variant", RUST + " lifetimes traits generics", "Rust traits", 2.0)
+    enrichment(store, "pasta", PASTA, "Pasta", 3.0)
+
+    report = compactor(store, tmp_path, similarity=0.97).run_once()
+    assert report["removed"] == 0
+    assert ids(store) == ["pasta", "rust", "rust_variant"]
+
+
+def test_screenshot_documents_are_never_removed(store, tmp_path):
+    store.add_documents(documents=[RUST], metadata=[{"source": "screenshot", "created_at": 5.0}], ids=["screenshot"])
+    enrichment(store, "topic", RUST, "Rust", 1.0)
+
+    assert compactor(store, tmp_path).run_once()["removed"] == 0
+    assert ids(store) == ["screenshot", "topic"]
+
+
+def test_batches_resume_from_the_checkpoint(store, tmp_path):
+    for i in range(5):
+        enrichment(store, f"doc_{i}", f"{PASTA} variant{i} extra{i} words{i}", f"Topic {i}", float(i))
+
+    first = compactor(store, tmp_path, batch_size=2)
+    assert first.run_once()["scanned"] == 2
+    report = first.run_once()
+    assert (report["scanned"], report["pending"]) == (2, True)
+    assert first.stats()["checkpoint"] == 3.0
+
+    # A new compactor picks up after the saved checkpoint
+    resumed = compactor(store, tmp_path, batch_size=2)
+    report = resumed.run_once()
+    assert (report["scanned"], report["pending"]) == (1, False)
+    assert resumed.run_once()["scanned"] == 0
+
+    enrichment(store, "late", RUST, "Rust", 10.0)
+    assert resumed.run_once()["scanned"] == 1
+
+
+def test_documents_with_the_same_created_at_are_not_skipped(store, tmp_path):
+    for i in range(3):
+        enrichment(store, f"doc_{i}", f"{PASTA} variant{i} extra{i} words{i}", f"Topic {i}", 1.0)
+
+    compaction = compactor(store, tmp_path, batch_size=2)
+    assert compaction.run_once()["scanned"] == 2
+    assert compaction.run_once()["scanned"] == 1
+    assert compaction.run_once()["scanned"] == 0
+
+
+def test_legacy_enrichment_documents_are_scanned_after_backfill(store, tmp_path):
+    store.add_documents(documents=[RUST, RUST], metadata=[{"topic": "Rust"}, {"topic": "Rust"}], ids=["legacy_1", "legacy_2"])
+    enrichment(store, "new", RUST, "Rust", 3.0)
+    compaction = compactor(store, tmp_path)
+
+    store.backfill_metadata()
+    assert store.get_documents(ids=["legacy_1"])["metadatas"][0] == {"topic": "Rust", "source": "enrichment", "created_at": 0.0}
+    report = compaction.run_once()
+    assert report["scanned"] == 3
+    assert report["removed"] == 2
+    assert ids(store) == ["new"]
+
+
+def test_lower_threshold_merges_variants(store, tmp_path):
+    enrichment(store, "rust", RUST, "Rust", 1.0)
+    enrichment(store, "rust_variant", RUST + " lifetimes", "Rust lifetimes", 2.0)
+
+    assert compactor(store, tmp_path, similarity=0.5).run_once()["removed"] == 1
+    assert ids(store) == ["rust_variant"]
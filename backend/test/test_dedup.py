@@ -0,0 +1,120 @@
+import io
+import json
+import random
+import string
+
+from PIL import Image, ImageDraw, ImageOps
+
+from pipeline.dedup import PerceptualHashIndex, dhash, dhash_image, hamming_distance
+from pipeline.image import ScreenshotImage
+
+
+def page_png(lines):
+    """A white page with a dark bar of the given width per line of text."""
+    image = Image.new("RGB", (400, 300), "white")
+    draw = ImageDraw.Draw(image)
+    for i, width in enumerate(lines):
+        top = 20 + i * 30
+        draw.rectangle((20, top, 20 + width, top + 12), fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def text_page_png(seed):
+    """A page with a fixed layout: a heading and paragraphs of random text in the same places."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (800, 600), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 800, 60), fill=(40, 60, 120))
+    for line in range(20):
+        words = " ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(10))
+        draw.text((30, 90 + line * 24), words, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+TILES = ["0" * 16] * 32
+
+
+def test_dhash_is_stable_across_encodings():
+    png = page_png([300, 200, 250])
+    image = Image.open(io.BytesIO(png))
+    jpeg = io.BytesIO()
+    image.save(jpeg, format="JPEG", quality=70)
+    assert hamming_distance(dhash(png), dhash(jpeg.getvalue())) <= 2
+
+
+def test_dhash_separates_different_pages():
+    png = page_png([300, 200, 250, 100])
+    inverted = io.BytesIO()
+    ImageOps.invert(Image.open(io.BytesIO(png))).save(inverted, format="PNG")
+    assert hamming_distance(dhash(png), dhash(inverted.getvalue())) > 6
+
+
+def test_find_duplicate_returns_closest_frame_of_same_url():
+    index = PerceptualHashIndex(max_distance=6)
+    index.add("https://example.com/a", 0b1111, "doc_far", TILES)
+    index.add("https://example.com/a", 0b0001, "doc_near", TILES)
+    assert index.find_duplicate("https://example.com/a", 0b0000, TILES) == ("doc_near", 1)
+    assert index.find_duplicate("https://example.com/b", 0b0000, TILES) is None
+
+
+def test_find_duplicate_ignores_frames_beyond_max_distance():
+    index = PerceptualHashIndex(max_distance=2)
+    index.add("https://example.com", 0b111, "doc", TILES)
+    assert index.find_duplicate("https://example.com", 0b000, TILES) is None
+
+
+def test_find_duplicate_needs_matching_tiles():
+    index = PerceptualHashIndex(max_changed_tiles=1)
+    index.add("https://example.com", 0, "doc", TILES)
+    one_changed = ["1" * 16] + TILES[1:]
+    two_changed = ["1" * 16] * 2 + TILES[2:]
+    assert index.find_duplicate("https://example.com", 0, one_changed) == ("doc", 0)
+    assert index.find_duplicate("https://example.com", 0, two_changed) is None
+
+
+def test_same_layout_with_different_text_is_not_a_duplicate():
+    first, second = ScreenshotImage(text_page_png(1)), ScreenshotImage(text_page_png(2))
+    # A 64-bit thumbnail hash can't tell the pages apart
+    assert hamming_distance(dhash_image(first.original, 8), dhash_image(second.original, 8)) <= 6
+
+    for index in [PerceptualHashIndex(), PerceptualHashIndex(max_distance=256)]:
+        index.add("https://example.com", first.dhash(), "doc", first.tile_digests())
+        assert index.find_duplicate("https://example.com", second.dhash(), second.tile_digests()) is None
+        again = ScreenshotImage(text_page_png(1))
+        assert index.find_duplicate("https://example.com", again.dhash(), again.tile_digests()) == ("doc", 0)
+
+
+def test_expired_frames_are_not_matched():
+    index = PerceptualHashIndex(max_age_seconds=-1)
+    index.add("https://example.com", 42, "doc", TILES)
+    assert index.find_duplicate("https://example.com", 42, TILES) is None
+
+
+def test_remove_forgets_document_and_index_persists(tmp_path):
+    path = str(tmp_path / "phash.json")
+    index = PerceptualHashIndex(path)
+    index.add("https://example.com/a", 1, "doc_a", TILES)
+    index.add("https://example.com/b", 2, "doc_b", TILES)
+    index.remove("doc_a")
+
+    reloaded = PerceptualHashIndex(path)
+    assert reloaded.find_duplicate("https://example.com/a", 1, TILES) is None
+    assert reloaded.find_duplicate("https://example.com/b", 2, TILES) == ("doc_b", 0)
+
+
+def test_frames_indexed_without_tiles_never_match(tmp_path):
+    path = tmp_path / "phash.json"
+    path.write_text(json.dumps({"https://example.com": [[1, "doc", 9e12]]}))
+    assert PerceptualHashIndex(str(path)).find_duplicate("https://example.com", 1, TILES) is None
+
+
+def test_only_recent_frames_per_url_are_kept():
+    index = PerceptualHashIndex(max_frames_per_url=2, max_distance=0)
+    for i in range(3):
+        index.add("https://example.com", i, f"doc_{i}", TILES)
+    assert index.find_duplicate("https://example.com", 0, TILES) is None
+    assert index.find_duplicate("https://example.com", 2, TILES) == ("doc_2", 0)
@@ -0,0 +1,67 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from cache.disk_cache import DiskCache
+from clients import mistral
+from pipeline.image import ScreenshotImage
+from pipeline.ingest import vision_input
+
+
+@pytest.fixture
+def requests(tmp_path, monkeypatch):
+    """Use an empty description cache and a Pixtral client that records every request."""
+    requests = []
+
+    def response(messages):
+        requests.append(messages[0]["content"][1]["image_url"]["url"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"Description {len(requests)}"))])
+
+    async def complete_async(model, messages):
+        return response(messages)
+
+    client = SimpleNamespace(chat=SimpleNamespace(complete=lambda model, messages: response(messages), complete_async=complete_async))
+    monkeypatch.setattr(mistral, "get_mistral_client", lambda: client)
+    monkeypatch.setattr(mistral, "description_cache", DiskCache("image_descriptions", path=str(tmp_path / "descriptions.sqlite3")))
+    return requests
+
+
+def save_png(path, color):
+    Image.new("RGB", (64, 48), color).save(path, format="PNG")
+    return path
+
+
+def describe(path):
+    with open(path, "rb") as f:
+        base64_image, mime_type = vision_input(ScreenshotImage(f.read()))
+    return asyncio.run(mistral.get_image_description_async(base64_image, mime_type=mime_type))
+
+
+def test_same_image_content_is_described_once(requests, tmp_path):
+    first = describe(save_png(tmp_path / "screenshot_20240102_030405.png", "white"))
+    # The same pixels saved under another name hit the cache
+    second = describe(save_png(tmp_path / "screenshot_20240102_030406.png", "white"))
+
+    assert first == second == "Description 1"
+    assert len(requests) == 1
+    stats = mistral.description_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_different_content_is_described_again(requests, tmp_path):
+    assert describe(save_png(tmp_path / "screenshot.png", "white")) == "Description 1"
+    assert describe(save_png(tmp_path / "screenshot.png", "black")) == "Description 2"
+    assert len(requests) == 2
+
+
+def test_sync_and_async_calls_share_the_cache(requests, tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "white").save(buffer, format="PNG")
+    base64_image, mime_type = vision_input(ScreenshotImage(buffer.getvalue()))
+
+    assert mistral.get_image_description(base64_image, mime_type=mime_type) == "Description 1"
+    assert asyncio.run(mistral.get_image_description_async(base64_image, mime_type=mime_type)) == "Description 1"
+    assert len(requests) == 1
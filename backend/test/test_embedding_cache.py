@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+from benchmarks.stubs import HashEmbeddingFunction
+from cache.disk_cache import DiskCache
+from db.embedding_cache import CachedEmbeddingFunction, embedding_model_id
+
+
+class CountingEmbeddingFunction:
+    """Embeds every text as its length, and records the batches it is called with."""
+
+    def __init__(self, model_name):
+        self._model_name = model_name
+        self.batches = []
+
+    def __call__(self, input):
+        self.batches.append(list(input))
+        return [np.full(4, len(text), dtype=np.float32) for text in input]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache("embeddings", path=str(tmp_path / "embeddings.sqlite3"))
+
+
+def test_model_id_names_the_model():
+    assert embedding_model_id(DefaultEmbeddingFunction()) == "ONNXMiniLM_L6_V2:all-MiniLM-L6-v2"
+    assert embedding_model_id(CountingEmbeddingFunction("text-embedding-3-small")) == "CountingEmbeddingFunction:text-embedding-3-small"
+    assert embedding_model_id(HashEmbeddingFunction(64)) == "hashed-bag-of-words:64"
+
+
+def test_embedding_function_without_a_model_needs_an_explicit_id(cache):
+    inner = CountingEmbeddingFunction(None)
+    with pytest.raises(ValueError):
+        CachedEmbeddingFunction(inner, cache)
+    assert CachedEmbeddingFunction(inner, cache, model_id="custom:v1").model_id == "custom:v1"
+
+
+def test_texts_are_embedded_once(cache):
+    inner = CountingEmbeddingFunction("m")
+    embed = CachedEmbeddingFunction(inner, cache)
+    first = embed(["a", "bb", "a"])
+    second = embed(["bb", "ccc"])
+
+    assert inner.batches == [["a", "bb"], ["ccc"]]
+    assert [vector[0] for vector in first] == [1, 2, 1]
+    assert [vector[0] for vector in second] == [2, 3]
+
+
+def test_models_do_not_share_vectors(cache):
+    CachedEmbeddingFunction(CountingEmbeddingFunction("small"), cache)(["text"])
+    other = CountingEmbeddingFunction("large")
+    CachedEmbeddingFunction(other, cache)(["text"])
+    assert other.batches == [["text"]]
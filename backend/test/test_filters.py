@@ -0,0 +1,59 @@
+import pytest
+
+from db.filters import build_where, parse_timestamp, url_domain
+
+
+def test_no_filters_give_none():
+    assert build_where() is None
+    assert build_where(where={}) is None
+
+
+def test_single_filter_is_not_wrapped():
+    assert build_where(source="screenshot") == {"source": "screenshot"}
+    assert build_where(where={"topic": "rust"}) == {"topic": "rust"}
+
+
+def test_filters_are_combined_with_and():
+    assert build_where(where={"topic": "rust"}, source="enrichment", since=10.0, until=20.0) == {"$and": [
+        {"topic": "rust"},
+        {"source": "enrichment"},
+        {"created_at": {"$gte": 10.0}},
+        {"created_at": {"$lt": 20.0}},
+    ]}
+
+
+def test_domain_is_normalized():
+    assert build_where(domain="www.GitHub.com") == {"domain": "github.com"}
+    assert build_where(domain="https://docs.python.org/3/") == {"domain": "docs.python.org"}
+    assert url_domain("not a url") == ""
+
+
+def test_unknown_source_is_rejected():
+    with pytest.raises(ValueError):
+        build_where(source="email")
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("20240102_030406") - parse_timestamp("20240102_030405") == 1
+    assert parse_timestamp("yesterday") is None
+    assert parse_timestamp(None) is None
+
+
+def test_filters_are_pushed_down_to_the_store(store):
+    store.add_documents(
+        documents=["rust borrow checker"] * 3,
+        metadata=[
+            {"source": "screenshot", "created_at": 100.0, "domain": "doc.rust-lang.org", "url": "https://doc.rust-lang.org/book"},
+            {"source": "screenshot", "created_at": 200.0, "domain": "github.com", "url": "https://github.com/rust-lang"},
+            {"source": "enrichment", "created_at": 300.0, "topic": "rust"},
+        ],
+        ids=["book", "github", "topic"]
+    )
+    def ids(**filters):
+        return sorted(store.query_documents("rust", n_results=5, where=build_where(**filters))["ids"])
+
+    assert ids(source="screenshot") == ["book", "github"]
+    assert ids(since=150.0) == ["github", "topic"]
+    assert ids(since=150.0, until=250.0) == ["github"]
+    assert ids(domain="github.com") == ["github"]
+    assert ids(url="https://doc.rust-lang.org/book") == ["book"]
@@ -0,0 +1,57 @@
+import base64
+import io
+
+from PIL import Image, ImageDraw
+
+from pipeline.dedup import dhash
+from pipeline.image import ScreenshotImage
+
+
+def screenshot_png(margin=0, mode="RGB"):
+    """A 400x300 page with some dark content, inside `margin` pixels of white."""
+    image = Image.new(mode, (400, 300), "white")
+    ImageDraw.Draw(image).rectangle((margin, margin, 399 - margin, 299 - margin), outline="black", width=3)
+    ImageDraw.Draw(image).rectangle((margin + 20, margin + 20, margin + 120, margin + 40), fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_dhash_matches_hash_of_encoded_bytes():
+    png = screenshot_png()
+    assert ScreenshotImage(png).dhash() == dhash(png)
+
+
+def test_crop_to_content_removes_uniform_margins():
+    screenshot = ScreenshotImage(screenshot_png(margin=50), crop_to_content=True)
+    assert screenshot.size == (300, 200)
+    # Dedup still sees the full frame
+    assert screenshot.original.size == (400, 300)
+
+
+def test_blank_image_is_not_cropped():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 32), "white").save(buffer, format="PNG")
+    screenshot = ScreenshotImage(buffer.getvalue(), crop_to_content=True)
+    assert screenshot.content_box() is None
+    assert screenshot.size == (64, 32)
+
+
+def test_ocr_variant_is_grayscale_and_binarized_on_request():
+    screenshot = ScreenshotImage(screenshot_png())
+    assert screenshot.ocr_variant().mode == "L"
+    assert {value for _, value in screenshot.ocr_variant(binarize=True).getcolors()} <= {0, 255}
+
+
+def test_vision_variant_is_downscaled():
+    data, mime_type = ScreenshotImage(screenshot_png()).vision_variant_base64(max_size=(200, 200), format="WEBP")
+    image = Image.open(io.BytesIO(base64.b64decode(data)))
+    assert mime_type == "image/webp"
+    assert image.format == "WEBP"
+    assert max(image.size) == 200
+
+
+def test_alpha_is_kept_on_decoded_image():
+    screenshot = ScreenshotImage(screenshot_png(mode="RGBA"))
+    assert screenshot.decoded.mode == "RGBA"
+    assert screenshot.image.mode == "RGB"
@@ -0,0 +1,174 @@
+import asyncio
+import io
+import time
+
+import pytest
+from PIL import Image
+
+import utils
+from benchmarks.stubs import HashEmbeddingFunction
+from clients import mistral, perplexity
+from db.vector_store import VectorStore
+from pipeline import ingest
+from pipeline.dedup import PerceptualHashIndex
+from pipeline.jobs import Job, JobManager, StageProgress
+from pipeline.storage import ScreenshotStore
+
+RELATED_TOPICS = [
+    ("Rust ownership", "Every value has a single owner."),
+    ("Borrow checker", "References must not outlive their referent."),
+    ("Lifetimes", "Lifetimes name the scope a reference is valid for."),
+    ("Smart pointers", "Box, Rc and RefCell manage heap data."),
+]
+
+
+@pytest.fixture
+def calls(tmp_path, monkeypatch):
+    """
+    Point the pipeline at temporary stores and replace OCR and every remote call with stubs.
+    Returns the list of remote calls made, in order.
+    """
+    calls = []
+
+    async def run_ocr(job, screenshot):
+        with job.stage("ocr"):
+            return "Ownership and borrowing in Rust"
+
+    async def get_image_description_async(base64_image, mime_type="image/png"):
+        calls.append("mistral.get_image_description")
+        return "A page of the Rust book"
+
+    async def get_topic_async(text):
+        calls.append("mistral.get_topic")
+        return mistral.TopicResponse(topic="Rust ownership")
+
+    async def get_related_topics_async(topic):
+        calls.append("perplexity.get_related_topics")
+        return perplexity.Response(thoughts="", answer="Topics related to Rust ownership")
+
+    async def get_topics_async(text):
+        calls.append("mistral.get_topics")
+        return mistral.TopicsResponse(topics=[mistral.Topic(name=name, topic_information=info) for name, info in RELATED_TOPICS])
+
+    async def get_topic_with_related_topics_async(text):
+        calls.append("perplexity.get_topic_with_related_topics")
+        return perplexity.TopicWithRelatedTopics(
+            topic="Rust ownership",
+            topics=[perplexity.RelatedTopic(name=name, topic_information=info) for name, info in RELATED_TOPICS]
+        )
+
+    monkeypatch.setattr(ingest, "run_ocr", run_ocr)
+    monkeypatch.setattr(mistral, "get_image_description_async", get_image_description_async)
+    monkeypatch.setattr(mistral, "get_topic_async", get_topic_async)
+    monkeypatch.setattr(mistral, "get_topics_async", get_topics_async)
+    monkeypatch.setattr(perplexity, "get_related_topics_async", get_related_topics_async)
+    monkeypatch.setattr(perplexity, "get_topic_with_related_topics_async", get_topic_with_related_topics_async)
+    monkeypatch.setattr(utils, "LOCAL_TOPIC_ENABLED", False)
+    monkeypatch.setattr(ingest, "screenshot_store", ScreenshotStore(root=str(tmp_path / "screenshots")))
+    monkeypatch.setattr(ingest, "phash_index", PerceptualHashIndex())
+    return calls
+
+
+def use_store(monkeypatch, path):
+    store = VectorStore(str(path), embedding_function=HashEmbeddingFunction())
+    monkeypatch.setattr(ingest, "store", store)
+    monkeypatch.setattr(utils, "store", store)
+    return store
+
+
+def screenshot_payload(doc_id="screenshot_1"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "white").save(buffer, format="PNG")
+    digest, _, _ = ingest.screenshot_store.put_bytes(buffer.getvalue())
+    return {
+        "image_hash": digest,
+        "doc_id": doc_id,
+        "timestamp": "20240102_030405",
+        "created_at": 1704164645.0,
+        "page_url": "https://doc.rust-lang.org/book/ch04-01-what-is-ownership.html",
+        "page_title": "What is Ownership? - The Rust Programming Language"
+    }
+
+
+def screenshot_job(doc_id="screenshot_1"):
+    return Job(
+        id=doc_id,
+        created_at=time.time(),
+        payload=screenshot_payload(doc_id),
+        stages=[StageProgress(name=name) for name in ingest.STAGES]
+    )
+
+
+def enrichment_documents(store):
+    page = store.list_documents(include=["documents", "metadatas"], where={"source": "enrichment"})
+    rows = []
+    for document, metadata in zip(page["documents"], page["metadatas"]):
+        metadata = dict(metadata)
+        assert metadata.pop("created_at") > 0
+        rows.append((document, metadata))
+    return sorted(rows, key=lambda row: row[1]["topic"])
+
+
+def test_fused_enrichment_matches_chain_with_half_the_remote_calls(calls, tmp_path, monkeypatch):
+    results = {}
+    for mode in ["chain", "fused"]:
+        monkeypatch.setattr(utils, "ENRICHMENT_MODE", mode)
+        store = use_store(monkeypatch, tmp_path / mode)
+        calls.clear()
+        asyncio.run(ingest.process_screenshot(screenshot_job()))
+        results[mode] = (list(calls), enrichment_documents(store))
+
+    chain_calls, chain_documents = results["chain"]
+    fused_calls, fused_documents = results["fused"]
+    assert sorted(chain_calls) == [
+        "mistral.get_image_description", "mistral.get_topic", "mistral.get_topics", "perplexity.get_related_topics"
+    ]
+    assert sorted(fused_calls) == ["mistral.get_image_description", "perplexity.get_topic_with_related_topics"]
+
+    assert fused_documents == chain_documents
+    assert [metadata["topic"] for _, metadata in chain_documents] == sorted(name for name, _ in RELATED_TOPICS)
+    page_topic = next(metadata for _, metadata in chain_documents if metadata["topic"] == "Rust ownership")
+    assert page_topic == {"topic": "Rust ownership", "source": "enrichment", "screenshot_id": "screenshot_1"}
+
+
+def test_failed_ocr_cancels_the_description_and_fails_the_job(calls, tmp_path, monkeypatch):
+    store = use_store(monkeypatch, tmp_path / "chroma_db")
+    cancelled = []
+
+    async def run_ocr(job, screenshot):
+        with job.stage("ocr"):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("tesseract crashed")
+
+    async def get_image_description_async(base64_image, mime_type="image/png"):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    monkeypatch.setattr(ingest, "run_ocr", run_ocr)
+    monkeypatch.setattr(mistral, "get_image_description_async", get_image_description_async)
+
+    async def main():
+        manager = JobManager(ingest.process_screenshot, stages=ingest.STAGES, num_workers=1)
+        await manager.start()
+        try:
+            job = manager.submit(screenshot_payload())
+            started = time.monotonic()
+            while job.status in ("queued", "running"):
+                await asyncio.sleep(0.01)
+            return job, time.monotonic() - started
+        finally:
+            await manager.stop()
+    job, elapsed = asyncio.run(main())
+
+    assert elapsed < 5
+    assert cancelled == [True]
+    assert job.status == "error"
+    assert job.error == "tesseract crashed"
+    statuses = {stage.name: stage.status for stage in job.stages}
+    assert statuses == {
+        "decode": "done", "dedup": "done", "ocr": "error", "describe": "cancelled", "store": "pending", "enrich": "pending"
+    }
+    assert store.list_documents(include=[])["ids"] == []
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from pipeline.jobs import JobManager, QueueFullError
+
+
+def test_submit_needs_running_workers():
+    async def handler(job):
+        return {}
+    manager = JobManager(handler, stages=["ocr"])
+    with pytest.raises(QueueFullError):
+        manager.submit({"doc_id": "a"})
+    assert manager.list() == []
+
+
+def test_full_queue_rejects_jobs():
+    async def main():
+        release = asyncio.Event()
+        async def handler(job):
+            await release.wait()
+        manager = JobManager(handler, stages=["ocr"], num_workers=1, max_queue_size=1)
+        await manager.start()
+        try:
+            running = manager.submit({"doc_id": "running"})
+            await asyncio.sleep(0.01)
+            queued = manager.submit({"doc_id": "queued"})
+            with pytest.raises(QueueFullError):
+                manager.submit({"doc_id": "rejected"})
+            stats = manager.stats()
+            release.set()
+            await asyncio.sleep(0.01)
+            return running, queued, stats, manager.list()
+        finally:
+            await manager.stop()
+    running, queued, stats, jobs = asyncio.run(main())
+
+    assert (stats["queued"], stats["in_flight"]) == (1, 2)
+    assert stats["jobs"] == {"running": 1, "queued": 1}
+    # The rejected job is not kept in the history
+    assert [job.payload["doc_id"] for job in jobs] == ["queued", "running"]
+    assert running.status == queued.status == "done"
+
+
+def test_stage_progress_and_failures_are_recorded():
+    async def handler(job):
+        with job.stage("ocr"):
+            pass
+        job.skip_stage("describe")
+        with job.stage("store"):
+            raise RuntimeError("store is down")
+
+    async def main():
+        manager = JobManager(handler, stages=["ocr", "describe", "store", "enrich"], num_workers=1)
+        await manager.start()
+        try:
+            job = manager.submit({"doc_id": "a"})
+            await asyncio.sleep(0.01)
+            return job
+        finally:
+            await manager.stop()
+    job = asyncio.run(main())
+
+    assert job.status == "error"
+    assert job.error == "store is down"
+    assert job.finished_at is not None
+    statuses = {stage.name: stage.status for stage in job.stages}
+    assert statuses == {"ocr": "done", "describe": "skipped", "store": "error", "enrich": "pending"}
+    ocr, store = job.get_stage("ocr"), job.get_stage("store")
+    assert ocr.started_at <= ocr.finished_at
+    assert store.error == "store is down"
+
+
+def test_history_trims_finished_jobs_only():
+    async def handler(job):
+        return {}
+    manager = JobManager(handler, stages=["ocr"], max_history=3)
+    deferred = manager.create({"doc_id": "deferred"}, status="deferred")
+    done = manager.create({"doc_id": "done"}, status="done")
+    failed = manager.create({"doc_id": "failed"}, status="error")
+    manager.create({"doc_id": "new_1"}, status="deferred")
+    assert manager.get(done.id) is None
+    assert manager.get(failed.id) is not None
+
+    manager.create({"doc_id": "new_2"}, status="deferred")
+    assert manager.get(failed.id) is None
+    # Jobs still in flight are kept even past the limit
+    manager.create({"doc_id": "new_3"}, status="deferred")
+    assert manager.get(deferred.id) is not None
+    assert [job.payload["doc_id"] for job in manager.list()] == ["new_3", "new_2", "new_1", "deferred"]
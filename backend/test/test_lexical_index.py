@@ -0,0 +1,72 @@
+import pytest
+
+from db.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path / "lexical" / "index.sqlite3"))
+    index.add(
+        ["numpy", "asyncio", "cooking"],
+        [
+            "ImportError: numpy==1.26.4 is required",
+            "asyncio.gather raised CancelledError in the event loop",
+            "pasta with tomato and basil",
+        ]
+    )
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("numpy==1.26.4 foo.bar_baz") == ["numpy==1.26.4", "numpy", "1", "26", "4", "foo.bar_baz", "foo", "bar", "baz"]
+
+
+def test_search_matches_identifiers_and_parts(index):
+    assert index.search("numpy==1.26.4")[0][0] == "numpy"
+    assert index.search("numpy")[0][0] == "numpy"
+    assert [id for id, _ in index.search("asyncio.gather CancelledError")] == ["asyncio"]
+    assert index.search("kubernetes") == []
+
+
+def test_rare_terms_score_higher(index):
+    index.add(["loop"], ["the event loop of the event loop"])
+    scores = dict(index.search("event cancellederror"))
+    assert scores["asyncio"] > scores["loop"]
+
+
+def test_updates_and_removals(index):
+    index.add(["cooking"], ["numpy arrays"])
+    assert index.count() == 3
+    assert index.search("pasta") == []
+    index.remove(["numpy", "unknown"])
+    assert index.count() == 2
+    assert [id for id, _ in index.search("numpy")] == ["cooking"]
+
+
+def test_index_persists(index):
+    reopened = BM25Index(index.path)
+    assert reopened.count() == 3
+    assert reopened.search("basil")[0][0] == "cooking"
+    assert reopened.document_frequencies(["event", "pasta", "missing"]) == (3, {"event": 1, "pasta": 1})
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=1)
+    assert [id for id, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 2 + 1 / 3)
+
+
+def test_hybrid_query_finds_exact_identifiers(store):
+    store.add_documents(
+        documents=["error ERR_CONNECTION_REFUSED while loading", "connection refused by the server while loading"],
+        metadata=[{"source": "screenshot"}, {"source": "enrichment"}],
+        ids=["exact", "paraphrase"]
+    )
+    result = store.query_documents("ERR_CONNECTION_REFUSED", n_results=2, mode="hybrid")
+    assert result["ids"][0] == "exact"
+
+    filtered = store.query_documents("ERR_CONNECTION_REFUSED", n_results=2, mode="hybrid", where={"source": "enrichment"})
+    assert filtered["ids"] == ["paraphrase"]
+
+    with pytest.raises(ValueError):
+        store.query_documents("anything", mode="fuzzy")
@@ -0,0 +1,68 @@
+import pytest
+
+
+@pytest.fixture
+def filled_store(store):
+    # Stored out of creation order
+    created = [5, 1, 4, 2, 3]
+    store.add_documents(
+        documents=[f"page {t}" for t in created],
+        metadata=[{"source": "screenshot", "created_at": float(t)} for t in created],
+        ids=[f"doc_{t}" for t in created]
+    )
+    return store
+
+
+def pages(store, **kwargs):
+    """IDs of every page of a listing, following the cursors."""
+    result, cursor = [], None
+    while True:
+        page = store.list_documents(cursor=cursor, **kwargs)
+        result.append(page["ids"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return result
+
+
+def test_offset_pages_cover_the_collection(filled_store):
+    listed = pages(filled_store, limit=2)
+    assert [len(page) for page in listed] == [2, 2, 1]
+    assert sorted(id for page in listed for id in page) == [f"doc_{t}" for t in range(1, 6)]
+
+
+def test_sorted_pages_follow_creation_time(filled_store):
+    assert pages(filled_store, limit=2, sort="timestamp") == [["doc_5", "doc_4"], ["doc_3", "doc_2"], ["doc_1"]]
+    assert pages(filled_store, limit=3, sort="timestamp", descending=False) == [["doc_1", "doc_2", "doc_3"], ["doc_4", "doc_5"]]
+
+
+def test_sorted_cursor_is_not_shifted_by_inserts(filled_store):
+    first = filled_store.list_documents(limit=2, sort="timestamp")
+    filled_store.add_documents(documents=["page 6"], metadata=[{"created_at": 6.0}], ids=["doc_6"])
+    second = filled_store.list_documents(limit=2, sort="timestamp", cursor=first["next_cursor"])
+    assert second["ids"] == ["doc_3", "doc_2"]
+
+
+def test_projection_returns_only_requested_fields(filled_store):
+    page = filled_store.list_documents(limit=2, sort="timestamp", include=["metadatas"])
+    assert set(page) == {"ids", "metadatas", "next_cursor"}
+    assert page["metadatas"][0]["created_at"] == 5.0
+
+
+def test_embeddings_need_ungrouped_listing(filled_store):
+    with pytest.raises(ValueError):
+        filled_store.list_documents(include=["embeddings"])
+    page = filled_store.list_documents(include=["embeddings"], group_chunks=False, limit=1)
+    assert len(page["embeddings"]) == 1
+
+
+def test_invalid_arguments_are_rejected(filled_store):
+    with pytest.raises(ValueError):
+        filled_store.list_documents(sort="title")
+    with pytest.raises(ValueError):
+        filled_store.list_documents(cursor="not a cursor")
+
+
+def test_iter_documents_streams_every_document(filled_store):
+    items = list(filled_store.iter_documents(batch_size=2, include=["documents"], sort="timestamp", descending=False))
+    assert [item["id"] for item in items] == [f"doc_{t}" for t in range(1, 6)]
+    assert items[0] == {"id": "doc_1", "document": "page 1"}
@@ -0,0 +1,67 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image, ImageDraw
+
+from pipeline import ocr
+from pipeline.ocr import TileOCR, split_tiles
+
+
+def page(bars, height=400):
+    """A white grayscale page with a black bar at each (top, bottom) row range."""
+    image = Image.new("L", (200, height), 255)
+    draw = ImageDraw.Draw(image)
+    for i, (top, bottom) in enumerate(bars):
+        # Bars of different widths so every tile has its own content
+        draw.rectangle((10, top, 60 + 20 * i, bottom), fill=0)
+    return image
+
+
+@pytest.fixture
+def tesseract_calls(monkeypatch):
+    """Replace Tesseract with a stub that records every tile it is run on."""
+    calls = []
+    def ocr_tile(tile, config=""):
+        calls.append(tile.size)
+        return f"tile {len(calls)}"
+    monkeypatch.setattr(ocr, "ocr_tile", ocr_tile)
+    return calls
+
+
+def extract(engine, image):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return asyncio.run(engine.extract_text(image, executor))
+
+
+def test_split_tiles_cuts_at_blank_rows():
+    tiles = split_tiles(page([(20, 40), (100, 130), (200, 203)]))
+    # The 3 pixel rule is dropped as a border
+    assert len(tiles) == 2
+    assert tiles[0][0] <= 20 <= 40 <= tiles[0][1] < 100
+    assert tiles[1][0] <= 100 <= 130 <= tiles[1][1] < 200
+
+
+def test_split_tiles_splits_tall_bands():
+    tiles = split_tiles(page([(0, 399)]), max_tile_height=100)
+    assert len(tiles) >= 4
+    assert all(bottom - top <= 100 for top, bottom in tiles)
+
+
+def test_unchanged_tiles_are_reused(tesseract_calls):
+    engine = TileOCR()
+    first = extract(engine, page([(20, 40), (100, 130)]))
+    assert len(tesseract_calls) == 2
+    assert first == "tile 1\ntile 2"
+
+    # Scrolled by 50 pixels: same bands at other positions, plus a new one
+    second = extract(engine, page([(70, 90), (150, 180), (250, 280)]))
+    assert len(tesseract_calls) == 3
+    assert second.splitlines()[:2] == ["tile 1", "tile 2"]
+    assert engine.stats()["hits"] == 2
+
+
+def test_cache_is_bounded(tesseract_calls):
+    engine = TileOCR(cache_size=1)
+    extract(engine, page([(20, 40), (100, 130)]))
+    assert engine.stats()["entries"] == 1
@@ -0,0 +1,74 @@
+import time
+
+from db.query_cache import QueryCache
+
+
+def result(*ids):
+    return {"ids": list(ids), "documents": [], "metadatas": [], "distances": []}
+
+
+def test_trivially_different_queries_share_an_entry():
+    cache = QueryCache()
+    cache.set(cache.key("screenshots", "Python  asyncio", 5), result("a"))
+    assert cache.get(cache.key("screenshots", "python asyncio", 5)) == result("a")
+    assert cache.get(cache.key("screenshots", "python asyncio", 3)) is None
+    assert cache.get(cache.key("screenshots", "python asyncio", 5, where={"source": "screenshot"})) is None
+
+
+def test_invalidate_drops_only_that_collection():
+    cache = QueryCache()
+    stale_key = cache.key("screenshots", "q", 5)
+    other_key = cache.key("topics", "q", 5)
+    cache.set(stale_key, result("a"))
+    cache.set(other_key, result("b"))
+
+    cache.invalidate("screenshots")
+    assert cache.get(stale_key) is None
+    assert cache.get(cache.key("screenshots", "q", 5)) is None
+    assert cache.get(other_key) == result("b")
+
+
+def test_results_computed_before_a_write_are_not_cached():
+    cache = QueryCache()
+    key = cache.key("screenshots", "q", 5)
+    # The collection is written while the query runs
+    cache.invalidate("screenshots")
+    cache.set(key, result("a"))
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_and_are_evicted_lru():
+    cache = QueryCache(max_entries=2, ttl_seconds=60)
+    keys = [cache.key("c", f"q{i}", 5) for i in range(3)]
+    cache.set(keys[0], result("0"))
+    cache.set(keys[1], result("1"))
+    cache.get(keys[0])
+    cache.set(keys[2], result("2"))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == result("0")
+
+    expiring = QueryCache(ttl_seconds=0.01)
+    key = expiring.key("c", "q", 5)
+    expiring.set(key, result("a"))
+    time.sleep(0.02)
+    assert expiring.get(key) is None
+
+
+def test_cached_results_are_copies():
+    cache = QueryCache()
+    key = cache.key("c", "q", 5)
+    cache.set(key, result("a"))
+    cache.get(key)["ids"].append("b")
+    assert cache.get(key)["ids"] == ["a"]
+
+
+def test_store_invalidates_on_writes(store):
+    store.add_documents(documents=["python asyncio"], metadata=[{"source": "screenshot"}], ids=["a"])
+    assert store.query_documents("asyncio", n_results=5)["ids"] == ["a"]
+    assert store.query_documents("asyncio", n_results=5)["ids"] == ["a"]
+    assert store.query_cache.stats()["hits"] == 1
+
+    store.add_documents(documents=["asyncio gather"], metadata=[{"source": "screenshot"}], ids=["b"])
+    assert sorted(store.query_documents("asyncio", n_results=5)["ids"]) == ["a", "b"]
+    store.delete_document("a")
+    assert store.query_documents("asyncio", n_results=5)["ids"] == ["b"]
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from cache.disk_cache import DiskCache
+from cache.response_cache import ResponseCache, normalize_input
+
+
+class Topic(BaseModel):
+    topic : str
+
+
+def key_parts(text):
+    return ["test-model", "Extract the topic", normalize_input(text)]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(DiskCache("llm_responses", path=str(tmp_path / "llm_responses.sqlite3")), ttls={"get_topic": 60})
+
+
+def test_sync_and_async_wrappers_share_entries(cache):
+    calls = []
+
+    @cache.cached("get_topic", key_parts, Topic)
+    def get_topic(text):
+        calls.append(text)
+        return Topic(topic="Rust")
+
+    @cache.cached("get_topic", key_parts, Topic)
+    async def get_topic_async(text):
+        calls.append(text)
+        return Topic(topic="Other")
+
+    assert get_topic("rust  borrow checker") == Topic(topic="Rust")
+    assert asyncio.run(get_topic_async("rust borrow checker")) == Topic(topic="Rust")
+    assert asyncio.run(get_topic_async("pasta")) == Topic(topic="Other")
+    assert get_topic("pasta") == Topic(topic="Other")
+    assert calls == ["rust  borrow checker", "pasta"]
+
+
+def test_entries_expire_after_their_ttl(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    calls = []
+
+    @cache.cached("get_topic", key_parts, Topic)
+    def get_topic(text):
+        calls.append(text)
+        return Topic(topic=f"Topic {len(calls)}")
+
+    assert get_topic("rust").topic == "Topic 1"
+    now[0] += 59
+    assert get_topic("rust").topic == "Topic 1"
+    now[0] += 2
+    assert get_topic("rust").topic == "Topic 2"
+    assert len(calls) == 2
+
+
+def test_disabled_cache_calls_through():
+    cache = ResponseCache(None)
+    calls = []
+
+    @cache.cached("get_topic", key_parts, Topic)
+    def get_topic(text):
+        calls.append(text)
+        return Topic(topic="Rust")
+
+    get_topic("rust")
+    get_topic("rust")
+    assert len(calls) == 2
+    assert cache.stats() == {"enabled": False}
+
+
+def test_hits_and_misses_are_reported_by_the_stats_endpoint(cache, monkeypatch):
+    import main
+
+    @cache.cached("get_topic", key_parts, Topic)
+    def get_topic(text):
+        return Topic(topic="Rust")
+
+    @cache.cached("get_related_topics", key_parts, Topic)
+    async def get_related_topics(text):
+        return Topic(topic="Cargo")
+
+    get_topic("rust")
+    get_topic("rust")
+    get_topic(" rust ")
+    asyncio.run(get_related_topics("rust"))
+    monkeypatch.setattr(main, "response_cache", cache)
+
+    stats = TestClient(main.app).get("/api/cache/stats").json()["llm_responses"]
+    assert stats["enabled"] is True
+    assert stats["entries"] == 2
+    assert stats["ttl_seconds"] == {"get_topic": 60}
+    assert stats["functions"]["get_topic"] == {"hits": 2, "misses": 1, "hit_rate": 2 / 3}
+    assert stats["functions"]["get_related_topics"] == {"hits": 0, "misses": 1, "hit_rate": 0.0}
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from benchmarks.stubs import HashEmbeddingFunction
+from db.snapshot import export_collection, import_collection
+from db.vector_store import VectorStore
+
+
+class RaisingEmbeddingFunction(HashEmbeddingFunction):
+    """Has the model id of HashEmbeddingFunction but fails if anything gets embedded."""
+
+    def __call__(self, input):
+        raise AssertionError(f"Unexpected embedding of {len(input)} texts")
+
+
+def contents(store, collection_name="screenshots_collection"):
+    page = store.list_documents(include=["documents", "metadatas", "embeddings"], group_chunks=False, collection_name=collection_name)
+    rows = sorted(zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"]), key=lambda row: row[0])
+    return [row[:3] for row in rows], np.asarray([row[3] for row in rows], dtype=np.float32)
+
+
+@pytest.mark.parametrize("format", ["npy", "parquet"])
+def test_export_import_round_trip_restores_vectors(store, tmp_path, format):
+    if format == "parquet":
+        pytest.importorskip("pyarrow")
+    store.add_documents(
+        documents=[f"document {i} about rust lifetimes" for i in range(5)],
+        metadata=[{"source": "screenshot", "created_at": float(i), "url": f"https://example.com/{i}"} for i in range(5)],
+        ids=[f"doc_{i}" for i in range(5)]
+    )
+
+    manifest = export_collection(str(tmp_path / "snapshot"), format=format, batch_size=2, store=store)
+    assert manifest["count"] == 5
+    assert len(manifest["parts"]) == 3
+
+    restored = VectorStore(str(tmp_path / "restored_db"), embedding_function=RaisingEmbeddingFunction())
+    summary = import_collection(str(tmp_path / "snapshot"), collection_name="restored_collection", store=restored)
+    assert summary["count"] == 5
+
+    rows, embeddings = contents(store)
+    restored_rows, restored_embeddings = contents(restored, "restored_collection")
+    assert restored_rows == rows
+    np.testing.assert_allclose(restored_embeddings, embeddings, rtol=1e-6)
+
+
+def test_import_rejects_another_embedding_model(store, tmp_path):
+    store.add_documents(documents=["rust"], metadata=[{"source": "screenshot"}], ids=["doc"])
+    export_collection(str(tmp_path / "snapshot"), store=store)
+
+    other = VectorStore(str(tmp_path / "other_db"), embedding_function=HashEmbeddingFunction(32))
+    with pytest.raises(ValueError):
+        import_collection(str(tmp_path / "snapshot"), store=other)
@@ -0,0 +1,129 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from pipeline import retention
+from pipeline.storage import ScreenshotStore
+
+
+def png_bytes(color, mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, (16, 16), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def age(path, seconds):
+    """Make a stored file look `seconds` old."""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+@pytest.fixture
+def screenshots(tmp_path):
+    return ScreenshotStore(str(tmp_path / "screenshots"))
+
+
+def test_put_bytes_is_content_addressed_and_sharded(screenshots):
+    digest, path, created = screenshots.put_bytes(png_bytes("red"))
+    assert created
+    assert path == os.path.join(screenshots.root, digest[:2], digest[2:4], digest + ".png")
+
+    same_digest, same_path, created = screenshots.put_bytes(png_bytes("red"))
+    assert (same_digest, same_path, created) == (digest, path, False)
+    assert screenshots.stats()["count"] == 1
+
+
+def test_put_stream_matches_put_bytes(screenshots):
+    data = png_bytes("blue")
+    digest, _, _ = screenshots.put_stream(io.BytesIO(data))
+    assert screenshots.put_bytes(data)[0] == digest
+
+
+def test_transcode_keeps_alpha(tmp_path):
+    screenshots = ScreenshotStore(str(tmp_path / "screenshots"), format="webp")
+    data = png_bytes((255, 0, 0, 128), mode="RGBA")
+    digest, _, _ = screenshots.put_bytes(data)
+
+    path = screenshots.transcode(digest, Image.open(io.BytesIO(data)))
+    assert path.endswith(".webp")
+    assert screenshots.path_for(digest) == path
+    image = Image.open(path)
+    assert image.mode == "RGBA"
+    assert image.getpixel((0, 0)) == (255, 0, 0, 128)
+
+
+def test_gc_removes_old_orphans_only(screenshots):
+    referenced, referenced_path, _ = screenshots.put_bytes(png_bytes("red"))
+    orphan, orphan_path, _ = screenshots.put_bytes(png_bytes("green"))
+    recent, _, _ = screenshots.put_bytes(png_bytes("blue"))
+    age(referenced_path, 7200)
+    age(orphan_path, 7200)
+
+    result = screenshots.collect_garbage(referenced={referenced}, orphan_grace_seconds=3600)
+    assert result["removed"] == 1
+    assert result["referenced_removed"] == []
+    assert screenshots.exists(referenced)
+    assert not screenshots.exists(orphan)
+    # Its ingestion job may still be running
+    assert screenshots.exists(recent)
+
+
+def test_gc_reports_referenced_digests_it_removes(screenshots):
+    old, old_path, _ = screenshots.put_bytes(png_bytes("red"))
+    new, _, _ = screenshots.put_bytes(png_bytes("green"))
+    age(old_path, 3 * 24 * 3600)
+
+    result = screenshots.collect_garbage(referenced={old, new}, max_age_seconds=24 * 3600)
+    assert result["referenced_removed"] == [old]
+    assert screenshots.exists(new)
+
+
+def test_gc_size_budget_evicts_least_recently_seen(screenshots):
+    digests = []
+    for i, color in enumerate(["red", "green", "blue"]):
+        digest, path, _ = screenshots.put_bytes(png_bytes(color))
+        age(path, 300 - i * 100)
+        digests.append(digest)
+    size = os.path.getsize(screenshots.path_for(digests[0]))
+
+    result = screenshots.collect_garbage(referenced=set(digests), max_bytes=2 * size + size // 2)
+    assert result["referenced_removed"] == [digests[0]]
+    assert [screenshots.exists(digest) for digest in digests] == [False, True, True]
+
+
+def test_gc_marks_documents_of_removed_screenshots(screenshots, store, monkeypatch):
+    monkeypatch.setattr(retention, "store", store)
+    monkeypatch.setattr(retention, "screenshot_store", screenshots)
+    monkeypatch.setattr(retention, "SCREENSHOT_RETENTION_DAYS", 1)
+    old, old_path, _ = screenshots.put_bytes(png_bytes("red"))
+    new, _, _ = screenshots.put_bytes(png_bytes("green"))
+    age(old_path, 3 * 24 * 3600)
+    store.add_documents(
+        documents=["old page", "new page"],
+        metadata=[
+            {"source": "screenshot", "image_hash": old, "filename": "old.png"},
+            {"source": "screenshot", "image_hash": new, "filename": "new.png"}
+        ],
+        ids=["doc_old", "doc_new"]
+    )
+
+    result = retention.collect_screenshot_garbage()
+    assert result["referenced_removed"] == [old]
+    metadatas = store.get_documents(ids=["doc_old", "doc_new"], include=["metadatas"])["metadatas"]
+    assert metadatas[0]["filename"] == "" and metadatas[0]["screenshot_expired"]
+    assert metadatas[1]["filename"] == "new.png"
+
+
+def test_release_screenshot_keeps_files_still_referenced(screenshots, store, monkeypatch):
+    monkeypatch.setattr(retention, "store", store)
+    monkeypatch.setattr(retention, "screenshot_store", screenshots)
+    digest, _, _ = screenshots.put_bytes(png_bytes("red"))
+    store.add_documents(documents=["page"], metadata=[{"image_hash": digest}], ids=["doc"])
+
+    assert not retention.release_screenshot(digest)
+    store.delete_document("doc")
+    assert retention.release_screenshot(digest)
+    assert not screenshots.exists(digest)
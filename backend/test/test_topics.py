@@ -0,0 +1,51 @@
+from pipeline.topics import extract_topic, keyphrases, title_topic, url_topic
+
+
+def test_title_topic_drops_site_name_and_counters():
+    assert title_topic("Mean squared error - Wikipedia", "https://en.wikipedia.org/wiki/Mean_squared_error") == "Mean squared error"
+    assert title_topic("(3) asyncio.gather hangs · Issue #123 · python/cpython", "https://github.com/python/cpython") == "asyncio.gather hangs"
+    assert title_topic("report_2024.pdf") == "report 2024"
+
+
+def test_generic_titles_give_no_topic():
+    assert title_topic("New Tab") is None
+    assert title_topic("Home | GitHub", "https://github.com") is None
+
+
+def test_url_topic():
+    assert url_topic("https://en.wikipedia.org/wiki/Mean_squared_error") == "Mean squared error"
+    assert url_topic("https://www.google.com/search?q=rust+borrow+checker") == "rust borrow checker"
+    assert url_topic("https://example.com/posts/12345/") == "posts"
+    assert url_topic("https://example.com/") is None
+
+
+def test_keyphrases_prefer_terms_rare_in_the_collection():
+    text = "Connection settings\nkubernetes ingress controller\nConnection settings\nkubernetes ingress controller"
+    def frequencies(terms):
+        return 100, {"connection": 90, "settings": 80, "kubernetes": 1, "ingress": 2, "controller": 5}
+    ranked, weights = keyphrases(text, frequencies)
+    assert ranked[0][0] == "kubernetes ingress controller"
+    assert weights["kubernetes"] > weights["connection"]
+    assert keyphrases("") == ([], {})
+
+
+def test_title_supported_by_text_is_confident():
+    topic = extract_topic(
+        title="Mean squared error - Wikipedia",
+        url="https://en.wikipedia.org/wiki/Mean_squared_error",
+        text="In statistics, the mean squared error (MSE) measures the average of the squares of the errors."
+    )
+    assert topic.topic == "Mean squared error"
+    assert topic.source == "title"
+    assert topic.confidence >= 0.6
+
+
+def test_unsupported_title_is_not_confident():
+    topic = extract_topic(title="Dashboard - Grafana", url="https://grafana.example.com/d/abc123", text="")
+    assert topic is None or topic.confidence < 0.6
+
+
+def test_keyphrase_fallback_without_title():
+    topic = extract_topic(text="borrow checker\nborrow checker errors\nlifetime annotations")
+    assert topic.source == "keyphrase"
+    assert "borrow checker" in topic.topic.lower()
@@ -0,0 +1,92 @@
+import base64
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+from pipeline.admission import AdmissionController
+from pipeline.jobs import JobManager
+from pipeline.storage import ScreenshotStore
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    A client for the app with the screenshot store in a temporary directory. Uploads are held
+    in the coalescing window and the workers never start, so no pipeline stage runs.
+    """
+    async def handler(job):
+        raise AssertionError("The pipeline should not run")
+
+    job_manager = JobManager(handler=handler, stages=["decode"])
+    monkeypatch.setattr(main, "job_manager", job_manager)
+    monkeypatch.setattr(main, "admission_controller", AdmissionController(job_manager, coalesce_window=60))
+    monkeypatch.setattr(main, "screenshot_store", ScreenshotStore(root=str(tmp_path / "screenshots")))
+    return TestClient(main.app)
+
+
+def assert_accepted(response, data, page_url, page_title):
+    body = response.json()
+    assert body["status"] == "accepted"
+    assert body["admission"] == "deferred"
+    digest = hashlib.sha256(data).hexdigest()
+    assert body["image_hash"] == digest
+
+    job = main.job_manager.get(body["job_id"])
+    assert job.payload["image_hash"] == digest
+    assert job.payload["doc_id"] == body["id"]
+    assert (job.payload["page_url"], job.payload["page_title"]) == (page_url, page_title)
+
+    path = main.screenshot_store.path_for(digest)
+    assert path is not None
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_base64_upload(client):
+    data = png_bytes("red")
+    response = client.post("/api/upload", json={
+        "screenshot": "data:image/png;base64," + base64.b64encode(data).decode(),
+        "pageTitle": "Rust",
+        "pageUrl": "https://doc.rust-lang.org/book"
+    })
+    assert_accepted(response, data, "https://doc.rust-lang.org/book", "Rust")
+
+
+def test_raw_upload(client):
+    data = png_bytes("green")
+    response = client.post("/api/upload/raw", content=data, headers={
+        "Content-Type": "image/png",
+        "X-Page-Url": "https%3A%2F%2Fexample.com%2Fa%20b",
+        "X-Page-Title": "Caf%C3%A9"
+    })
+    assert_accepted(response, data, "https://example.com/a b", "Café")
+    assert os.listdir(os.path.join(main.screenshot_store.root, "tmp")) == []
+
+
+def test_raw_upload_rejects_empty_and_oversized_bodies(client, monkeypatch):
+    assert client.post("/api/upload/raw", content=b"").status_code == 400
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 10)
+    assert client.post("/api/upload/raw", content=png_bytes("blue")).status_code == 413
+    assert os.listdir(os.path.join(main.screenshot_store.root, "tmp")) == []
+    assert main.job_manager.list() == []
+
+
+def test_multipart_upload(client):
+    data = png_bytes("blue")
+    response = client.post(
+        "/api/upload/multipart",
+        files={"screenshot": ("screenshot.png", data, "image/png")},
+        data={"pageUrl": "https://github.com", "pageTitle": "GitHub"}
+    )
+    assert_accepted(response, data, "https://github.com", "GitHub")
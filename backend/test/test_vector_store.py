@@ -0,0 +1,40 @@
+def test_collection_handle_is_opened_once(store, monkeypatch):
+    opened = []
+    get_or_create_collection = store.client.get_or_create_collection
+    def counting(**kwargs):
+        opened.append(kwargs["name"])
+        return get_or_create_collection(**kwargs)
+    monkeypatch.setattr(store.client, "get_or_create_collection", counting)
+
+    handle = store.collection("screenshots_collection")
+    store.add_documents(documents=["rust"], metadata=[{"source": "screenshot"}], ids=["a"])
+    store.query_documents("rust", n_results=1)
+    assert store.collection("screenshots_collection") is handle
+    assert store.collection("topics_collection") is not handle
+    assert opened == ["screenshots_collection", "topics_collection"]
+
+
+def test_deleting_a_collection_drops_its_handle_and_cached_results(store):
+    store.add_documents(documents=["rust borrow checker"], metadata=[{"source": "screenshot"}], ids=["old"])
+    old_handle = store.collection("screenshots_collection")
+    assert store.query_documents("rust", n_results=5)["ids"] == ["old"]
+
+    store.delete_collection("screenshots_collection")
+    assert store.list_documents(include=[])["ids"] == []
+
+    # Writes after the delete go to the recreated collection through a new handle
+    store.add_documents(documents=["rust lifetimes"], metadata=[{"source": "screenshot"}], ids=["new"])
+    assert store.collection("screenshots_collection") is not old_handle
+    assert store.query_documents("rust", n_results=5)["ids"] == ["new"]
+    assert store.get_collection_stats("screenshots_collection")["count"] == 1
+
+
+def test_invalidate_reopens_a_collection_recreated_elsewhere(store):
+    store.add_documents(documents=["rust"], metadata=[{"source": "screenshot"}], ids=["old"])
+    # E.g. a maintenance script dropping and recreating the collection through its own client
+    store.client.delete_collection("screenshots_collection")
+    store.client.create_collection("screenshots_collection", embedding_function=store.embedding_function)
+
+    store.invalidate("screenshots_collection")
+    store.add_documents(documents=["pasta"], metadata=[{"source": "screenshot"}], ids=["new"])
+    assert store.list_documents(include=[])["ids"] == ["new"]
@@ -1,6 +1,14 @@
 from clients import mistral, perplexity
-from db.vector_store import add_documents, query_documents
+from clients.budget import budget_text
+from db.vector_store import CHUNK_TOKENS, get_vector_store
+from pipeline import topics
+from dotenv import load_dotenv
+import asyncio
 import logging
+import os
+import time
+
+load_dotenv()
 
 # Set up logging
 logging.basicConfig(
@@ -12,35 +20,129 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def call_passive_perplexity(browser_info : str) -> None:
-    overall_topic = mistral.get_topic(browser_info)
-    print(overall_topic)
-    related_topic_search = perplexity.get_related_topics(overall_topic.topic)
-    related_topics_info = mistral.get_topics(related_topic_search.answer)
+store = get_vector_store()
+
+# "chain" runs get_topic, get_related_topics and get_topics one after the other;
+# "fused" gets the topic and the related topics from a single Perplexity call
+ENRICHMENT_MODE = os.getenv("ENRICHMENT_MODE", "chain")
+ENRICHMENT_MODES = ("chain", "fused")
+
+def _enrichment_mode() -> str:
+    if ENRICHMENT_MODE not in ENRICHMENT_MODES:
+        raise ValueError(f"Unsupported enrichment mode: {ENRICHMENT_MODE}")
+    return ENRICHMENT_MODE
 
+# Topics of captured pages are found locally when the title, URL and OCR text make it clear,
+# and by get_topic otherwise; if get_topic fails or takes too long the local guess is used
+LOCAL_TOPIC_ENABLED = os.getenv("LOCAL_TOPIC_ENABLED", "true").lower() == "true"
+LOCAL_TOPIC_MIN_CONFIDENCE = float(os.getenv("LOCAL_TOPIC_MIN_CONFIDENCE", "0.6"))
+LOCAL_TOPIC_LLM_TIMEOUT_SECONDS = float(os.getenv("LOCAL_TOPIC_LLM_TIMEOUT_SECONDS", "20"))
+
+def _local_topic(page_title : str = None, page_url : str = None, page_text : str = None):
+    if not LOCAL_TOPIC_ENABLED or not (page_title or page_url or page_text):
+        return None
+    index = store.lexical_index("screenshots_collection")
+    local_topic = topics.extract_topic(page_title, page_url, page_text, index.document_frequencies if index is not None else None)
+    if local_topic is not None and local_topic.confidence >= LOCAL_TOPIC_MIN_CONFIDENCE:
+        logger.info(f"Local topic of the page from its {local_topic.source} (confidence {local_topic.confidence}): {local_topic.topic}")
+    return local_topic
+
+def _page_topic(browser_info : str, page_title : str = None, page_url : str = None, page_text : str = None):
+    """The topic of a captured page, found locally if possible and by get_topic otherwise."""
+    local_topic = _local_topic(page_title, page_url, page_text)
+    if local_topic is not None and local_topic.confidence >= LOCAL_TOPIC_MIN_CONFIDENCE:
+        return mistral.TopicResponse(topic=local_topic.topic)
+    try:
+        return mistral.get_topic(browser_info)
+    except Exception as e:
+        if local_topic is None:
+            raise
+        logger.warning(f"Topic extraction failed, using the local topic {local_topic.topic}: {str(e)}")
+        return mistral.TopicResponse(topic=local_topic.topic)
+
+async def _page_topic_async(browser_info : str, page_title : str = None, page_url : str = None, page_text : str = None):
+    """Async variant of _page_topic. With a local guess to fall back on, get_topic gets LOCAL_TOPIC_LLM_TIMEOUT_SECONDS."""
+    local_topic = await asyncio.to_thread(_local_topic, page_title, page_url, page_text)
+    if local_topic is not None and local_topic.confidence >= LOCAL_TOPIC_MIN_CONFIDENCE:
+        return mistral.TopicResponse(topic=local_topic.topic)
+    try:
+        return await asyncio.wait_for(
+            mistral.get_topic_async(browser_info),
+            LOCAL_TOPIC_LLM_TIMEOUT_SECONDS if local_topic is not None else None
+        )
+    except Exception as e:
+        if local_topic is None:
+            raise
+        logger.warning(f"Topic extraction failed, using the local topic {local_topic.topic}: {str(e) or type(e).__name__}")
+        return mistral.TopicResponse(topic=local_topic.topic)
+
+def _topic_documents(related_topics_info, overall_topic = None, browser_info : str = None, document_id : str = None):
+    """
+    Build the documents and metadata stored for an enrichment, up to 4 of them. The page's
+    own topic document holds the beginning of the page (about one chunk of it) and, through
+    `screenshot_id`, refers to the screenshot document that holds the full text.
+    """
     documents = [f"Here is information about {topic.name}.\n" + topic.topic_information for topic in related_topics_info.topics]
-    metadata = [{"topic" : topic.name} for topic in related_topics_info.topics]
+    created_at = time.time()
+    metadata = [{"topic" : topic.name, "source" : "enrichment", "created_at" : created_at} for topic in related_topics_info.topics]
 
-    documents[0] = f"Here is information about {overall_topic.topic}.\n" + browser_info
-    metadata[0] = {"topic" : overall_topic.topic}
+    if overall_topic is not None:
+        if not documents:
+            documents, metadata = [None], [None]
+        documents[0] = f"Here is information about {overall_topic.topic}.\n" + budget_text(browser_info, CHUNK_TOKENS)
+        metadata[0] = {"topic" : overall_topic.topic, "source" : "enrichment", "created_at" : created_at}
+        if document_id is not None:
+            metadata[0]["screenshot_id"] = document_id
 
     # log the topics of the addtional seraches
     logger.info(f"Found some extra information on the following topics: {', '.join([topic.name for topic in related_topics_info.topics])}")
 
     # Only add up to 3 additional items
-    add_documents(documents[:min(len(documents),4)], metadata[:min(len(documents),4)])
+    return documents[:min(len(documents),4)], metadata[:min(len(documents),4)]
+
+def call_passive_perplexity(browser_info : str, page_title : str = None, page_url : str = None, page_text : str = None, document_id : str = None) -> None:
+    if _enrichment_mode() == "fused":
+        enrichment = perplexity.get_topic_with_related_topics(browser_info)
+        store.add_documents(*_topic_documents(enrichment, enrichment, browser_info, document_id))
+        return
+
+    overall_topic = _page_topic(browser_info, page_title, page_url, page_text)
+    print(overall_topic)
+    related_topic_search = perplexity.get_related_topics(overall_topic.topic)
+    related_topics_info = mistral.get_topics(related_topic_search.answer)
+
+    store.add_documents(*_topic_documents(related_topics_info, overall_topic, browser_info, document_id))
+
+async def call_passive_perplexity_async(browser_info : str, page_title : str = None, page_url : str = None, page_text : str = None, document_id : str = None) -> None:
+    """Async variant of call_passive_perplexity; only the vector store write runs in a thread."""
+    if _enrichment_mode() == "fused":
+        enrichment = await perplexity.get_topic_with_related_topics_async(browser_info)
+        logger.info(f"Topic of the page: {enrichment.topic}")
+        await asyncio.to_thread(store.add_documents, *_topic_documents(enrichment, enrichment, browser_info, document_id))
+        return
+
+    overall_topic = await _page_topic_async(browser_info, page_title, page_url, page_text)
+    logger.info(f"Topic of the page: {overall_topic.topic}")
+    related_topic_search = await perplexity.get_related_topics_async(overall_topic.topic)
+    related_topics_info = await mistral.get_topics_async(related_topic_search.answer)
+
+    await asyncio.to_thread(store.add_documents, *_topic_documents(related_topics_info, overall_topic, browser_info, document_id))
 
 def call_active_perplexity(question : str) -> None:
     topic = mistral.get_topic(question)
-    db_results = query_documents(topic.topic, 3)
+    db_results = store.query_documents(topic.topic, 3)
 
     related_topic_search = perplexity.get_related_topics_with_other_topics(topic.topic, [metadata["topic"] for metadata in db_results["metadatas"]])
     related_topics_info = mistral.get_topics(related_topic_search.answer)
 
-    documents = [f"Here is information about {topic.name}.\n" + topic.topic_information for topic in related_topics_info.topics]
-    metadata = [{"topic" : topic.name} for topic in related_topics_info.topics]
+    store.add_documents(*_topic_documents(related_topics_info))
 
-    logger.info(f"Found some extra information on the following topics: {', '.join([topic.name for topic in related_topics_info.topics])}")
+async def call_active_perplexity_async(question : str) -> None:
+    """Async variant of call_active_perplexity."""
+    topic = await mistral.get_topic_async(question)
+    db_results = await asyncio.to_thread(store.query_documents, topic.topic, 3)
 
-    # Only add up to 3 additional items
-    add_documents(documents[:min(len(documents),4)], metadata[:min(len(documents),4)])
\ No newline at end of file
+    related_topic_search = await perplexity.get_related_topics_with_other_topics_async(topic.topic, [metadata["topic"] for metadata in db_results["metadatas"]])
+    related_topics_info = await mistral.get_topics_async(related_topic_search.answer)
+
+    await asyncio.to_thread(store.add_documents, *_topic_documents(related_topics_info))
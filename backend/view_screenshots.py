@@ -1,5 +1,6 @@
 import os
 from db.vector_store import get_collection_stats, list_all_documents
+from pipeline.storage import ScreenshotStore
 import logging
 
 # Set up logging
@@ -14,14 +15,12 @@ logger = logging.getLogger(__name__)
 
 def view_screenshots():
     # Check filesystem
-    screenshots_dir = "screenshots"
+    screenshots_dir = os.getenv("SCREENSHOT_DIR", "screenshots")
     print("\n=== Screenshots on Disk ===")
     if os.path.exists(screenshots_dir):
-        files = os.listdir(screenshots_dir)
-        print(f"Number of files: {len(files)}")
-        for file in files:
-            if file.endswith('.png'):
-                print(f"- {file}")
+        stats = ScreenshotStore(root=screenshots_dir).stats()
+        print(f"Number of files: {stats['count']}")
+        print(f"Total size: {stats['bytes'] / (1024 * 1024):.1f} MB")
     else:
         print("Screenshots directory not found")
     
@@ -42,6 +41,7 @@ def view_screenshots():
                 print(f"URL: {meta.get('url', 'N/A')}")
                 print(f"Timestamp: {meta.get('timestamp', 'N/A')}")
                 print(f"Filename: {meta.get('filename', 'N/A')}")
+                print(f"Image hash: {meta.get('image_hash', 'N/A')}")
                 print("\nContent:")
                 print(doc)
                 print("-" * 80)
@@ -16,17 +16,16 @@ async function captureScreenshot(tab) {
     // 2. Collect the URL and title of the current page
     const { title, url } = tab;
 
-    // 3. Send screenshot + page info to your server
-    const response = await fetch("http://127.0.0.1:8000/api/upload", {
+    // 3. Send the raw PNG + page info to your server
+    const screenshotBlob = await (await fetch(screenshotDataUrl)).blob();
+    const response = await fetch("http://127.0.0.1:8000/api/upload/raw", {
       method: "POST",
       headers: {
-        "Content-Type": "application/json"
+        "Content-Type": "image/png",
+        "X-Page-Url": encodeURIComponent(url),
+        "X-Page-Title": encodeURIComponent(title)
       },
-      body: JSON.stringify({
-        screenshot: screenshotDataUrl, // base64-encoded PNG
-        pageUrl: url,
-        pageTitle: title
-      })
+      body: screenshotBlob
     });
 
     if (response.ok) {
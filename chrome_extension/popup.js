@@ -23,17 +23,16 @@ button.addEventListener("click", async () => {
     // 3. Collect the URL and title of the current page
     const { title, url } = activeTab;
 
-    // 4. Start sending screenshot + page info to your server without waiting for response
-    fetch("http://127.0.0.1:8000/api/upload", {
+    // 4. Start sending the raw PNG + page info to your server without waiting for response
+    const screenshotBlob = await (await fetch(screenshotDataUrl)).blob();
+    fetch("http://127.0.0.1:8000/api/upload/raw", {
       method: "POST",
       headers: {
-        "Content-Type": "application/json"
+        "Content-Type": "image/png",
+        "X-Page-Url": encodeURIComponent(url),
+        "X-Page-Title": encodeURIComponent(title)
       },
-      body: JSON.stringify({
-        screenshot: screenshotDataUrl, // base64-encoded PNG
-        pageUrl: url,
-        pageTitle: title
-      })
+      body: screenshotBlob
     }).catch(error => console.error("Error sending screenshot:", error));
 
     // Immediately update the button to "Sent!" regardless of the response.
@@ -6,15 +6,39 @@ BACKEND_URL = "http://localhost:8000"
 def query_documents(
     query_text: str,
     n_results: int = 5,
-    collection_name: str = "screenshots_collection"
+    collection_name: str = "screenshots_collection",
+    mode: str = "hybrid",
+    **filters: Any
 ) -> Dict[str, Any]:
+    """
+    Filters are passed to the backend as is: `where`, `where_document`, `source`
+    ("screenshot" or "enrichment"), `since`/`until` (epoch seconds), `url` and `domain`.
+    """
     response = requests.post(BACKEND_URL + "/api/query_documents", json={
         "query_text": query_text,
         "n_results": n_results,
-        "collection_name": collection_name
+        "collection_name": collection_name,
+        "mode": mode,
+        **filters
     })
     return response.json()
 
+def query_documents_batch(
+    queries: List[Dict[str, Any]],
+    collection_name: str = "screenshots_collection",
+    mode: str = "hybrid"
+) -> List[Dict[str, Any]]:
+    """
+    Runs several queries in one request. Each query is a dict with `query_text` and
+    optionally `n_results` and the filters of query_documents.
+    """
+    response = requests.post(BACKEND_URL + "/api/query_documents/batch", json={
+        "queries": queries,
+        "collection_name": collection_name,
+        "mode": mode
+    })
+    return response.json()["results"]
+
 def summarize_results_with_mistral(
     sources : List[Any]
 ) -> str:
@@ -25,8 +25,11 @@ import {
   queryDocuments as queryDocsService,
 } from "../services/dbService";
 
+const PAGE_SIZE = 60;
+
 export default function DatabaseView() {
   const [docs, setDocs] = useState({ ids: [], documents: [], metadatas: [] });
+  const [nextCursor, setNextCursor] = useState(null);
   const [searchResults, setSearchResults] = useState(null);
   const [searchQuery, setSearchQuery] = useState("");
   const [openModal, setOpenModal] = useState(false);
@@ -37,10 +40,25 @@ export default function DatabaseView() {
     fetchDocuments();
   }, []);
 
-  const fetchDocuments = async () => {
+  // Fetch the newest documents first, one page at a time
+  const fetchDocuments = async (cursor = null) => {
     try {
-      const response = await getAllDocuments();
-      setDocs(response);
+      const response = await getAllDocuments({
+        limit: PAGE_SIZE,
+        sort: "timestamp",
+        order: "desc",
+        ...(cursor && { cursor }),
+      });
+      setDocs((previous) =>
+        cursor
+          ? {
+              ids: [...previous.ids, ...response.ids],
+              documents: [...previous.documents, ...response.documents],
+              metadatas: [...previous.metadatas, ...response.metadatas],
+            }
+          : response
+      );
+      setNextCursor(response.next_cursor);
     } catch (err) {
       console.error("Error fetching documents:", err);
     }
@@ -110,8 +128,9 @@ export default function DatabaseView() {
   // Handler to clear the entire database
   const handleConfirmClearDatabase = async () => {
     try {
-      // Loop over all document IDs in the main docs state
-      for (const id of docs.ids) {
+      // Only the IDs are needed, not just the loaded pages
+      const { ids } = await getAllDocuments({ fields: "ids" });
+      for (const id of ids) {
         await deleteDocument(id);
       }
       handleCloseClearModal();
@@ -246,6 +265,14 @@ export default function DatabaseView() {
         ))}
       </Grid>
 
+      {!searchResults && nextCursor && (
+        <Box sx={{ display: "flex", justifyContent: "center", my: 3 }}>
+          <Button variant="outlined" onClick={() => fetchDocuments(nextCursor)}>
+            Load More
+          </Button>
+        </Box>
+      )}
+
       {/* Confirm Delete Modal for Individual Document */}
       <Dialog open={openModal} onClose={handleModalClose}>
         <DialogTitle>Confirm Delete</DialogTitle>
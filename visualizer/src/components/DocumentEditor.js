@@ -28,8 +28,7 @@ export default function DocumentEditor() {
 
   const fetchDocument = async () => {
     try {
-      // We'll fetch all docs and then find the one we need
-      const response = await getAllDocuments();
+      const response = await getAllDocuments({ ids: docId });
       if (!response || !response.ids) return;
 
       const idx = response.ids.findIndex((id) => id === docId);
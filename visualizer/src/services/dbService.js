@@ -3,8 +3,9 @@ import axios from "axios";
 // Adjust the base URL to your actual backend (localhost:8000 or your deployed URL)
 const BASE_URL = "http://127.0.0.1:8000/api";
 
-export async function getAllDocuments() {
-  const response = await axios.get(`${BASE_URL}/list_all_documents`);
+// params: { limit, cursor, fields, sort, order, ids } -- see /api/list_all_documents
+export async function getAllDocuments(params = {}) {
+  const response = await axios.get(`${BASE_URL}/list_all_documents`, { params });
   return response.data;
 }
 